@@ -0,0 +1,89 @@
+"""
+Bot API client throughput: sendMessage calls per second with concurrent
+senders against a local fake Bot API, for PTB's default client (one
+connection), the shared pooled client, and the pooled client with
+keep-alive disabled.
+
+    python -m benchmarks.bench_bot_client [--messages 2000] [--concurrency 16] [--delay-ms 5]
+
+Over loopback a new connection is cheap, so keep-alive shows mostly in
+the connection count; against api.telegram.org every new connection also
+costs a TLS handshake (several round trips).
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import BENCH_TOKEN, bench_env, print_table, quiet_logs
+from benchmarks.fake_telegram import FakeBotAPI
+
+
+def make_request(case: str, pool_size: int):
+    from telegram.request import HTTPXRequest
+    from src.bot.http import BotAPIStats, PooledHTTPXRequest
+
+    stats = BotAPIStats()
+    if case == "ptb default (pool 1)":
+        # Тот же клиент, но с параметрами HTTPXRequest по умолчанию.
+        return PooledHTTPXRequest(stats), stats
+    if case == "pooled, no keep-alive":
+        return PooledHTTPXRequest(stats, keepalive_expiry=0, connection_pool_size=pool_size), stats
+    return PooledHTTPXRequest(stats, connection_pool_size=pool_size, pool_timeout=5), stats
+
+
+async def measure(case: str, args) -> dict:
+    from telegram import Bot
+    from telegram.error import TelegramError
+
+    fake = FakeBotAPI(BENCH_TOKEN)
+    base_url = await fake.start()
+    fake.send_delay = args.delay_ms / 1000
+    request, stats = make_request(case, args.concurrency)
+    errors = 0
+    counter = iter(range(args.messages))
+
+    async with Bot(BENCH_TOKEN, base_url=base_url, request=request) as bot:
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                try:
+                    await bot.send_message(chat_id=1 + i % 100, text=f"msg {i}")
+                except TelegramError:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+    await fake.stop()
+    snapshot = stats.snapshot()
+    return {
+        "client": case,
+        "sends_per_s": (args.messages - errors) / elapsed,
+        "errors": errors,
+        "connections": snapshot["connections_opened"],
+        "reuse_ratio": snapshot["reuse_ratio"],
+    }
+
+
+async def main_async(args):
+    rows = []
+    for case in ("ptb default (pool 1)", "pooled, keep-alive", "pooled, no keep-alive"):
+        rows.append(await measure(case, args))
+    print_table(rows, ["client", "sends_per_s", "errors", "connections", "reuse_ratio"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--delay-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    bench_env()
+    quiet_logs()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Memory cost per stored message: the old list-of-dicts history versus the
+compact ring buffer in src/history.py.
+
+    python -m benchmarks.bench_history_memory [--chats 10000] [--messages 1000]
+
+By default only --sample-chats chats are actually built (tracemalloc is
+slow) and totals are projected to --chats; pass --full to build them all.
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+from benchmarks.common import bench_env, print_table
+
+WORDS = (
+    "привет добрый день заказ оплата доставка спасибо вопрос ответ оператор "
+    "hello order status please thanks when today tomorrow номер трек"
+).split()
+
+
+def make_text(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 12)))
+
+
+def fill_dicts(chats: int, messages: int, seed: int) -> object:
+    """The pre-ring-buffer representation: one dict per message, str timestamps."""
+    rng = random.Random(seed)
+    data = defaultdict(lambda: {"username": None, "access_code": None, "messages": []})
+    for chat_id in range(chats):
+        for _ in range(messages):
+            data[chat_id]["messages"].append(
+                {
+                    "sender": rng.choice(("user", "admin")),
+                    "text": make_text(rng),
+                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                }
+            )
+    return data
+
+
+def fill_ring(chats: int, messages: int, seed: int) -> object:
+    from src.history import HistoryStore
+
+    rng = random.Random(seed)
+    store = HistoryStore(capacity=messages, budget_bytes=1 << 62)
+    for chat_id in range(chats):
+        for _ in range(messages):
+            sender = rng.choice(("user", "admin"))
+            store.append(chat_id, sender, make_text(rng), int(time.time()))
+    return store
+
+
+def measure(fill, chats: int, messages: int) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    data = fill(chats, messages, seed=42)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del data
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chats", type=int, default=10_000)
+    parser.add_argument("--messages", type=int, default=1_000)
+    parser.add_argument("--sample-chats", type=int, default=50)
+    parser.add_argument("--full", action="store_true")
+    args = parser.parse_args()
+    bench_env()
+
+    built = args.chats if args.full else min(args.sample_chats, args.chats)
+    total_messages = args.chats * args.messages
+    rows = []
+    for name, fill in (("list of dicts", fill_dicts), ("ring buffer", fill_ring)):
+        used = measure(fill, built, args.messages)
+        per_message = used / (built * args.messages)
+        rows.append(
+            {
+                "layout": name,
+                "bytes_per_msg": per_message,
+                "total_mb": per_message * total_messages / 1024 / 1024,
+            }
+        )
+    print(
+        f"{args.chats} chats x {args.messages} messages"
+        f" ({'measured' if args.full else f'projected from {built} chats'})"
+    )
+    print_table(rows, ["layout", "bytes_per_msg", "total_mb"])
+    saved = 1 - rows[1]["bytes_per_msg"] / rows[0]["bytes_per_msg"]
+    print(f"ring buffer saves {saved:.0%}; HISTORY_MEMORY_BUDGET_MB caps the total.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+End-to-end load test of the whole bridge, fully offline: a fake Telegram
+Bot API (benchmarks/fake_telegram.py), the app in its own uvicorn process,
+and a swarm of browser tabs (benchmarks/swarm.py).
+
+    python -m benchmarks.bench_loadtest [--scenario smoke|many-chats|busy-chats|all]
+        [--chats N] [--inbound-rate M] [--outbound-rate M] [--duration S]
+        [--mode polling|webhook] [--send-via ws|http] [--tolerance 0.2]
+        [--no-record] [--fail-on-regression]
+
+Every chat starts with /start sent to the fake Telegram; the tab logs in
+over HTTP with the code from the bot's reply and opens its websocket.
+Then each chat receives `inbound-rate` Telegram messages per second and
+its tab sends `outbound-rate` messages per second, for `duration` seconds.
+Reported latencies:
+- update_to_frame: the update is handed to Telegram (getUpdates or the
+  webhook) until the tab receives the frame;
+- send_to_telegram: the tab sends until the fake Bot API gets sendMessage
+  (includes the Telegram rate limits of the outbound queue);
+- login: POST /login round trip.
+
+Results are appended to benchmarks/results/history.jsonl and compared with
+the previous run of the same scenario: a change for the worse beyond
+`tolerance` is reported as a regression.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from benchmarks.common import (
+    BENCH_TOKEN,
+    compare_runs,
+    free_port,
+    previous_run,
+    print_table,
+    record_run,
+    summarize_ms,
+)
+from benchmarks.fake_telegram import SECRET_HEADER, FakeBotAPI, make_text_update
+from benchmarks.swarm import BrowserClient, access_code_from, gather_limited
+
+SCENARIOS = {
+    "smoke": dict(chats=10, inbound_rate=1.0, outbound_rate=0.5, duration=10),
+    # Исходящий поток держится ниже общего лимита Telegram (30 сообщений в секунду).
+    "many-chats": dict(chats=200, inbound_rate=0.2, outbound_rate=0.1, duration=20),
+    "busy-chats": dict(chats=20, inbound_rate=5.0, outbound_rate=0.5, duration=15),
+}
+WEBHOOK_PATH = "/telegram/webhook"
+WEBHOOK_SECRET = "loadtest-secret"
+CONNECT_CONCURRENCY = 50
+
+
+class BridgeServer:
+    """The app under test in a separate uvicorn process, pointed at the fake Bot API."""
+
+    def __init__(self, telegram_base_url: str, mode: str, workdir: str):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.mode = mode
+        env = dict(
+            os.environ,
+            TELEGRAM_BOT_TOKEN=BENCH_TOKEN,
+            TELEGRAM_API_BASE_URL=telegram_base_url,
+            STATE_BACKEND="memory",
+            BOT_LEADER_ELECTION="0",
+            BOT_UPDATE_MODE=mode,
+            WEBHOOK_URL=self.base_url,
+            WEBHOOK_PATH=WEBHOOK_PATH,
+            WEBHOOK_SECRET_TOKEN=WEBHOOK_SECRET,
+            # Все вкладки входят с одного адреса.
+            LOGIN_IP_RATE="1000000",
+            LOGIN_IP_BURST="1000000",
+            LOG_LEVEL="WARNING",
+        )
+        self.log_path = os.path.join(workdir, "server.log")
+        self._log = open(self.log_path, "w")
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "src.app:app",
+                "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning",
+            ],
+            env=env,
+            stdout=self._log,
+            stderr=subprocess.STDOUT,
+        )
+
+    async def wait_ready(self, http: aiohttp.ClientSession, timeout: float = 30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                async with http.get(f"{self.base_url}/health") as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+        raise RuntimeError(f"Server did not start, see {self.log_path}")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self._log.close()
+
+
+class LoadTest:
+    def __init__(self, fake: FakeBotAPI, server: BridgeServer, http: aiohttp.ClientSession):
+        self.fake = fake
+        self.server = server
+        self.http = http
+        self.clients: List[BrowserClient] = []
+        self.login_latencies: List[float] = []
+        # текст -> время отправки / получения
+        self.inbound_sent: Dict[str, float] = {}
+        self.inbound_seen: Dict[str, float] = {}
+        self.outbound_sent: Dict[str, float] = {}
+
+    async def deliver_update(self, update: dict):
+        """Hands an update to the bridge the way Telegram would in the server's mode."""
+        if self.server.mode == "webhook":
+            async with self.http.post(
+                self.server.base_url + WEBHOOK_PATH,
+                json=update,
+                headers={SECRET_HEADER: WEBHOOK_SECRET},
+            ) as response:
+                response.raise_for_status()
+        else:
+            self.fake.push_update(update)
+
+    async def open_sessions(self, chats: int, timeout: float = 60):
+        usernames = {chat_id: f"load{chat_id}" for chat_id in range(1, chats + 1)}
+        for chat_id, username in usernames.items():
+            await self.deliver_update(make_text_update(chat_id, "/start", username=username))
+        codes: Dict[int, str] = {}
+        deadline = time.monotonic() + timeout
+        while len(codes) < chats:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Bot replied to /start for {len(codes)} of {chats} chats")
+            for call in self.fake.sent():
+                code = access_code_from(str(call["params"].get("text", "")))
+                if code:
+                    codes[int(call["params"]["chat_id"])] = code
+            await asyncio.sleep(0.1)
+
+        async def open_tab(chat_id: int):
+            client = BrowserClient(self.server.base_url, chat_id, usernames[chat_id])
+            started = time.perf_counter()
+            await client.login(codes[chat_id])
+            self.login_latencies.append(time.perf_counter() - started)
+            client.on_frame = self.on_frame
+            await client.connect()
+            return client
+
+        self.clients = await gather_limited(
+            [lambda chat_id=chat_id: open_tab(chat_id) for chat_id in usernames],
+            CONNECT_CONCURRENCY,
+        )
+
+    def on_frame(self, frame: dict, received: float):
+        text = frame.get("text")
+        if frame.get("sender") == "user" and text in self.inbound_sent:
+            self.inbound_seen.setdefault(text, received)
+
+    async def drive(
+        self,
+        client: BrowserClient,
+        inbound_rate: float,
+        outbound_rate: float,
+        duration: float,
+        send_via: str,
+    ):
+        """Sends this chat's traffic on a fixed schedule with a random phase."""
+        loop_start = time.perf_counter()
+        end = loop_start + duration
+        rng = random.Random(client.chat_id)
+        in_every = 1 / inbound_rate if inbound_rate > 0 else float("inf")
+        out_every = 1 / outbound_rate if outbound_rate > 0 else float("inf")
+        next_in = loop_start + rng.random() * min(in_every, duration)
+        next_out = loop_start + rng.random() * min(out_every, duration)
+        sent = 0
+        while min(next_in, next_out) < end:
+            due = min(next_in, next_out)
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            sent += 1
+            if next_in <= next_out:
+                text = f"in {client.chat_id} {sent}"
+                self.inbound_sent[text] = time.perf_counter()
+                await self.deliver_update(make_text_update(client.chat_id, text, client.username))
+                next_in += in_every
+            else:
+                text = f"out {client.chat_id} {sent}"
+                self.outbound_sent[text] = time.perf_counter()
+                if send_via == "http":
+                    await client.send_http(text)
+                else:
+                    await client.send_ws(text)
+                next_out += out_every
+
+    def outbound_arrivals(self) -> Dict[str, float]:
+        arrivals = {}
+        for call in self.fake.sent():
+            text = call["params"].get("text")
+            if text in self.outbound_sent:
+                arrivals.setdefault(text, call["time"])
+        return arrivals
+
+    async def settle(self, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if len(self.inbound_seen) == len(self.inbound_sent) and len(
+                self.outbound_arrivals()
+            ) == len(self.outbound_sent):
+                return
+            await asyncio.sleep(0.1)
+
+    async def close(self):
+        await asyncio.gather(*(client.close() for client in self.clients))
+
+    def results(self) -> List[dict]:
+        arrivals = self.outbound_arrivals()
+        paths = [
+            ("update_to_frame", self.inbound_sent, self.inbound_seen),
+            ("send_to_telegram", self.outbound_sent, arrivals),
+        ]
+        rows = []
+        for name, sent, seen in paths:
+            latencies = [seen[text] - sent[text] for text in sent if text in seen]
+            lost = len(sent) - len(latencies)
+            rows.append({"path": name, "lost": lost, **summarize_ms(latencies)})
+        rows.append({"path": "login", "lost": 0, **summarize_ms(self.login_latencies)})
+        return rows
+
+
+def flat_metrics(rows: List[dict]) -> Dict[str, float]:
+    metrics = {}
+    for row in rows:
+        metrics[f"{row['path']}_p50_ms"] = row["p50_ms"]
+        metrics[f"{row['path']}_p99_ms"] = row["p99_ms"]
+        if row["path"] != "login":
+            metrics[f"{row['path']}_lost"] = row["lost"]
+    return metrics
+
+
+async def run_scenario(params: dict, mode: str, send_via: str) -> List[dict]:
+    fake = FakeBotAPI(BENCH_TOKEN)
+    telegram_base_url = await fake.start()
+    with tempfile.TemporaryDirectory() as workdir:
+        server = BridgeServer(telegram_base_url, mode, workdir)
+        try:
+            async with aiohttp.ClientSession() as http:
+                await server.wait_ready(http)
+                test = LoadTest(fake, server, http)
+                await test.open_sessions(params["chats"])
+                await asyncio.gather(
+                    *(
+                        test.drive(
+                            client,
+                            params["inbound_rate"],
+                            params["outbound_rate"],
+                            params["duration"],
+                            send_via,
+                        )
+                        for client in test.clients
+                    )
+                )
+                await test.settle(timeout=10)
+                await test.close()
+                return test.results()
+        finally:
+            server.stop()
+            await fake.stop()
+
+
+def scenario_params(name: str, args) -> dict:
+    params = dict(SCENARIOS[name])
+    for key in params:
+        override = getattr(args, key)
+        if override is not None:
+            params[key] = override
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="smoke")
+    parser.add_argument("--chats", type=int)
+    parser.add_argument("--inbound-rate", type=float)
+    parser.add_argument("--outbound-rate", type=float)
+    parser.add_argument("--duration", type=float)
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--send-via", choices=["ws", "http"], default="ws")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--no-record", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    overridden = any(getattr(args, key) is not None for key in SCENARIOS["smoke"])
+    regressions = 0
+    for name in names:
+        params = scenario_params(name, args)
+        label = f"{name}{'+custom' if overridden else ''}/{args.mode}/{args.send_via}"
+        print(f"\n== {label}: {params}")
+        rows = asyncio.run(run_scenario(params, args.mode, args.send_via))
+        print_table(rows, ["path", "count", "lost", "p50_ms", "p90_ms", "p99_ms"])
+
+        metrics = flat_metrics(rows)
+        previous: Optional[dict] = previous_run("loadtest", label)
+        if previous:
+            comparison = compare_runs(metrics, previous["metrics"], args.tolerance)
+            print(f"-- compared with {previous['time']} {previous['revision']}")
+            print_table(comparison, ["metric", "previous", "current", "change_pct", "verdict"])
+            regressions += sum(row["verdict"] == "regression" for row in comparison)
+        if not args.no_record:
+            record_run("loadtest", label, metrics)
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
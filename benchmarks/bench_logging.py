@@ -0,0 +1,107 @@
+"""
+Event-loop cost of logging per incoming message: the old f-string INFO
+lines written synchronously versus lazy, sampled lines and a queue with a
+listener thread (src/log_setup.py). Logs go to a temporary file.
+
+    python -m benchmarks.bench_logging [--messages 20000]
+
+"loop_us" is the time add_message keeps the event loop busy; "total_us"
+also includes draining the log queue.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from benchmarks.common import bench_env, print_table
+
+CHAT_ID = 1001
+
+
+def make_paths():
+    """Message paths to compare; built after bench_env() so src can be imported."""
+    from src import config
+    from src.bot.core import add_message
+    from src.config import logger
+    from src.data_store import add_message_to_store, connections
+
+    async def legacy(chat_id: int, username: str, text: str):
+        """The logging of the original path: handle_message, add_message, notify."""
+        logger.info(f"Сообщение от @{username} (chat_id: {chat_id}): {text}")
+        message_data = add_message_to_store(chat_id, "user", text, int(time.time()))
+        logger.info(f"[add_message] Сообщение добавлено для chat_id {chat_id}: {message_data}")
+        if not connections.broadcast(chat_id, message_data):
+            logger.warning(
+                f"[notify_websocket] No active websocket found for chat_id {chat_id} when trying to send message."
+            )
+
+    async def current(chat_id: int, username: str, text: str):
+        # Строка из handle_message перед add_message.
+        if logger.isEnabledFor(logging.DEBUG) and config.message_log_sampler():
+            logger.debug("Сообщение от @%s (chat_id: %s, %d симв.)", username, chat_id, len(text))
+        await add_message(chat_id, "user", text)
+
+    return {"legacy": legacy, "current": current}
+
+
+CASES = [
+    # (name, path, level, format, queue, sample every N)
+    ("legacy f-strings, sync text", "legacy", "INFO", "text", False, 1),
+    ("lazy, sync text", "current", "INFO", "text", False, 100),
+    ("lazy, queue json", "current", "INFO", "json", True, 100),
+    ("DEBUG sampled 1/100, queue json", "current", "DEBUG", "json", True, 100),
+    ("DEBUG every message, sync json", "current", "DEBUG", "json", False, 1),
+    ("DEBUG every message, queue json", "current", "DEBUG", "json", True, 1),
+]
+
+
+async def run_messages(path, count: int, text: str) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        await path(CHAT_ID, "bench_user", text)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+    bench_env()
+    from src import config
+    from src.data_store import reset_store, set_chat_session
+    from src.log_setup import configure_logging
+
+    paths = make_paths()
+    text = "Здравствуйте, подскажите, пожалуйста, статус заказа номер 123456"
+    rows = []
+    for name, path, level, fmt, use_queue, every in CASES:
+        reset_store()
+        set_chat_session(CHAT_ID, "bench_user", "benchcode")
+        config.message_log_sampler.every = every
+        with tempfile.NamedTemporaryFile("w", suffix=".log", delete=False) as out:
+            listener = configure_logging(level, fmt, use_queue, stream=out)
+            logging.getLogger("httpx").setLevel(logging.WARNING)
+            started = time.perf_counter()
+            loop_time = asyncio.run(run_messages(paths[path], args.messages, text))
+            if listener:
+                listener.stop()
+            total = time.perf_counter() - started
+        size = os.path.getsize(out.name)
+        os.unlink(out.name)
+        rows.append(
+            {
+                "logging": name,
+                "loop_us": loop_time / args.messages * 1e6,
+                "total_us": total / args.messages * 1e6,
+                "msgs_per_s": args.messages / loop_time,
+                "log_kb": size / 1024,
+            }
+        )
+    print_table(rows, ["logging", "loop_us", "total_us", "msgs_per_s", "log_kb"])
+
+
+if __name__ == "__main__":
+    main()
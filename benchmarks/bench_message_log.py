@@ -0,0 +1,111 @@
+"""
+Durable message log: write throughput with group commit vs fsync per
+message, and startup (recovery) time with and without a snapshot.
+
+    python -m benchmarks.bench_message_log [--messages 1000000] [--chats 1000]
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.common import bench_env, print_table, quiet_logs
+
+FSYNC_SAMPLE = 2_000
+
+
+def make_backend(directory: str, capacity: int, snapshot_every: int = 10**12):
+    from src.history import HistoryStore
+    from src.message_log import MessageLog
+    from src.state import MemoryBackend
+
+    chats = defaultdict(lambda: {"username": None, "access_code": None})
+    backend = MemoryBackend(chats, {}, HistoryStore(capacity, 1 << 62))
+    journal = MessageLog(directory, snapshot_every=snapshot_every)
+    journal.attach(backend)
+    journal.recover(backend.apply_record)
+    backend.journal = journal
+    return backend
+
+
+async def write_group_commit(directory: str, messages: int, chats: int) -> float:
+    backend = make_backend(directory, capacity=messages // chats)
+    flusher = asyncio.create_task(backend.journal.run())
+    started = time.perf_counter()
+    for chat_id in range(chats):
+        backend.set_session(chat_id, f"user{chat_id}", f"code{chat_id}")
+    for i in range(messages):
+        text = f"Сообщение номер {i}"
+        backend.append_message(i % chats, "user", text, 1_700_000_000 + i)
+        if i % 1000 == 0:
+            await asyncio.sleep(0)  # как в реальном цикле: обработчики уступают управление
+    flusher.cancel()
+    await backend.journal.close()
+    return time.perf_counter() - started
+
+
+def write_fsync_each(directory: str, messages: int) -> float:
+    backend = make_backend(directory, capacity=messages)
+    backend.set_session(1, "user", "code")
+    started = time.perf_counter()
+    for i in range(messages):
+        backend.append_message(1, "user", f"Сообщение номер {i}", 1_700_000_000 + i)
+        backend.journal.flush()
+    return time.perf_counter() - started
+
+
+def row(case: str, messages: int, seconds: float) -> dict:
+    return {
+        "case": case,
+        "messages": messages,
+        "seconds": seconds,
+        "msgs_per_s": messages / seconds,
+    }
+
+
+def timed_recovery(directory: str, capacity: int) -> float:
+    started = time.perf_counter()
+    make_backend(directory, capacity)
+    return time.perf_counter() - started
+
+
+async def main_async(args):
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        elapsed = await write_group_commit(directory, args.messages, args.chats)
+        rows.append(row("write, group commit", args.messages, elapsed))
+        capacity = args.messages // args.chats
+        elapsed = timed_recovery(directory, capacity)
+        rows.append(row("startup, full replay", args.messages, elapsed))
+
+        backend = make_backend(directory, capacity)
+        await backend.journal.snapshot()
+        tail = args.messages // 100
+        for i in range(tail):
+            backend.append_message(i % args.chats, "admin", f"хвост {i}", 1_800_000_000)
+        await backend.journal.close()
+        elapsed = timed_recovery(directory, capacity)
+        rows.append(
+            row(f"startup, snapshot + {tail} tail", args.messages + tail, elapsed)
+        )
+
+    with tempfile.TemporaryDirectory() as directory:
+        elapsed = write_fsync_each(directory, FSYNC_SAMPLE)
+        rows.append(row("write, fsync per message", FSYNC_SAMPLE, elapsed))
+    print_table(rows, ["case", "messages", "seconds", "msgs_per_s"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=1_000)
+    args = parser.parse_args()
+    bench_env()
+    quiet_logs()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
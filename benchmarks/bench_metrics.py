@@ -0,0 +1,78 @@
+"""
+Recording cost of the metrics in src/metrics.py: nanoseconds per
+Histogram.observe, Counter.inc, a timed() coroutine call and a scrape.
+
+    python -m benchmarks.bench_metrics [--events 1000000]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.common import bench_env, print_table
+
+
+def per_event_ns(func, events: int) -> float:
+    started = time.perf_counter()
+    func(events)
+    return (time.perf_counter() - started) / events * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=1_000_000)
+    args = parser.parse_args()
+    bench_env()
+    from src.metrics import Counter, Histogram, MetricsRegistry, timed
+
+    registry = MetricsRegistry()
+    histogram = registry.register(Histogram("bench_seconds", "Bench.", ["op"])).labels("x")
+    counter = registry.register(Counter("bench_events", "Bench."))
+    values = [random.expovariate(200) for _ in range(1024)]
+
+    def empty_loop(n):
+        for i in range(n):
+            values[i & 1023]
+
+    def observe(n):
+        for i in range(n):
+            histogram.observe(values[i & 1023])
+
+    def inc(n):
+        for _ in range(n):
+            counter.inc()
+
+    async def noop():
+        pass
+
+    timed_noop = timed(histogram)(noop)
+
+    def run_coroutines(func):
+        async def runner(n):
+            for _ in range(n):
+                await func()
+
+        return lambda n: asyncio.run(runner(n))
+
+    baseline = per_event_ns(empty_loop, args.events)
+    coroutine_baseline = per_event_ns(run_coroutines(noop), args.events // 10)
+    rows = [
+        {"operation": "Histogram.observe", "ns_per_event": per_event_ns(observe, args.events) - baseline},
+        {"operation": "Counter.inc", "ns_per_event": per_event_ns(inc, args.events) - baseline},
+        {
+            "operation": "timed() coroutine",
+            "ns_per_event": per_event_ns(run_coroutines(timed_noop), args.events // 10)
+            - coroutine_baseline,
+        },
+    ]
+    started = time.perf_counter()
+    registry.render()
+    rows.append(
+        {"operation": "render (1 histogram)", "ns_per_event": (time.perf_counter() - started) * 1e9}
+    )
+    print_table(rows, ["operation", "ns_per_event"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Outbound messages under Telegram flood control: a burst from many operators
+sent directly (one send_message per request, as before) vs through the
+rate-limited OutboundSender, against a fake Bot API that answers 429 once
+the global or per-chat limit is exceeded.
+
+    python -m benchmarks.bench_outbound_sender [--chats 20] [--per-chat 5]
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import BENCH_TOKEN, bench_env, print_table, quiet_logs, summarize_ms
+from benchmarks.fake_telegram import FakeBotAPI
+
+GLOBAL_RATE = 30
+CHAT_RATE = 1
+CHAT_BURST = 3
+
+
+def make_bot(base_url: str):
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+
+    return Bot(BENCH_TOKEN, base_url=base_url, request=HTTPXRequest(connection_pool_size=8))
+
+
+def burst(chats: int, per_chat: int):
+    """Messages in the order operators submit them: round-robin over chats."""
+    return [(chat_id, f"msg {i}") for i in range(per_chat) for chat_id in range(1, chats + 1)]
+
+
+async def run_direct(fake: FakeBotAPI, messages) -> dict:
+    from telegram.error import TelegramError
+
+    latencies, failed = [], 0
+    async with make_bot(fake.base_url) as bot:
+
+        async def send(chat_id, text):
+            nonlocal failed
+            started = time.perf_counter()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text)
+                latencies.append(time.perf_counter() - started)
+            except TelegramError:
+                failed += 1  # раньше это превращалось в редирект с ошибкой
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(chat_id, text) for chat_id, text in messages))
+        elapsed = time.perf_counter() - started
+    return {"mode": "direct", "failed": failed, "elapsed_s": elapsed, **summarize_ms(latencies)}
+
+
+async def run_sender(fake: FakeBotAPI, messages) -> dict:
+    from src.bot.sender import OutboundSender
+
+    submitted, latencies, failed = {}, [], 0
+    done = asyncio.Event()
+
+    async def on_sent(chat_id, text, client_id):
+        return None
+
+    async def on_status(chat_id, payload):
+        nonlocal failed
+        if payload["status"] == "sent":
+            latencies.append(time.perf_counter() - submitted[payload["client_id"]])
+        else:
+            failed += 1
+        if len(latencies) + failed == len(messages):
+            done.set()
+
+    async with make_bot(fake.base_url) as bot:
+        sender = OutboundSender(
+            bot,
+            on_sent,
+            on_status,
+            global_rate=GLOBAL_RATE,
+            chat_rate=CHAT_RATE,
+            chat_burst=CHAT_BURST,
+        )
+        started = time.perf_counter()
+        for n, (chat_id, text) in enumerate(messages):
+            submitted[str(n)] = time.perf_counter()
+            sender.submit(chat_id, text, client_id=str(n))
+        await asyncio.wait_for(done.wait(), 600)
+        elapsed = time.perf_counter() - started
+        await sender.stop()
+    return {"mode": "sender", "failed": failed, "elapsed_s": elapsed, **summarize_ms(latencies)}
+
+
+async def main_async(args):
+    messages = burst(args.chats, args.per_chat)
+    rows = []
+    # Последний прогон: сервер строже настроек отправителя, проверяем retry_after.
+    for run, server_global_rate in (
+        (run_direct, GLOBAL_RATE),
+        (run_sender, GLOBAL_RATE),
+        (run_sender, GLOBAL_RATE // 2),
+    ):
+        fake = FakeBotAPI(BENCH_TOKEN)
+        await fake.start()
+        fake.limit_rates(server_global_rate, CHAT_RATE, CHAT_BURST)
+        row = await run(fake, messages)
+        row["server_rate"] = server_global_rate
+        row["http_429"] = fake.rate_limited
+        rows.append(row)
+        await fake.stop()
+    print_table(
+        rows,
+        ["mode", "server_rate", "count", "failed", "http_429", "elapsed_s", "p50_ms", "p99_ms"],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--per-chat", type=int, default=5)
+    args = parser.parse_args()
+    bench_env()
+    quiet_logs()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Full-text search over message history: build time and memory of the
+inverted index in src/search.py, and query latency through MessageSearch
+compared with scanning the whole history (the only way before the index).
+
+    python -m benchmarks.bench_search [--messages 1000000] [--chats 10000]
+        [--vocabulary 50000] [--queries 200] [--memory-sample 100000]
+
+Texts are 2-12 words drawn from a Zipf-like distribution over a synthetic
+vocabulary of Cyrillic and Latin words, so a few words are very common
+and most are rare, as in real chats. Memory is measured with tracemalloc
+on `memory-sample` messages and projected to `messages`.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from itertools import accumulate
+
+from benchmarks.common import bench_env, print_table, summarize_ms
+
+SYLLABLES = {
+    "cyrillic": "ка ро ми на то ле за пре ст во ди ну ша ев ол ри ти се".split(),
+    "latin": "ka ro mi na to le za pre st vo di nu sha ev ol ri ti se".split(),
+}
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        alphabet = SYLLABLES["cyrillic" if rng.random() < 0.7 else "latin"]
+        words.add("".join(rng.choice(alphabet) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+class Corpus:
+    def __init__(self, vocabulary_size: int, seed: int = 7):
+        self.rng = random.Random(seed)
+        self.vocabulary = make_vocabulary(vocabulary_size, self.rng)
+        # Частота слова обратно пропорциональна его рангу (закон Ципфа).
+        self.cum_weights = list(accumulate(1 / rank for rank in range(1, vocabulary_size + 1)))
+
+    def text(self) -> str:
+        count = self.rng.randint(2, 12)
+        return " ".join(self.rng.choices(self.vocabulary, cum_weights=self.cum_weights, k=count))
+
+    def messages(self, total: int, chats: int):
+        for i in range(total):
+            yield self.rng.randrange(chats) + 1, i + 1, self.text()
+
+
+def fill_backend(corpus: Corpus, messages: int, chats: int):
+    from src.history import HistoryStore
+    from src.state import MemoryBackend
+
+    per_chat = max(1, messages // chats * 2)
+    store = defaultdict(lambda: {"username": None, "access_code": None})
+    backend = MemoryBackend(store, {}, HistoryStore(per_chat, 1 << 62))
+    for chat_id in range(1, chats + 1):
+        backend.set_session(chat_id, f"u{chat_id}", f"code{chat_id}")
+    for chat_id, i, text in corpus.messages(messages, chats):
+        backend.append_message(chat_id, "user", text, 1_700_000_000 + i)
+    return backend
+
+
+def index_bytes_per_message(corpus: Corpus, sample: int, chats: int) -> float:
+    from src.search import SearchIndex
+
+    rows = list(corpus.messages(sample, chats))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    index = SearchIndex()
+    index.rebuild(rows)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / sample
+
+
+def scan_search(backend, terms, chat_id=None, limit=20):
+    """Baseline: tokenizes every stored message, newest chats and messages first."""
+    from src.search import matches
+
+    found = []
+    chat_ids = [chat_id] if chat_id else list(backend.history._histories)
+    for cid in reversed(chat_ids):
+        for message in reversed(backend.get_messages(cid)):
+            if matches(terms, message["text"]):
+                found.append(message)
+                if len(found) >= limit:
+                    return found
+    return found
+
+
+def query_sets(corpus: Corpus, queries: int, chats: int, rng: random.Random) -> dict:
+    # Ранг слова — его место в словаре: первые самые частые.
+    vocabulary = corpus.vocabulary
+    common, rare = vocabulary[:20], vocabulary[len(vocabulary) // 2 :]
+    return {
+        "common word": [(rng.choice(common), None) for _ in range(queries)],
+        "rare word": [(rng.choice(rare), None) for _ in range(queries)],
+        "two words": [(f"{rng.choice(common)} {rng.choice(rare)}", None) for _ in range(queries)],
+        "common word, one chat": [
+            (rng.choice(common), rng.randrange(chats) + 1) for _ in range(queries)
+        ],
+        "no match": [(f"{rng.choice(rare)}zz", None) for _ in range(queries)],
+    }
+
+
+async def timed_queries(search, queries) -> tuple:
+    latencies, hits = [], 0
+    for query, chat_id in queries:
+        started = time.perf_counter()
+        found = await search.search(query, chat_id, limit=20)
+        latencies.append(time.perf_counter() - started)
+        hits += len(found["results"])
+    return latencies, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=10_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scan-queries", type=int, default=5)
+    parser.add_argument("--memory-sample", type=int, default=100_000)
+    args = parser.parse_args()
+    bench_env()
+
+    from src.search import MessageSearch, SearchIndex, tokenize
+
+    corpus = Corpus(args.vocabulary)
+    started = time.perf_counter()
+    backend = fill_backend(corpus, args.messages, args.chats)
+    print(f"history filled: {args.messages} messages in {time.perf_counter() - started:.1f} s")
+
+    search = MessageSearch(backend, SearchIndex())
+    started = time.perf_counter()
+    asyncio.run(search.rebuild())
+    build_seconds = time.perf_counter() - started
+    stats = search.index.stats()
+    per_message = index_bytes_per_message(
+        Corpus(args.vocabulary, seed=8), min(args.memory_sample, args.messages), args.chats
+    )
+    print_table(
+        [
+            {
+                "messages": stats["documents"],
+                "terms": stats["terms"],
+                "postings": stats["postings"],
+                "build_s": build_seconds,
+                "adds_per_s": stats["documents"] / build_seconds,
+                "bytes_per_msg": per_message,
+                "projected_mb": per_message * args.messages / 1024 / 1024,
+            }
+        ],
+        ["messages", "terms", "postings", "build_s", "adds_per_s", "bytes_per_msg", "projected_mb"],
+    )
+
+    rng = random.Random(3)
+    rows = []
+    for name, queries in query_sets(corpus, args.queries, args.chats, rng).items():
+        latencies, hits = asyncio.run(timed_queries(search, queries))
+        scan = []
+        for query, chat_id in queries[: args.scan_queries]:
+            started = time.perf_counter()
+            scan_search(backend, tokenize(query), chat_id)
+            scan.append(time.perf_counter() - started)
+        rows.append(
+            {
+                "query": name,
+                "avg_hits": hits / len(queries),
+                **summarize_ms(latencies),
+                "scan_p50_ms": summarize_ms(scan)["p50_ms"],
+            }
+        )
+    print_table(rows, ["query", "avg_hits", "p50_ms", "p90_ms", "p99_ms", "scan_p50_ms"])
+
+
+if __name__ == "__main__":
+    main()
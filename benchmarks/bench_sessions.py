@@ -0,0 +1,100 @@
+"""
+Per-request cost of the browser session: Starlette's signed-cookie
+SessionMiddleware versus the server-side store (src/sessions.py) with its
+LRU cache, on the memory and sqlite backends and with the cache off.
+
+    python -m benchmarks.bench_sessions [--requests 20000]
+
+Each request carries a logged-in session and reads it; "overhead_us" is
+the time on top of the same app without any session middleware.
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.common import asgi_get, bench_env, print_table, quiet_logs
+
+
+def build_app(middleware=None, **options):
+    from starlette.applications import Starlette
+    from starlette.middleware import Middleware
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+
+    async def login(request):
+        if "session" in request.scope:
+            request.session.update(chat_id=1001, username="bench_user")
+        return PlainTextResponse("ok")
+
+    async def read(request):
+        session = request.session if "session" in request.scope else {}
+        return PlainTextResponse(str(session.get("chat_id")))
+
+    stack = [Middleware(middleware, **options)] if middleware else []
+    return Starlette(
+        routes=[Route("/login", login), Route("/read", read)], middleware=stack
+    )
+
+
+def setups(directory: str):
+    from starlette.middleware.sessions import SessionMiddleware
+
+    from src.history import HistoryStore
+    from src.sessions import ServerSessionMiddleware, WebSessionStore
+    from src.state import MemoryBackend, SQLiteBackend
+
+    def memory():
+        chats = defaultdict(lambda: {"username": None, "access_code": None})
+        return MemoryBackend(chats, {}, HistoryStore(10, 1024 * 1024))
+
+    def sqlite(name):
+        return SQLiteBackend(f"{directory}/{name}.db", "bench-worker")
+
+    def server(backend, cache_size):
+        store = WebSessionStore(backend, 3600, cache_size=cache_size, cache_ttl=60)
+        return build_app(ServerSessionMiddleware, store=store)
+
+    return [
+        ("no session middleware", build_app()),
+        ("signed cookie (SessionMiddleware)", build_app(SessionMiddleware, secret_key="bench")),
+        ("server store, memory", server(memory(), 10_000)),
+        ("server store, sqlite + LRU cache", server(sqlite("cached"), 10_000)),
+        ("server store, sqlite, no cache", server(sqlite("uncached"), 0)),
+    ]
+
+
+async def per_request_us(app, requests: int) -> float:
+    _, _, headers = await asgi_get(app, "/login")
+    cookie = headers.get(b"set-cookie", b"").split(b";")[0]
+    request_headers = [(b"cookie", cookie)] if cookie else []
+    status, _, _ = await asgi_get(app, "/read", request_headers)
+    assert status == 200
+    started = time.perf_counter()
+    for _ in range(requests):
+        await asgi_get(app, "/read", request_headers)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+    bench_env()
+    quiet_logs()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, app in setups(directory):
+            us_per_req = asyncio.run(per_request_us(app, args.requests))
+            rows.append({"session": name, "us_per_req": us_per_req})
+    baseline = rows[0]["us_per_req"]
+    for row in rows:
+        row["overhead_us"] = row["us_per_req"] - baseline
+    print_table(rows, ["session", "us_per_req", "overhead_us"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Requests per second of the login page and the stylesheet: the original
+setup (Jinja render per request, StaticFiles reading the file) versus the
+page cache and in-memory precompressed assets (src/assets.py).
+
+    python -m benchmarks.bench_static [--requests 5000]
+
+Requests are sent to the ASGI app directly, so the numbers are the app's
+own cost per request without the network or the HTTP server. "bytes" is
+the body size sent to the client.
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import asgi_get, bench_env, print_table, quiet_logs
+
+GZIP = [(b"accept-encoding", b"gzip, deflate, br")]
+
+
+def legacy_app():
+    """The app setup before the asset pipeline: own Jinja2Templates, StaticFiles."""
+    from fastapi import FastAPI, Request
+    from fastapi.staticfiles import StaticFiles
+    from fastapi.templating import Jinja2Templates
+    from starlette.middleware.sessions import SessionMiddleware
+
+    from src.config import STATIC_DIR, TEMPLATES_DIR
+
+    app = FastAPI()
+    app.add_middleware(SessionMiddleware, secret_key="bench-secret")
+    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+    templates = Jinja2Templates(directory=TEMPLATES_DIR)
+    templates.env.globals["asset_url"] = lambda path: f"/static/{path}"
+
+    @app.get("/")
+    async def get_login_page(request: Request):
+        return templates.TemplateResponse(request=request, name="login.html")
+
+    return app
+
+
+async def measure(app, path: str, headers, requests: int) -> dict:
+    status, size, _ = await asgi_get(app, path, headers)  # прогрев
+    started = time.perf_counter()
+    for _ in range(requests):
+        await asgi_get(app, path, headers)
+    elapsed = time.perf_counter() - started
+    return {"status": status, "bytes": size, "req_per_s": requests / elapsed}
+
+
+async def etag(app, path: str) -> bytes:
+    return (await asgi_get(app, path, GZIP))[2][b"etag"]
+
+
+async def run(requests: int):
+    from src.app import app
+    from src.templating import assets
+
+    legacy = legacy_app()
+    css = "/static/css/style.css"
+    hashed_css = assets.url("css/style.css")
+    cases = [
+        ("/", "legacy", legacy, "/", []),
+        ("/", "cached", app, "/", []),
+        ("/ gzip", "cached", app, "/", GZIP),
+        ("style.css", "legacy", legacy, css, GZIP),
+        ("style.css", "assets identity", app, hashed_css, []),
+        ("style.css", "assets gzip", app, hashed_css, GZIP),
+        ("style.css 304", "legacy", legacy, css, [(b"if-none-match", await etag(legacy, css))]),
+        ("style.css 304", "assets", app, css, [*GZIP, (b"if-none-match", await etag(app, css))]),
+    ]
+    rows = []
+    for name, setup, target, path, headers in cases:
+        row = await measure(target, path, headers, requests)
+        rows.append({"request": name, "setup": setup, **row})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    bench_env()
+    quiet_logs()
+    rows = asyncio.run(run(args.requests))
+    print_table(rows, ["request", "setup", "status", "bytes", "req_per_s"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+End-to-end latency of an incoming Telegram message until it reaches the
+websocket layer: long polling vs webhook, against a local fake Bot API.
+
+    python -m benchmarks.bench_update_latency [--messages 300]
+
+Each mode runs in its own interpreter because the update mode is read from
+the environment at import time. The fake server answers instantly, so the
+numbers show the overhead of the bridge itself; real Telegram adds one
+network round trip per update in both modes and, for polling, the time to
+re-issue getUpdates.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import (
+    BENCH_TOKEN,
+    bench_env,
+    free_port,
+    print_table,
+    quiet_logs,
+    run_isolated,
+    summarize_ms,
+)
+from benchmarks.fake_telegram import FakeBotAPI, FakeTelegramSender, make_text_update
+
+CHAT_ID = 777
+
+
+async def measure(mode: str, messages: int) -> dict:
+    fake = FakeBotAPI(BENCH_TOKEN)
+    base_url = await fake.start()
+    bench_env(TELEGRAM_API_BASE_URL=base_url, BOT_UPDATE_MODE=mode)
+
+    import httpx
+    import uvicorn
+    import src.bot.core as bot_core
+    from src.app import app
+    from src.config import WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN
+    from src.data_store import set_chat_session
+
+    quiet_logs()
+    delivered = {}
+    arrived = asyncio.Event()
+
+    async def record_delivery(chat_id, message_data):
+        delivered[message_data["text"]] = time.perf_counter()
+        arrived.set()
+
+    bot_core.notify_websocket_of_message = record_delivery
+
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    set_chat_session(CHAT_ID, "bench", "benchcode")
+
+    latencies = []
+    async with httpx.AsyncClient() as client:
+        sender = FakeTelegramSender(
+            client, f"http://127.0.0.1:{port}{WEBHOOK_PATH}", WEBHOOK_SECRET_TOKEN
+        )
+        for i in range(messages):
+            text = f"message {i}"
+            update = make_text_update(CHAT_ID, text, username="bench")
+            arrived.clear()
+            started = time.perf_counter()
+            if mode == "webhook":
+                await sender.send(update)
+            else:
+                fake.push_update(update)
+            while text not in delivered:
+                await asyncio.wait_for(arrived.wait(), 10)
+                arrived.clear()
+            latencies.append(delivered[text] - started)
+
+    server.should_exit = True
+    await server_task
+    await fake.stop()
+    return {"mode": mode, **summarize_ms(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--mode", choices=["polling", "webhook"])
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(asyncio.run(measure(args.mode, args.messages))))
+        return
+
+    rows = [
+        run_isolated(__spec__.name, "--mode", mode, "--messages", str(args.messages))
+        for mode in ("polling", "webhook")
+    ]
+    print_table(rows, ["mode", "count", "mean_ms", "p50_ms", "p90_ms", "p99_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Throughput of incoming Telegram updates through the handlers of
+src/bot/handlers.py: PTB's default sequential processing versus
+ChatLaneUpdateProcessor (src/bot/updates.py) with several pool sizes.
+
+    python -m benchmarks.bench_update_throughput [--updates 3000] [--chats 200]
+        [--start-ratio 0.1] [--api-delay-ms 20]
+
+Synthetic updates are put straight into the Application's update queue:
+every chat opens with /start, the rest are text messages, of which
+`start-ratio` are /start again. /start answers with reply_html, a round
+trip to a local fake Bot API delayed by `api-delay-ms`; text messages only
+touch the store and the websocket layer. Per-chat order is checked for
+every mode.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+
+from benchmarks.common import BENCH_TOKEN, bench_env, print_table, quiet_logs
+from benchmarks.fake_telegram import FakeBotAPI, make_text_update
+
+
+def make_workload(updates: int, chats: int, start_ratio: float, seed: int = 1):
+    rng = random.Random(seed)
+    workload = [(chat_id, "/start") for chat_id in range(1, chats + 1)]
+    for i in range(updates - len(workload)):
+        chat_id = rng.randint(1, chats)
+        workload.append((chat_id, "/start" if rng.random() < start_ratio else f"msg {i}"))
+    return workload
+
+
+async def run_mode(name: str, workers: int, base_url: str, workload) -> dict:
+    from telegram import Update
+    from telegram.ext import Application, TypeHandler
+
+    from src.bot.handlers import register_handlers
+    from src.bot.updates import ChatLaneUpdateProcessor
+    from src.data_store import reset_store
+
+    reset_store()
+    builder = Application.builder().token(BENCH_TOKEN).base_url(base_url)
+    processor = None
+    if workers:
+        processor = ChatLaneUpdateProcessor(workers)
+        builder = builder.concurrent_updates(processor)
+    application = builder.build()
+    register_handlers(application)
+
+    seen = defaultdict(list)
+    finished = asyncio.Event()
+
+    async def record(update, context):
+        seen[update.effective_chat.id].append(update.message.text)
+        if sum(map(len, seen.values())) == len(workload):
+            finished.set()
+
+    # Группа 1 выполняется после обработчиков бота: обновление обработано целиком.
+    application.add_handler(TypeHandler(Update, record), group=1)
+    await application.initialize()
+    await application.start()
+
+    updates = [
+        Update.de_json(make_text_update(chat_id, text, username=f"u{chat_id}"), application.bot)
+        for chat_id, text in workload
+    ]
+    started = time.perf_counter()
+    for update in updates:
+        application.update_queue.put_nowait(update)
+    await asyncio.wait_for(finished.wait(), 600)
+    elapsed = time.perf_counter() - started
+
+    await application.stop()
+    await application.shutdown()
+
+    expected = defaultdict(list)
+    for chat_id, text in workload:
+        expected[chat_id].append(text)
+    return {
+        "mode": name,
+        "updates": len(workload),
+        "seconds": elapsed,
+        "updates_per_s": len(workload) / elapsed,
+        "ordered": seen == expected,
+        "waited_behind_chat": processor.queued_behind_chat if processor else None,
+    }
+
+
+async def measure(args) -> list:
+    fake = FakeBotAPI(BENCH_TOKEN)
+    fake.send_delay = args.api_delay_ms / 1000
+    base_url = await fake.start()
+    workload = make_workload(args.updates, args.chats, args.start_ratio)
+    modes = [("sequential (PTB default)", 0)] + [
+        (f"chat lanes, {workers} workers", workers) for workers in args.workers
+    ]
+    try:
+        return [await run_mode(name, workers, base_url, workload) for name, workers in modes]
+    finally:
+        await fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--updates", type=int, default=3000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--start-ratio", type=float, default=0.1)
+    parser.add_argument("--api-delay-ms", type=float, default=20)
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 16, 64])
+    args = parser.parse_args()
+    bench_env()
+    quiet_logs()
+
+    rows = asyncio.run(measure(args))
+    print_table(
+        rows, ["mode", "updates", "seconds", "updates_per_s", "ordered", "waited_behind_chat"]
+    )
+
+
+if __name__ == "__main__":
+    main()
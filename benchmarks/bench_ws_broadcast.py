@@ -0,0 +1,125 @@
+"""
+WebSocket fan-out: latency from add_message() until every subscriber of the
+chat has received the frame, with 1, 10 and 100 connections per chat.
+
+    python -m benchmarks.bench_ws_broadcast [--messages 200] [--subscribers 1,10,100]
+
+Server and clients share one event loop over loopback, so the numbers
+include client-side receive work; they show how broadcast cost grows with
+the number of subscribers rather than absolute network latency.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import (
+    BENCH_TOKEN,
+    bench_env,
+    free_port,
+    print_table,
+    quiet_logs,
+    summarize_ms,
+)
+from benchmarks.fake_telegram import FakeBotAPI
+
+CHAT_ID = 888
+
+
+async def login_cookie(base_url: str) -> str:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        response = await client.post(
+            "/login",
+            data={"username": "bench", "access_code": "benchcode"},
+            follow_redirects=False,
+        )
+        assert response.status_code == 303, response.text
+        return "; ".join(f"{k}={v}" for k, v in client.cookies.items())
+
+
+async def subscriber(ws, received: dict, expected: int, done: asyncio.Event):
+    async for frame in ws:
+        text = json.loads(frame)["text"]
+        count = received.get(text, (0, 0.0))[0] + 1
+        received[text] = (count, time.perf_counter())
+        if count == expected:
+            done.set()
+
+
+async def measure(subscribers: int, messages: int, port: int, cookie: str) -> dict:
+    import websockets
+    from src.bot.core import add_message
+
+    url = f"ws://127.0.0.1:{port}/ws/{CHAT_ID}"
+    sockets = [
+        await websockets.connect(url, additional_headers={"Cookie": cookie})
+        for _ in range(subscribers)
+    ]
+    received: dict = {}
+    done = asyncio.Event()
+    readers = [
+        asyncio.create_task(subscriber(ws, received, subscribers, done))
+        for ws in sockets
+    ]
+    await asyncio.sleep(0.1)  # дать серверу зарегистрировать все соединения
+
+    latencies = []
+    for i in range(messages):
+        text = f"broadcast {i}"
+        done.clear()
+        started = time.perf_counter()
+        await add_message(CHAT_ID, "user", text)
+        await asyncio.wait_for(done.wait(), 10)
+        latencies.append(received[text][1] - started)
+
+    for task in readers:
+        task.cancel()
+    await asyncio.gather(*(ws.close() for ws in sockets))
+    await asyncio.sleep(0.1)
+    return {"subscribers": subscribers, **summarize_ms(latencies)}
+
+
+async def main_async(args):
+    fake = FakeBotAPI(BENCH_TOKEN)
+    bench_env(TELEGRAM_API_BASE_URL=await fake.start(), BOT_UPDATE_MODE="webhook")
+    import uvicorn
+    from src.app import app
+    from src.data_store import set_chat_session
+
+    quiet_logs()
+    port = free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    set_chat_session(CHAT_ID, "bench", "benchcode")
+
+    cookie = await login_cookie(f"http://127.0.0.1:{port}")
+    rows = []
+    for subscribers in args.subscribers:
+        rows.append(await measure(subscribers, args.messages, port, cookie))
+
+    server.should_exit = True
+    await server_task
+    await fake.stop()
+    print_table(rows, ["subscribers", "count", "mean_ms", "p50_ms", "p90_ms", "p99_ms"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument(
+        "--subscribers",
+        type=lambda value: [int(v) for v in value.split(",")],
+        default=[1, 10, 100],
+    )
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Helpers shared by the benchmark scripts."""
+
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+BENCH_TOKEN = "123456:BENCHMARK-TOKEN"
+# История прогонов для сравнения между запусками (не хранится в git).
+HISTORY_PATH = os.path.join(os.path.dirname(__file__), "results", "history.jsonl")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_env(**overrides: str) -> None:
+    """Sets the environment src.config reads; call before importing src."""
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", BENCH_TOKEN)
+    os.environ.setdefault("STATE_BACKEND", "memory")
+    os.environ.setdefault("BOT_LEADER_ELECTION", "0")
+    os.environ.update(overrides)
+
+
+def quiet_logs() -> None:
+    import logging
+
+    logging.getLogger("app_logger").setLevel(logging.WARNING)
+    logging.getLogger("telegram").setLevel(logging.WARNING)
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize_ms(latencies: List[float]) -> Dict[str, float]:
+    """Summarizes latencies given in seconds as milliseconds."""
+    return {
+        "count": len(latencies),
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def run_isolated(module: str, *args: str) -> Dict[str, Any]:
+    """
+    Runs `python -m module args...` in a fresh interpreter and parses the JSON
+    it prints last. Needed whenever settings are read from env at import time.
+    """
+    output = subprocess.run(
+        [sys.executable, "-m", module, *args],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+async def asgi_get(app, path: str, headers=()) -> tuple:
+    """Sends GET `path` straight to an ASGI app; returns (status, body bytes, response headers)."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), *headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    result = {"status": 0, "bytes": 0, "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            result["headers"] = message["headers"]
+        elif message["type"] == "http.response.body":
+            result["bytes"] += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return result["status"], result["bytes"], dict(result["headers"])
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def previous_run(bench: str, scenario: str, path: str = HISTORY_PATH) -> Optional[Dict[str, Any]]:
+    """The last recorded run of `bench`/`scenario`, or None."""
+    last = None
+    try:
+        with open(path, encoding="utf-8") as history:
+            for line in history:
+                run = json.loads(line)
+                if run["bench"] == bench and run["scenario"] == scenario:
+                    last = run
+    except FileNotFoundError:
+        pass
+    return last
+
+
+def record_run(
+    bench: str, scenario: str, metrics: Dict[str, float], path: str = HISTORY_PATH
+) -> Dict[str, Any]:
+    """Appends a run to the history file and returns it."""
+    run = {
+        "bench": bench,
+        "scenario": scenario,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "metrics": metrics,
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as history:
+        history.write(json.dumps(run, ensure_ascii=False) + "\n")
+    return run
+
+
+def compare_runs(
+    current: Dict[str, float], previous: Dict[str, float], tolerance: float
+) -> List[Dict[str, Any]]:
+    """
+    Compares metrics with the previous run. Metrics ending in "_per_s" are
+    better when higher, all others (latencies, losses) when lower; a change
+    for the worse beyond `tolerance` (0.2 = 20%) is a regression.
+    """
+    rows = []
+    for name, value in current.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        change = (value - before) / before if before else (0.0 if value == before else float("inf"))
+        worse = -change if name.endswith("_per_s") else change
+        verdict = "regression" if worse > tolerance else "better" if worse < -tolerance else "ok"
+        rows.append(
+            {
+                "metric": name,
+                "previous": before,
+                "current": value,
+                "change_pct": change * 100,
+                "verdict": verdict,
+            }
+        )
+    return rows
+
+
+def print_table(rows: List[Dict[str, Any]], columns: List[str]) -> None:
+    widths = [max(len(c), *(len(_fmt(r.get(c))) for r in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(_fmt(row.get(c)).ljust(w) for c, w in zip(columns, widths)))
+
+
+def _fmt(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return "" if value is None else str(value)
@@ -0,0 +1,215 @@
+"""
+Local stand-ins for Telegram used by tests and benchmarks.
+
+FakeBotAPI is a minimal Bot API server: it serves getUpdates from an
+in-memory queue (long polling) and records every outgoing call such as
+sendMessage. With limit_rates() it answers sendMessage with 429 and
+retry_after like Telegram's flood control. FakeTelegramSender pushes
+updates to a webhook the way Telegram does.
+"""
+
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from aiohttp import web
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+def make_text_update(
+    chat_id: int, text: str, username: str = "user", update_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """Builds a Telegram Update JSON with a private text message; a leading /command gets its entity."""
+    user = {"id": chat_id, "is_bot": False, "first_name": username, "username": username}
+    update = {
+        "update_id": update_id if update_id is not None else next(_update_ids),
+        "message": {
+            "message_id": next(_message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "username": username},
+            "from": user,
+            "text": text,
+        },
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        update["message"]["entities"] = [
+            {"type": "bot_command", "offset": 0, "length": len(command)}
+        ]
+    return update
+
+
+class FakeBotAPI:
+    """Serves /bot<token>/<method> on localhost and records calls."""
+
+    def __init__(self, token: str):
+        self.token = token
+        self.calls: List[Dict[str, Any]] = []
+        self._updates: List[Dict[str, Any]] = []
+        self._new_update = asyncio.Event()
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+        # Необязательная задержка ответа на send*-методы (имитация сети).
+        self.send_delay = 0.0
+        self._limits: Optional[Dict[str, float]] = None
+        self._buckets: Dict[Any, Tuple[float, float]] = {}
+        self.rate_limited = 0
+
+    def limit_rates(
+        self, global_rate: float, chat_rate: float, chat_burst: int, retry_after: int = 1
+    ):
+        """Enables flood control on sendMessage (token buckets, like the sender's)."""
+        self._limits = {
+            "global_rate": global_rate,
+            "chat_rate": chat_rate,
+            "chat_burst": chat_burst,
+            "retry_after": retry_after,
+        }
+        self._buckets.clear()
+
+    def _take_token(self, key: Any, rate: float, capacity: float) -> bool:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+    def _flood_controlled(self, chat_id: int) -> bool:
+        limits = self._limits
+        if not limits:
+            return False
+        # Небольшой допуск, как у настоящего Telegram: граница секунды не точная.
+        chat_ok = self._take_token(
+            ("chat", chat_id), limits["chat_rate"] * 1.05, limits["chat_burst"]
+        )
+        global_ok = chat_ok and self._take_token(
+            "global", limits["global_rate"] * 1.05, limits["global_rate"]
+        )
+        return not global_ok
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Starts the server and returns the base URL to pass to the Bot."""
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        app.router.add_get("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{bound_port}/bot"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    def push_update(self, update: Dict[str, Any]):
+        """Queues an update for the next getUpdates call."""
+        self._updates.append(update)
+        self._new_update.set()
+
+    def sent(self, method: str = "sendMessage") -> List[Dict[str, Any]]:
+        return [c for c in self.calls if c["method"] == method]
+
+    async def _params(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        form = await request.post()
+        params = {}
+        for key, value in form.items():
+            if isinstance(value, str):
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    params[key] = value
+            else:
+                params[key] = value
+        return params
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        if request.match_info["token"] != self.token:
+            return web.json_response(
+                {"ok": False, "error_code": 401, "description": "Unauthorized"},
+                status=401,
+            )
+        method = request.match_info["method"]
+        params = await self._params(request)
+        self.calls.append({"method": method, "params": params, "time": time.perf_counter()})
+        if method == "sendMessage" and self._flood_controlled(int(params["chat_id"])):
+            self.rate_limited += 1
+            retry_after = self._limits["retry_after"]
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                },
+                status=429,
+            )
+        handler = getattr(self, f"_method_{method}", None)
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _method_getMe(self, params):
+        return {
+            "id": 1,
+            "is_bot": True,
+            "first_name": "FakeBot",
+            "username": "fake_bot",
+            "can_join_groups": False,
+            "can_read_all_group_messages": False,
+            "supports_inline_queries": False,
+        }
+
+    async def _method_getUpdates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+        while True:
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            if self._updates or time.monotonic() >= deadline:
+                return list(self._updates[:100])
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(
+                    self._new_update.wait(), deadline - time.monotonic()
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    async def _method_sendMessage(self, params):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        return {
+            "message_id": next(_message_ids),
+            "date": int(time.time()),
+            "chat": {"id": int(params["chat_id"]), "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+    async def _method_getWebhookInfo(self, params):
+        return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+
+
+class FakeTelegramSender:
+    """Delivers updates to a webhook endpoint like Telegram would."""
+
+    def __init__(self, client: httpx.AsyncClient, url: str, secret_token: str):
+        self.client = client
+        self.url = url
+        self.secret_token = secret_token
+
+    async def send(self, update: Dict[str, Any]) -> httpx.Response:
+        return await self.client.post(
+            self.url, json=update, headers={SECRET_HEADER: self.secret_token}
+        )
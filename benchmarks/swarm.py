@@ -0,0 +1,98 @@
+"""
+Browser stand-ins for load tests: BrowserClient logs in over HTTP like the
+login form, keeps the chat's websocket open and sends messages over the
+socket or through POST /api/messages. Every received frame is timestamped
+with time.perf_counter() so latencies can be matched afterwards.
+"""
+
+import asyncio
+import itertools
+import json
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+
+ACCESS_CODE_RE = re.compile(r"Код доступа: <code>(\w+)</code>")
+
+_client_ids = itertools.count(1)
+
+
+def access_code_from(text: str) -> Optional[str]:
+    """Extracts the access code from the bot's /start reply."""
+    match = ACCESS_CODE_RE.search(text)
+    return match.group(1) if match else None
+
+
+class BrowserClient:
+    """One operator tab: its own cookie jar, one websocket, frames with receive times."""
+
+    def __init__(self, base_url: str, chat_id: int, username: str):
+        self.base_url = base_url
+        self.ws_url = base_url.replace("http", "ws", 1) + f"/ws/{chat_id}"
+        self.chat_id = chat_id
+        self.username = username
+        self.http = aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True))
+        self.ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self.frames: List[Dict[str, Any]] = []
+        self.on_frame: Optional[Callable[[Dict[str, Any], float], None]] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def login(self, access_code: str):
+        async with self.http.post(
+            f"{self.base_url}/login",
+            data={"username": self.username, "access_code": access_code},
+            allow_redirects=False,
+        ) as response:
+            if response.status != 303 or response.headers.get("location") != "/chat":
+                raise RuntimeError(f"Login for chat {self.chat_id} failed: {response.status}")
+
+    async def connect(self):
+        self.ws = await self.http.ws_connect(self.ws_url, heartbeat=None)
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        async for message in self.ws:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                break
+            received = time.perf_counter()
+            frame = json.loads(message.data)
+            if self.on_frame:
+                self.on_frame(frame, received)
+            else:
+                self.frames.append(frame)
+
+    async def send_ws(self, text: str) -> str:
+        client_id = f"c{next(_client_ids)}"
+        await self.ws.send_str(json.dumps({"type": "send", "client_id": client_id, "text": text}))
+        return client_id
+
+    async def send_http(self, text: str) -> str:
+        client_id = f"c{next(_client_ids)}"
+        async with self.http.post(
+            f"{self.base_url}/api/messages", json={"text": text, "client_id": client_id}
+        ) as response:
+            if response.status != 202:
+                raise RuntimeError(f"POST /api/messages for chat {self.chat_id}: {response.status}")
+        return client_id
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self._reader:
+            await asyncio.gather(self._reader, return_exceptions=True)
+        await self.http.close()
+
+
+async def gather_limited(
+    factories: List[Callable[[], Awaitable[Any]]], concurrency: int
+) -> List[Any]:
+    """Runs coroutine factories, at most `concurrency` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(factory):
+        async with semaphore:
+            return await factory()
+
+    return await asyncio.gather(*(run(factory) for factory in factories))
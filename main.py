@@ -1,17 +1,25 @@
 # main.py
 import uvicorn
 import os
+from dotenv import load_dotenv
 
 if __name__ == "__main__":
+    load_dotenv()
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0") # Важно для доступности извне
+    workers = int(os.getenv("WEB_CONCURRENCY", 4)) # Количество воркеров
+    # Несколько воркеров должны видеть одни и те же сессии и сообщения
+    if workers > 1:
+        os.environ.setdefault("STATE_BACKEND", "sqlite")
 
     # Для продакшена:
     uvicorn.run(
         "src.app:app",
         host=host,
         port=port,
-        workers=int(os.getenv("WEB_CONCURRENCY", 4)) # Количество воркеров
+        workers=workers,
+        # Время на дренаж (DRAIN_TIMEOUT) плюс запас на остальную остановку
+        timeout_graceful_shutdown=float(os.getenv("DRAIN_TIMEOUT", "10")) + 5,
         # proxy_headers=True, # Если за Nginx/Traefik и т.д.
         # forward_allow_ips='*' # Осторожно с этим, если не за прокси
     )
@@ -4,18 +4,30 @@ from fastapi import (
     FastAPI,
     Request,
 )  # Request может быть не нужен здесь, если не используется напрямую
-from fastapi.staticfiles import StaticFiles
-from starlette.middleware.sessions import SessionMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from src.config import (
-    SESSION_SECRET_KEY,
+    SESSION_HTTPS_ONLY,
     logger,
     STATIC_DIR,
     # TEMPLATES_DIR, # TEMPLATES_DIR импортируется в файлах роутов, здесь не обязателен
 )
 
-from src.bot.core import run_telegram_bot, stop_telegram_bot
-from src.routes import auth, chat, ws
+from src.bot.core import (
+    run_telegram_bot,
+    drain_and_stop,
+    media_relay,
+    relay_backend_events,
+    sweep_expired_sessions,
+)
+from src.data_store import backend, message_log, web_sessions
+from src.lifecycle import lifecycle
+from src.loop_monitor import loop_monitor
+from src.metrics import CONTENT_TYPE, registry
+from src.assets import StaticAssets
+from src.sessions import ServerSessionMiddleware
+from src.templating import assets
+from src.routes import admin, auth, chat, media, operator, ws, webhook
 
 
 @asynccontextmanager
@@ -23,6 +35,14 @@ async def lifespan(app: FastAPI):
     """Manages application startup and shutdown events."""
     logger.info("Application startup via lifespan...")
     bot_task = None
+    relay_task = None
+    if backend.shared:
+        relay_task = asyncio.create_task(relay_backend_events())
+    log_task = None
+    if message_log:
+        log_task = asyncio.create_task(message_log.run())
+    monitor_tasks = loop_monitor.start()
+    sweep_task = asyncio.create_task(sweep_expired_sessions())
     try:
         bot_task = asyncio.create_task(run_telegram_bot())
         await asyncio.sleep(0.1)
@@ -49,22 +69,50 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.error(f"Error waiting for cancelled bot task: {e}", exc_info=True)
 
-    logger.info("Calling stop_telegram_bot()...")
+    logger.info("Calling drain_and_stop()...")
     try:
-        await stop_telegram_bot()
+        await drain_and_stop()
     except Exception as e:
-        logger.error(f"Error during stop_telegram_bot: {e}", exc_info=True)
+        logger.error(f"Error during drain_and_stop: {e}", exc_info=True)
+
+    loop_monitor.stop()
+    for task in [sweep_task, *monitor_tasks]:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    if relay_task:
+        relay_task.cancel()
+        try:
+            await relay_task
+        except asyncio.CancelledError:
+            pass
+    if log_task:
+        log_task.cancel()
+        try:
+            await log_task
+        except asyncio.CancelledError:
+            pass
+        await message_log.close()
+        logger.info("Журнал сообщений сброшен на диск.")
+    await media_relay.close()
+    backend.close()
 
     logger.info("Application shutdown sequence complete.")
 
 
 app = FastAPI(title="Telegram Web Chat Bridge", lifespan=lifespan)
 
-app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET_KEY)
+app.add_middleware(
+    ServerSessionMiddleware, store=web_sessions, https_only=SESSION_HTTPS_ONLY
+)
 
 try:
-    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
-    logger.info(f"Mounted static files from directory: {STATIC_DIR}")
+    app.mount("/static", StaticAssets(assets, STATIC_DIR), name="static")
+    logger.info(
+        f"Mounted static files from directory: {STATIC_DIR} ({len(assets)} cached in memory)"
+    )
 except RuntimeError as e:
     logger.error(
         f"Failed to mount static files directory '{STATIC_DIR}': {e}. Please ensure it exists.",
@@ -77,10 +125,22 @@ logger.info("Including routers...")
 app.include_router(auth.router)
 app.include_router(chat.router)
 app.include_router(ws.router)
+app.include_router(webhook.router)
+app.include_router(admin.router)
+app.include_router(operator.router)
+app.include_router(media.router)
 logger.info("Routers included.")
 
 
 @app.get("/health", tags=["System"], summary="Perform a Health Check")
 async def health_check():
-    """Returns a simple status indicating the API is running."""
+    """Returns a simple status indicating the API is running; 503 while the worker drains."""
+    if lifecycle.draining:
+        return JSONResponse({"status": "draining"}, status_code=503)
     return {"status": "ok"}
+
+
+@app.get("/metrics", tags=["System"], summary="Prometheus Metrics")
+async def metrics():
+    """Counters, gauges and latency histograms of this worker in the Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,193 @@
+import functools
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, List, Optional, Tuple
+
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость: без нее отдается только gzip
+    brotli = None
+
+RawHeaders = List[Tuple[bytes, bytes]]
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+CACHE_IMMUTABLE = b"public, max-age=31536000, immutable"
+CACHE_REVALIDATE = b"no-cache"
+
+
+@functools.lru_cache(maxsize=256)
+def negotiate(accept_encoding: str, available: Tuple[str, ...]) -> str:
+    """
+    Picks "br", then "gzip" among the `available` variants if Accept-Encoding
+    allows it (q > 0); "" means the uncompressed body. Header values repeat
+    across clients, so results are cached.
+    """
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return ""
+
+
+class PrecomputedResponse(Response):
+    """A response whose body and raw headers were built once, ahead of the request."""
+
+    def __init__(self, status_code: int, body: bytes, raw_headers: RawHeaders):
+        self.status_code = status_code
+        self.body = body
+        self.background = None
+        # Копия: middleware (например, SessionMiddleware) дописывают заголовки на месте.
+        self.raw_headers = list(raw_headers)
+
+
+class Asset:
+    """
+    A file (or rendered page) held in memory with precompressed gzip/brotli
+    variants and the ready-made headers of each, so serving it is a dict
+    lookup. The ETag is the content hash, distinct per encoding.
+    """
+
+    __slots__ = ("digest", "media_type", "encodings", "_variants")
+
+    def __init__(self, body: bytes, media_type: str, min_compress: int = 512):
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.media_type = media_type
+        bodies = {"": body}
+        if media_type.startswith(COMPRESSIBLE_TYPES) and len(body) >= min_compress:
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                bodies["gzip"] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    bodies["br"] = compressed
+        self.encodings = tuple(bodies)
+        self._variants: Dict[Tuple[str, bool], Tuple[bytes, bytes, RawHeaders]] = {}
+        for encoding, data in bodies.items():
+            etag = f'"{self.digest[:16]}{"-" + encoding if encoding else ""}"'.encode()
+            for immutable in (False, True):
+                headers = [
+                    (b"content-type", media_type.encode()),
+                    (b"content-length", str(len(data)).encode()),
+                    (b"etag", etag),
+                    (b"cache-control", CACHE_IMMUTABLE if immutable else CACHE_REVALIDATE),
+                ]
+                if len(bodies) > 1:
+                    headers.append((b"vary", b"Accept-Encoding"))
+                if encoding:
+                    headers.append((b"content-encoding", encoding.encode()))
+                self._variants[encoding, immutable] = (data, etag, headers)
+
+    def response(
+        self,
+        accept_encoding: str = "",
+        if_none_match: str = "",
+        immutable: bool = False,
+        status_code: int = 200,
+    ) -> PrecomputedResponse:
+        encoding = negotiate(accept_encoding, self.encodings) if len(self.encodings) > 1 else ""
+        body, etag, headers = self._variants[encoding, immutable]
+        if status_code == 200 and if_none_match and etag.decode() in if_none_match:
+            return PrecomputedResponse(
+                304, b"", [h for h in headers if h[0] not in (b"content-length", b"content-type")]
+            )
+        return PrecomputedResponse(status_code, body, headers)
+
+
+class AssetManifest:
+    """
+    The files under a static directory, loaded once at startup. Each file is
+    also reachable under a content-hashed name (css/style.<hash>.css) that is
+    served with an immutable cache header, so browsers never revalidate it;
+    templates link to that name through url(). Files larger than
+    `max_bytes` are left to the fallback file server.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str = "/static",
+        max_bytes: int = 1024 * 1024,
+        min_compress: int = 512,
+    ):
+        self.directory = directory
+        self.prefix = prefix.rstrip("/")
+        self._by_path: Dict[str, Tuple[Asset, bool]] = {}
+        self._urls: Dict[str, str] = {}
+        if not os.path.isdir(directory):
+            return
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                full_path = os.path.join(root, filename)
+                if os.path.getsize(full_path) > max_bytes:
+                    continue
+                path = os.path.relpath(full_path, directory).replace(os.sep, "/")
+                with open(full_path, "rb") as f:
+                    body = f.read()
+                media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                if media_type.startswith("text/"):
+                    media_type += "; charset=utf-8"
+                asset = Asset(body, media_type, min_compress)
+                stem, ext = os.path.splitext(path)
+                hashed_path = f"{stem}.{asset.digest[:10]}{ext}"
+                self._by_path[path] = (asset, False)
+                self._by_path[hashed_path] = (asset, True)
+                self._urls[path] = f"{self.prefix}/{hashed_path}"
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def url(self, path: str) -> str:
+        """URL of a static file: the content-hashed one if the file is known."""
+        path = path.lstrip("/")
+        return self._urls.get(path) or f"{self.prefix}/{path}"
+
+    def lookup(self, path: str) -> Optional[Tuple[Asset, bool]]:
+        """(asset, immutable) for a path relative to the static directory."""
+        return self._by_path.get(path)
+
+
+class StaticAssets:
+    """
+    ASGI app for /static: serves manifest files from memory with the best
+    encoding the client accepts, ETag/304 and cache headers; anything else
+    (large files, files added after startup) goes to StaticFiles.
+    """
+
+    def __init__(self, manifest: AssetManifest, directory: str):
+        self.manifest = manifest
+        self.fallback = StaticFiles(directory=directory)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            path, root_path = scope["path"], scope.get("root_path", "")
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            entry = self.manifest.lookup(path.lstrip("/"))
+            if entry is not None:
+                asset, immutable = entry
+                accept_encoding = if_none_match = ""
+                for name, value in scope["headers"]:
+                    if name == b"accept-encoding":
+                        accept_encoding = value.decode("latin-1")
+                    elif name == b"if-none-match":
+                        if_none_match = value.decode("latin-1")
+                response = asset.response(accept_encoding, if_none_match, immutable)
+                await response(scope, receive, send)
+                return
+        await self.fallback(scope, receive, send)
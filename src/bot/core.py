@@ -1,8 +1,12 @@
 import secrets  # Добавьте этот импорт, если он отсутствует
 import asyncio
-from datetime import datetime  # Добавьте этот импорт, если он отсутствует
+import logging
+import time
+from typing import Optional
 
-from telegram import Bot  # Добавьте этот импорт, если он отсутствует
+import httpx
+
+from telegram import Bot, Update  # Добавьте этот импорт, если он отсутствует
 from telegram.ext import Application
 from fastapi import (
     status,
@@ -10,22 +14,119 @@ from fastapi import (
     WebSocketDisconnect,
 )
 
-from src.config import BOT_TOKEN, ACCESS_CODE_LENGTH, logger
+from src.config import (
+    BOT_TOKEN,
+    ACCESS_CODE_LENGTH,
+    STATE_POLL_INTERVAL,
+    BOT_LEADER_ELECTION,
+    BOT_LEADER_LOCK_PATH,
+    BOT_LEADER_RETRY_INTERVAL,
+    BOT_UPDATE_MODE,
+    BOT_CONCURRENT_UPDATES,
+    BOT_MAX_PENDING_UPDATES,
+    TELEGRAM_API_BASE_URL,
+    TELEGRAM_FILE_BASE_URL,
+    WEBHOOK_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET_TOKEN,
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_CHAT_RATE,
+    TELEGRAM_CHAT_BURST,
+    TELEGRAM_SEND_CONCURRENCY,
+    TELEGRAM_SEND_MAX_ATTEMPTS,
+    TELEGRAM_POOL_SIZE,
+    TELEGRAM_KEEPALIVE_EXPIRY,
+    TELEGRAM_HTTP_VERSION,
+    TELEGRAM_CONNECT_TIMEOUT,
+    TELEGRAM_READ_TIMEOUT,
+    TELEGRAM_WRITE_TIMEOUT,
+    TELEGRAM_POOL_TIMEOUT,
+    SWEEP_INTERVAL,
+    SWEEP_BATCH,
+    DRAIN_TIMEOUT,
+    MAX_MESSAGE_LENGTH,
+    MAX_CAPTION_LENGTH,
+    MEDIA_CACHE_DIR,
+    MEDIA_CACHE_MB,
+    MEDIA_CHUNK_KB,
+    MEDIA_TIMEOUT,
+    logger,
+    message_log_sampler,
+)
+from src.bot.http import BotAPIStats, PooledHTTPXRequest
+from src.bot.leader import LeaderElector
+from src.bot.sender import OutboundSender
+from src.bot.updates import ChatLaneUpdateProcessor, UpdateQueue
+from src.lifecycle import lifecycle
+from src.metrics import Counter, Gauge, registry, ws_broadcast_seconds
 from src.data_store import (
-    chats_data,
-    code_to_chat_id,  # Убедитесь, что используется, иначе можно удалить этот импорт
-    active_websockets,
-    remove_active_websocket,
-    get_active_websocket,
+    WORKER_ID,
+    connections,
+    remove_chat_websockets,
+    get_chat_data,
+    chat_exists,
     clear_chat_session,
     add_message_to_store,
+    publish_chat_event,
+    poll_chat_events,
+    expire_sessions,
+    web_sessions,
+    message_log,
+    operators,
+    search,
 )
+from src.inbox import INBOX_CHANNEL
+from src.media import MediaCache, MediaRelay, MediaUpload, media_from_message
 
 # --- Bot Initialization ---
-telegram_bot = Bot(token=BOT_TOKEN)
+bot_api_stats = BotAPIStats()
+
+
+def build_bot_request() -> PooledHTTPXRequest:
+    """The pooled HTTP client used for every Bot API call except getUpdates."""
+    return PooledHTTPXRequest(
+        bot_api_stats,
+        keepalive_expiry=TELEGRAM_KEEPALIVE_EXPIRY,
+        connection_pool_size=TELEGRAM_POOL_SIZE,
+        http_version=TELEGRAM_HTTP_VERSION,
+        connect_timeout=TELEGRAM_CONNECT_TIMEOUT,
+        read_timeout=TELEGRAM_READ_TIMEOUT,
+        write_timeout=TELEGRAM_WRITE_TIMEOUT,
+        pool_timeout=TELEGRAM_POOL_TIMEOUT,
+    )
+
+
 # Note: Building the application requires handlers, so we initialize later or pass handlers in.
 # For simplicity, we'll build it fully in app.py after importing handlers.
-application = Application.builder().token(BOT_TOKEN).build()
+# getUpdates держит соединение на весь long poll, поэтому у него свой клиент (PTB по умолчанию).
+# Обновления разных чатов обрабатываются параллельно, одного чата — строго по порядку.
+# Когда в работе и в ожидании BOT_MAX_PENDING_UPDATES обновлений, очередь перестает их отдавать;
+# еще BOT_CONCURRENT_UPDATES ждут в самой очереди, дальше прием останавливается.
+update_processor = ChatLaneUpdateProcessor(BOT_CONCURRENT_UPDATES, BOT_MAX_PENDING_UPDATES)
+application = (
+    Application.builder()
+    .token(BOT_TOKEN)
+    .update_queue(UpdateQueue(update_processor, BOT_CONCURRENT_UPDATES))
+    .base_url(TELEGRAM_API_BASE_URL)
+    .base_file_url(TELEGRAM_FILE_BASE_URL)
+    .request(build_bot_request())
+    .concurrent_updates(update_processor)
+    .build()
+)
+# Веб-отправка и ответы обработчиков идут через один бот и один пул соединений;
+# он инициализируется и закрывается вместе с application в lifespan.
+telegram_bot = application.bot
+bot_leader = LeaderElector(BOT_LEADER_LOCK_PATH)
+# Файлы идут отдельным клиентом: у них свои таймауты, и долгая передача не должна
+# занимать соединения пула Bot API. Клиент закрывается в lifespan.
+media_cache = MediaCache(MEDIA_CACHE_DIR, int(MEDIA_CACHE_MB * 1024 * 1024))
+media_relay = MediaRelay(
+    telegram_bot,
+    media_cache,
+    httpx.AsyncClient(timeout=httpx.Timeout(MEDIA_TIMEOUT, connect=TELEGRAM_CONNECT_TIMEOUT)),
+    api_url=TELEGRAM_API_BASE_URL + BOT_TOKEN,
+    chunk_size=MEDIA_CHUNK_KB * 1024,
+)
 
 
 # --- Helper Functions ---
@@ -35,60 +136,70 @@ def generate_access_code() -> str:
 
 
 async def notify_websocket_of_message(chat_id: int, message_data: dict):
-    """Sends message data to the active websocket for the chat."""
-    websocket = get_active_websocket(chat_id)
-    if websocket:
-        logger.info(
-            f"[notify_websocket] Found active websocket for chat_id {chat_id}. Attempting to send: {message_data}"
-        )
-        try:
-            await websocket.send_json(message_data)
-            logger.info(
-                f"[notify_websocket] Message successfully sent via WebSocket for chat_id {chat_id}"
-            )
-        except WebSocketDisconnect:
-            logger.warning(
-                f"[notify_websocket] WebSocket for chat_id {chat_id} disconnected before message send."
-            )
-            remove_active_websocket(chat_id)  # Clean up disconnected socket
-        except Exception as e:
-            logger.error(
-                f"[notify_websocket] Error sending via WebSocket for chat_id {chat_id}: {e}"
-            )
-    else:
-        logger.warning(
-            f"[notify_websocket] No active websocket found for chat_id {chat_id} when trying to send message."
+    """Queues message data for every websocket connected to the chat."""
+    # Не ждем сети: кадры отправляют фоновые писатели соединений (src/connections.py).
+    started = time.perf_counter()
+    delivered = connections.broadcast(chat_id, message_data)
+    ws_broadcast_seconds.observe(time.perf_counter() - started)
+    # Чат без открытой вкладки — обычное дело (или сокет на другом воркере), поэтому debug.
+    if not delivered and logger.isEnabledFor(logging.DEBUG) and message_log_sampler():
+        logger.debug(
+            "[notify_websocket] No active websocket for chat_id %s",
+            chat_id,
+            extra={"chat_id": chat_id},
         )
 
 
-async def add_message(chat_id: int, sender: str, text: str) -> bool:
-    """Adds message to store and notifies WebSocket."""
-    if chat_id not in chats_data:  # Check if chat exists (e.g., after /start)
+async def add_message(
+    chat_id: int,
+    sender: str,
+    text: str,
+    client_id: Optional[str] = None,
+    media: Optional[dict] = None,
+) -> Optional[dict]:
+    """
+    Adds message to store and notifies WebSocket. Returns the stored message.
+    `client_id` (not stored) lets the sending page match its optimistic copy;
+    `media` is the metadata of an attached file, `text` then is its caption.
+    """
+    if not chat_exists(chat_id):  # Check if chat exists (e.g., after /start)
         logger.warning(
             f"[add_message] Попытка добавить сообщение для не инициализированного chat_id: {chat_id}"
         )
-        return False  # Добавлено для корректности
+        return None
 
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    message_data = add_message_to_store(chat_id, sender, text, timestamp)
+    message_data = add_message_to_store(chat_id, sender, text, int(time.time()), media)
 
     if message_data:
-        logger.info(
-            f"[add_message] Сообщение добавлено для chat_id {chat_id}: {message_data}"
-        )
-        await notify_websocket_of_message(chat_id, message_data)
-        return True  # Добавлено для корректности
+        # Текст сообщения в лог не пишется; строка на каждое сообщение — только выборочно.
+        if logger.isEnabledFor(logging.DEBUG) and message_log_sampler():
+            logger.debug(
+                "[add_message] Сообщение %s от %s добавлено для chat_id %s (%d симв.)",
+                message_data["seq"],
+                sender,
+                chat_id,
+                len(text),
+                extra={"chat_id": chat_id, "seq": message_data["seq"], "sender": sender},
+            )
+        frame = dict(message_data, client_id=client_id) if client_id else message_data
+        publish_chat_event(chat_id, {"type": "message", "message": frame})
+        await notify_websocket_of_message(chat_id, frame)
+        return message_data
     else:
         logger.error(
             f"[add_message] Не удалось сохранить сообщение для chat_id {chat_id}"
         )
-        return False  # Добавлено для корректности
+        return None
 
 
 async def close_existing_session(chat_id: int) -> bool:
-    """Closes an existing session for a chat_id."""
+    """
+    Closes an existing session for a chat_id: the access code, every browser
+    session logged into the chat (their cookies stop working on the next
+    request) and the chat's websockets.
+    """
     logger.info(f"Попытка закрыть существующую сессию для chat_id: {chat_id}")
-    chat_info = chats_data.get(chat_id)
+    chat_info = get_chat_data(chat_id)
     if not chat_info or not chat_info.get("access_code"):
         logger.info(f"Нет активной сессии для закрытия для chat_id: {chat_id}")
         return False  # Добавлено для корректности
@@ -101,26 +212,288 @@ async def close_existing_session(chat_id: int) -> bool:
         f"Данные сессии (код доступа) очищены для chat_id: {chat_id}. Старый код: {old_code}"
     )
 
-    # Close active WebSocket
-    websocket = remove_active_websocket(chat_id)  # Removes and gets the socket
-    if websocket:
-        try:
-            await websocket.close(
-                code=status.WS_1001_GOING_AWAY, reason="Session closed by user/system"
-            )
-            logger.info(f"Активный WebSocket для chat_id {chat_id} закрыт.")
-        except Exception as e:
-            logger.error(f"Ошибка при закрытии WebSocket для chat_id {chat_id}: {e}")
-    else:
+    # Сокет этого чата может висеть на другом воркере — сообщаем всем.
+    publish_chat_event(chat_id, {"type": "close_session"})
+    await close_local_websocket(chat_id)
+    return True  # Добавлено для корректности
+
+
+async def close_local_websocket(
+    chat_id: int,
+    code: int = status.WS_1008_POLICY_VIOLATION,
+    reason: str = "Session closed by user/system",
+):
+    """
+    Closes all websockets of a chat connected to this worker. The default
+    1008 tells the page the session is over; 1001 lets it reconnect.
+    """
+    sockets = remove_chat_websockets(chat_id)  # Removes and gets the sockets
+    if not sockets:
         logger.info(
             f"Активный WebSocket для chat_id {chat_id} не найден при закрытии сессии."
         )
-    return True  # Добавлено для корректности
+        return
+    results = await asyncio.gather(
+        *(ws.close(code=code, reason=reason) for ws in sockets),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка при закрытии WebSocket для chat_id {chat_id}: {result}")
+    logger.info(f"Активные WebSocket для chat_id {chat_id} закрыты: {len(sockets)}.")
+
+
+async def notify_delivery_status(chat_id: int, payload: dict):
+    """Reports the delivery status of a web message to the chat's websockets."""
+    publish_chat_event(chat_id, payload)
+    connections.broadcast(chat_id, payload)
+    operators.forward(chat_id, payload)
+
+
+async def store_sent_message(
+    chat_id: int, text: str, client_id: Optional[str] = None, media: Optional[dict] = None
+) -> Optional[dict]:
+    """Stores a message the admin sent through the web UI once Telegram accepted it."""
+    return await add_message(chat_id, "admin", text, client_id, media)
+
+
+async def send_web_media(chat_id: int, upload: MediaUpload) -> Optional[dict]:
+    """Sends a file from the web UI to Telegram and returns the metadata to store for it."""
+    sent = await media_relay.upload(chat_id, upload)
+    return media_from_message(sent)
+
+
+# Исходящие сообщения из веб-интерфейса: очередь с лимитами Telegram (src/bot/sender.py).
+outbound_sender = OutboundSender(
+    telegram_bot,
+    on_sent=store_sent_message,
+    on_status=notify_delivery_status,
+    send_upload=send_web_media,
+    global_rate=TELEGRAM_GLOBAL_RATE,
+    chat_rate=TELEGRAM_CHAT_RATE,
+    chat_burst=TELEGRAM_CHAT_BURST,
+    concurrency=TELEGRAM_SEND_CONCURRENCY,
+    max_attempts=TELEGRAM_SEND_MAX_ATTEMPTS,
+)
+
+registry.register(
+    Gauge(
+        "webbridge_outbound_pending",
+        "Web messages queued or in flight to Telegram.",
+        function=outbound_sender.pending,
+    )
+)
+registry.register(
+    Counter(
+        "webbridge_outbound_messages",
+        "Web messages by delivery outcome.",
+        ["outcome"],
+        function=lambda: {
+            outcome: value
+            for outcome, value in outbound_sender.stats().items()
+            if outcome != "pending"
+        },
+    )
+)
+registry.register(
+    Gauge(
+        "webbridge_media_cache_bytes",
+        "Bytes of relayed files kept in the on-disk cache.",
+        function=lambda: media_cache.bytes_used,
+    )
+)
+registry.register(
+    Counter(
+        "webbridge_media_cache_lookups",
+        "Cache lookups of relayed files by result.",
+        ["result"],
+        function=lambda: {"hit": media_cache.hits, "miss": media_cache.misses},
+    )
+)
+registry.register(
+    Counter(
+        "webbridge_media_bytes",
+        "File bytes relayed between Telegram and the web UI.",
+        ["direction"],
+        function=lambda: {
+            "download": media_relay.downloaded_bytes,
+            "upload": media_relay.uploaded_bytes,
+        },
+    )
+)
+registry.register(
+    Gauge(
+        "webbridge_updates_running",
+        "Telegram updates being handled right now.",
+        function=lambda: update_processor.running,
+    )
+)
+registry.register(
+    Gauge(
+        "webbridge_update_lanes",
+        "Chats with a Telegram update in progress or waiting.",
+        function=update_processor.lanes,
+    )
+)
+registry.register(
+    Counter(
+        "webbridge_updates_queued_behind_chat",
+        "Telegram updates that waited for an earlier update of the same chat.",
+        function=lambda: update_processor.queued_behind_chat,
+    )
+)
+registry.register(
+    Counter(
+        "webbridge_bot_api_requests",
+        "Requests made through the shared Bot API client.",
+        function=lambda: bot_api_stats.requests,
+    )
+)
+registry.register(
+    Counter(
+        "webbridge_bot_api_connections_opened",
+        "TCP connections opened by the shared Bot API client.",
+        function=lambda: bot_api_stats.connections_opened,
+    )
+)
+
+
+def queue_web_message(chat_id: int, text: str, client_id: Optional[str] = None) -> Optional[str]:
+    """
+    Validates a message typed in the web UI and queues it for Telegram.
+    Returns an error description if the message was rejected.
+    """
+    if not text or not text.strip():
+        return "Пустое сообщение"
+    if len(text) > MAX_MESSAGE_LENGTH:
+        return f"Сообщение длиннее {MAX_MESSAGE_LENGTH} символов"
+    if logger.isEnabledFor(logging.DEBUG) and message_log_sampler():
+        logger.debug(
+            "Отправка сообщения от админа в chat_id %s (%d симв.)",
+            chat_id,
+            len(text),
+            extra={"chat_id": chat_id},
+        )
+    outbound_sender.submit(chat_id, text, client_id)
+    return None
+
+
+def queue_web_media(
+    chat_id: int, upload: MediaUpload, client_id: Optional[str] = None
+) -> Optional[str]:
+    """
+    Validates a file posted from the web UI and queues it for Telegram; the
+    queue owns the file from then on. Returns an error description (and
+    closes the file) if it was rejected.
+    """
+    error = None
+    if not upload.size:
+        error = "Пустой файл"
+    elif len(upload.caption) > MAX_CAPTION_LENGTH:
+        error = f"Подпись длиннее {MAX_CAPTION_LENGTH} символов"
+    if error:
+        upload.close()
+        return error
+    if logger.isEnabledFor(logging.DEBUG) and message_log_sampler():
+        logger.debug(
+            "Отправка файла (%s, %d байт) в chat_id %s",
+            upload.kind,
+            upload.size,
+            chat_id,
+            extra={"chat_id": chat_id},
+        )
+    outbound_sender.submit(chat_id, upload.caption, client_id, upload=upload)
+    return None
+
+
+async def relay_backend_events():
+    """Delivers chat events published by other workers to local websockets."""
+    logger.info("Запуск ретрансляции событий между воркерами...")
+    while True:
+        try:
+            events = poll_chat_events()
+        except Exception as e:
+            logger.error(f"Ошибка чтения событий из хранилища: {e}", exc_info=True)
+            events = []
+        for chat_id, event in events:
+            if chat_id == INBOX_CHANNEL:
+                operators.apply(event)
+            elif event.get("type") == "message":
+                if connections.has(chat_id):
+                    await notify_websocket_of_message(chat_id, event["message"])
+            elif event.get("type") == "delivery":
+                connections.broadcast(chat_id, event)
+            elif event.get("type") == "close_session":
+                # Сессии браузеров уже отозваны в хранилище; сбрасываем их локальный кэш.
+                web_sessions.forget_chat(chat_id)
+                if connections.has(chat_id):
+                    await close_local_websocket(chat_id)
+        await asyncio.sleep(STATE_POLL_INTERVAL)
+
+
+sweeper_evictions = registry.register(
+    Counter(
+        "webbridge_sweeper_evictions",
+        "Sessions expired and orphaned websocket chats closed by the sweeper.",
+        ["kind"],
+    )
+)
+expired_sessions_total = sweeper_evictions.labels("session")
+orphaned_chats_total = sweeper_evictions.labels("orphaned_sockets")
+
+
+async def sweep_once(now: float, batch: int = SWEEP_BATCH) -> int:
+    """
+    One sweeper pass. Works in slices of `batch` records and yields to the
+    event loop between slices, so a large backlog never blocks it for long.
+    Returns the number of sessions that expired.
+    """
+    expired_count = 0
+    while True:
+        expired, processed = expire_sessions(now, batch)
+        for chat_id in expired:
+            logger.info("Сессия chat_id %s истекла по неактивности.", chat_id)
+            publish_chat_event(chat_id, {"type": "close_session"})
+            if connections.has(chat_id):
+                await close_local_websocket(chat_id)
+        expired_count += len(expired)
+        expired_sessions_total.inc(len(expired))
+        if processed < batch:
+            break
+        await asyncio.sleep(0)
+
+    # Сокеты чатов, у которых больше нет сессии (например, пропущено событие другого воркера).
+    chat_ids = connections.chat_ids()
+    for start in range(0, len(chat_ids), batch):
+        for chat_id in chat_ids[start : start + batch]:
+            if chat_id == INBOX_CHANNEL:
+                continue  # сокеты операторов не привязаны к сессии чата
+            chat_info = get_chat_data(chat_id)
+            if not chat_info or not chat_info.get("access_code"):
+                orphaned_chats_total.inc()
+                await close_local_websocket(chat_id)
+        await asyncio.sleep(0)
+
+    # Индекс поиска догоняет общее хранилище и перестраивается, когда большая часть
+    # его документов уже удалена из хранилища.
+    await search.maintain()
+    return expired_count
+
+
+async def sweep_expired_sessions():
+    """Background task: expires idle sessions and chats every SWEEP_INTERVAL seconds."""
+    logger.info("Запуск фоновой очистки сессий...")
+    while True:
+        try:
+            await sweep_once(time.time())
+        except Exception as e:
+            logger.error(f"Ошибка фоновой очистки сессий: {e}", exc_info=True)
+        await asyncio.sleep(SWEEP_INTERVAL)
 
 
 # --- Bot Lifecycle Management ---
 async def run_telegram_bot():
-    """Initializes handlers and starts the Telegram bot polling."""
+    """Initializes handlers and starts receiving updates (polling or webhook)."""
     from src.bot.handlers import register_handlers  # Avoid circular import
 
     logger.info("Регистрация обработчиков Telegram...")
@@ -130,7 +503,29 @@ async def run_telegram_bot():
     try:
         await application.initialize()
         await application.start()
-        await application.updater.start_polling(drop_pending_updates=True)
+        if BOT_UPDATE_MODE == "webhook":
+            # Обновления приходят POST-запросами на любой воркер (src/routes/webhook.py).
+            logger.info("Telegram бот запущен в режиме webhook.")
+            if WEBHOOK_URL:
+                if BOT_LEADER_ELECTION:
+                    # setWebhook вызывает только лидер: один вызов на смену лидера,
+                    # а не на каждый воркер при каждом перезапуске.
+                    await bot_leader.wait_for_leadership(BOT_LEADER_RETRY_INTERVAL)
+                await application.bot.set_webhook(
+                    url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                    secret_token=WEBHOOK_SECRET_TOKEN,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+                logger.info(f"Webhook зарегистрирован в Telegram (worker {WORKER_ID}).")
+            return
+        if BOT_LEADER_ELECTION:
+            # getUpdates вызывает только лидер; остальные воркеры ждут своей очереди.
+            await bot_leader.wait_for_leadership(BOT_LEADER_RETRY_INTERVAL)
+            logger.info(f"Процесс стал лидером опроса Telegram (worker {WORKER_ID}).")
+        # При смене лидера накопившиеся обновления нельзя отбрасывать — они не обработаны.
+        await application.updater.start_polling(
+            drop_pending_updates=not BOT_LEADER_ELECTION
+        )
         logger.info("Telegram Bot Polling запущен.")
     except Exception as e:
         logger.error(f"Ошибка при запуске Telegram бота: {e}", exc_info=True)
@@ -138,33 +533,64 @@ async def run_telegram_bot():
         raise  # Добавлено для проброса исключения, если это нужно для lifespan
 
 
+async def drain_connections(timeout: float) -> int:
+    """
+    Puts the worker in drain mode (no new logins or websockets) and closes
+    its websockets concurrently with 1012 "service restart", after the
+    frames already queued for them. Pages reconnect right away, through the
+    load balancer to another worker. Returns how many sockets did not close
+    within `timeout` seconds.
+    """
+    if lifecycle.start_draining():
+        logger.info("Дренаж: воркер больше не принимает входы и WebSocket.")
+    total = connections.count()
+    if not total:
+        return 0
+    stuck = await connections.close_all(
+        status.WS_1012_SERVICE_RESTART, "Server restarting", timeout
+    )
+    logger.info("Дренаж: закрыто WebSocket: %d из %d.", total - stuck, total)
+    return stuck
+
+
+async def drain_and_stop(timeout: float = DRAIN_TIMEOUT):
+    """
+    Graceful shutdown within `timeout` seconds in total: drain websockets
+    (half of the budget at most), deliver what is queued for Telegram, flush
+    the message journal, and only then stop the updater, so updates keep
+    being processed until everything before them is saved.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    await drain_connections(timeout / 2)
+
+    unsent = await outbound_sender.flush(max(0.0, deadline - loop.time()))
+    if unsent:
+        logger.warning("Дренаж: не отправлено в Telegram до истечения срока: %d.", unsent)
+    await outbound_sender.stop()
+    if message_log:
+        await asyncio.to_thread(message_log.flush)
+
+    await stop_telegram_bot()
+
+
 async def stop_telegram_bot():
-    """Stops the Telegram bot and closes active websockets."""
+    """Stops the Telegram bot and closes websockets left after draining."""
     logger.info("Остановка Telegram Bot Polling...")
 
-    # Close all active WebSockets gracefully
-    chat_ids = list(active_websockets.keys())  # Copy keys as dict size may change
-    for chat_id in chat_ids:
-        ws = remove_active_websocket(chat_id)
-        if ws:
-            try:
-                await ws.close(
-                    code=status.WS_1001_GOING_AWAY, reason="Server shutting down"
-                )
-                logger.info(
-                    f"WebSocket для chat_id {chat_id} закрыт при остановке сервера."
-                )
-            except Exception as e:
-                logger.error(
-                    f"Ошибка при закрытии WebSocket для chat_id {chat_id} при остановке: {e}"
-                )
+    for chat_id in connections.chat_ids():
+        await close_local_websocket(
+            chat_id, code=status.WS_1001_GOING_AWAY, reason="Server shutting down"
+        )
 
     # Stop the bot
     if application.updater and application.updater.running:
         logger.info("Stopping Updater...")
         await application.updater.stop()
-    logger.info("Stopping Application...")
-    await application.stop()
+    bot_leader.release()
+    if application.running:
+        logger.info("Stopping Application...")
+        await application.stop()
     logger.info("Shutting down Application...")
     await application.shutdown()
     logger.info("Telegram Bot Polling остановлен.")
@@ -1,3 +1,5 @@
+import logging
+
 from telegram import Update
 from telegram.ext import (
     Application,
@@ -8,8 +10,10 @@ from telegram.ext import (
 )
 from telegram.constants import ParseMode
 
-from src.config import logger
-from src.data_store import chats_data, set_chat_session, get_chat_data
+from src.config import logger, message_log_sampler
+from src.metrics import timed, update_handler_seconds
+from src.data_store import set_chat_session, set_chat_username, get_chat_data
+from src.media import media_from_message
 from src.bot.core import (
     generate_access_code,
     close_existing_session,
@@ -23,6 +27,7 @@ from src.bot.keyboard import (
 )
 
 
+@timed(update_handler_seconds.labels("start"))
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles /start command. Sends greeting, generates code if needed, shows keyboard."""
     if not update.effective_user or not update.effective_chat:
@@ -55,7 +60,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             f"Используйте кнопки ниже для управления сессией."
         )
     else:
-        chats_data[chat_id]["username"] = username
+        set_chat_username(chat_id, username)
         logger.info(
             f"/start: Активная сессия уже существует для @{username} (chat_id: {chat_id}). Код: {access_code}"
         )
@@ -73,6 +78,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         logger.warning(f"[start] No message found in update for chat_id {chat_id}")
 
 
+@timed(update_handler_seconds.labels("start_new_session"))
 async def start_new_session(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles 'Начать сессию / Новый код' button."""
     if not update.effective_user or not update.effective_chat:
@@ -114,6 +120,7 @@ async def start_new_session(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
 
 
+@timed(update_handler_seconds.labels("close_session_command"))
 async def close_session_command(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
@@ -148,6 +155,7 @@ async def close_session_command(
         )
 
 
+@timed(update_handler_seconds.labels("handle_message"))
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles regular text messages from the user."""
     if (
@@ -178,10 +186,55 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return
 
-    logger.info(f"Сообщение от @{username} (chat_id: {chat_id}): {text}")
+    if logger.isEnabledFor(logging.DEBUG) and message_log_sampler():
+        logger.debug(
+            "Сообщение от @%s (chat_id: %s, %d симв.)",
+            username,
+            chat_id,
+            len(text),
+            extra={"chat_id": chat_id},
+        )
     await add_message(chat_id, "user", text)
 
 
+@timed(update_handler_seconds.labels("handle_media"))
+async def handle_media(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handles photos, documents, voice notes and other files from the user.
+    Only the file metadata is stored; the file itself is fetched from
+    Telegram when the web page opens it (src/routes/media.py).
+    """
+    if not update.effective_chat or not update.message:
+        logger.warning("[handle_media] Update missing required information (chat, message).")
+        return
+
+    chat_id = update.effective_chat.id
+    media = media_from_message(update.message.to_dict())
+    if media is None:
+        return
+    chat_info = get_chat_data(chat_id)
+    if not chat_info or not chat_info.get("username") or not chat_info.get("access_code"):
+        logger.info(
+            f"Файл от пользователя без активной сессии (chat_id: {chat_id}). Предлагаем начать."
+        )
+        await update.message.reply_html(
+            "Пожалуйста, начните сессию с помощью команды /start или кнопки 'Начать сессию / Новый код', чтобы общаться с оператором.",
+            reply_markup=markup,
+        )
+        return
+
+    if logger.isEnabledFor(logging.DEBUG) and message_log_sampler():
+        logger.debug(
+            "Файл от @%s (chat_id: %s): %s, %s байт",
+            chat_info["username"],
+            chat_id,
+            media["kind"],
+            media["size"],
+            extra={"chat_id": chat_id},
+        )
+    await add_message(chat_id, "user", update.message.caption or "", media=media)
+
+
 def register_handlers(application: Application):
     """Registers all handlers with the application."""
     application.add_handler(CommandHandler("start", start))
@@ -199,4 +252,16 @@ def register_handlers(application: Application):
     application.add_handler(
         MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message)
     )
+    application.add_handler(
+        MessageHandler(
+            filters.PHOTO
+            | filters.Document.ALL
+            | filters.VOICE
+            | filters.AUDIO
+            | filters.VIDEO
+            | filters.VIDEO_NOTE
+            | filters.ANIMATION,
+            handle_media,
+        )
+    )
     logger.info("Обработчики Telegram успешно зарегистрированы.")
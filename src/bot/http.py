@@ -0,0 +1,53 @@
+from typing import Any, Dict
+
+import httpx
+from telegram.request import HTTPXRequest
+
+
+class BotAPIStats:
+    """Counters of Bot API requests and of the connections opened for them."""
+
+    __slots__ = ("requests", "connections_opened")
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        reused = self.requests - self.connections_opened
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reuse_ratio": reused / self.requests if self.requests else 0.0,
+        }
+
+
+class PooledHTTPXRequest(HTTPXRequest):
+    """
+    HTTPXRequest with a configurable keep-alive expiry and connection-reuse
+    accounting. Every request gets an httpcore trace hook, so a request
+    that had to open a TCP connection is told apart from one served by a
+    pooled keep-alive connection.
+    """
+
+    def __init__(
+        self, stats: BotAPIStats, keepalive_expiry: float = 30.0, **kwargs: Any
+    ):
+        super().__init__(**kwargs)
+        self.stats = stats
+        pool_size = kwargs.get("connection_pool_size", 1)
+        self._client_kwargs["limits"] = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size if keepalive_expiry > 0 else 0,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client_kwargs["event_hooks"] = {"request": [self._on_request]}
+        self._client = self._build_client()
+
+    async def _on_request(self, request: httpx.Request):
+        self.stats.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        if event_name == "connection.connect_tcp.complete":
+            self.stats.connections_opened += 1
@@ -0,0 +1,54 @@
+import asyncio
+import fcntl
+import os
+from typing import Optional
+
+from src.config import logger
+
+
+class LeaderElector:
+    """
+    Elects one polling process per host with an exclusive flock on a lock file.
+    The kernel drops the lock when the holder dies, so a waiting worker
+    takes over within one retry interval.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """Tries to become the leader without blocking."""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    async def wait_for_leadership(self, retry_interval: float):
+        """Blocks until this process holds the lock."""
+        if self.try_acquire():
+            return
+        logger.info(
+            f"Лидер опроса Telegram уже запущен в другом процессе, ожидаем ({self.path})."
+        )
+        while not self.try_acquire():
+            await asyncio.sleep(retry_interval)
+
+    def release(self):
+        """Gives up leadership."""
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
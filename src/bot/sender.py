@@ -0,0 +1,305 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set
+
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from src.config import logger
+from src.metrics import telegram_delivery_seconds
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` saved."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self.delay(now)
+        return self.tokens >= self.capacity
+
+
+class OutboundMessage:
+    __slots__ = ("chat_id", "text", "client_id", "upload", "attempts", "queued_at")
+
+    def __init__(self, chat_id: int, text: str, client_id: Optional[str], upload: Any = None):
+        self.chat_id = chat_id
+        self.text = text
+        self.client_id = client_id
+        self.upload = upload
+        self.attempts = 0
+        self.queued_at = time.monotonic()
+
+
+class ChatQueue:
+    """Pending messages of one chat; at most one of them is in flight."""
+
+    __slots__ = ("messages", "bucket", "blocked_until", "sending")
+
+    def __init__(self, bucket: TokenBucket):
+        self.messages: Deque[OutboundMessage] = deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.sending = False
+
+
+class OutboundSender:
+    """
+    Queue of messages from the web UI to Telegram.
+
+    A dispatcher task hands messages to Bot.send_message under a global and
+    a per-chat token bucket, with at most `concurrency` requests in flight
+    and one per chat, so per-chat order is kept. A 429 pauses all sending
+    for its retry_after; network errors are retried with exponential
+    backoff and jitter up to `max_attempts`. Delivery is at-least-once: a
+    request that timed out may still have reached Telegram.
+
+    `on_sent(chat_id, text, client_id)` stores a delivered message and returns it;
+    `on_status(chat_id, payload)` reports delivery to the web UI;
+    `send_upload(chat_id, upload)` sends a file queued with `upload` instead
+    of a text (the text is its caption) and returns the file metadata, which
+    is passed to `on_sent` as `media`. A file is closed once it is delivered
+    or given up on.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        on_sent: Callable[[int, str, Optional[str]], Awaitable[Optional[Dict[str, Any]]]],
+        on_status: Callable[[int, Dict[str, Any]], Awaitable[None]],
+        send_upload: Optional[Callable[[int, Any], Awaitable[Optional[Dict[str, Any]]]]] = None,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: int = 3,
+        concurrency: int = 8,
+        max_attempts: int = 5,
+        retry_base_delay: float = 0.5,
+    ):
+        self.bot = bot
+        self.on_sent = on_sent
+        self.on_status = on_status
+        self.send_upload = send_upload
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self._global = TokenBucket(global_rate, global_rate)
+        self._blocked_until = 0.0  # пауза после 429 действует на все чаты
+        self._chats: Dict[int, ChatQueue] = {}
+        self.concurrency = concurrency
+        self._ready: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._last_prune = time.monotonic()
+        # Счетчики с момента запуска.
+        self.sent_count = 0
+        self.failed_count = 0
+        self.retried_count = 0
+        self.rate_limited_count = 0
+
+    def submit(
+        self, chat_id: int, text: str, client_id: Optional[str] = None, upload: Any = None
+    ):
+        """Queues a message (or a file with `text` as its caption) for delivery; returns immediately."""
+        self._ensure_running()
+        state = self._chats.get(chat_id)
+        if state is None:
+            self._prune_idle()
+            state = self._chats[chat_id] = ChatQueue(
+                TokenBucket(self.chat_rate, self.chat_burst)
+            )
+        state.messages.append(OutboundMessage(chat_id, text, client_id, upload))
+        if len(state.messages) == 1 and not state.sending:
+            self._ready.put_nowait(chat_id)
+
+    def pending(self) -> int:
+        """Messages queued or in flight."""
+        return sum(len(s.messages) + s.sending for s in self._chats.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending(),
+            "sent": self.sent_count,
+            "failed": self.failed_count,
+            "retried": self.retried_count,
+            "rate_limited": self.rate_limited_count,
+        }
+
+    async def flush(self, timeout: float) -> int:
+        """
+        Waits up to `timeout` seconds for queued messages to be delivered
+        (rate limits and retries still apply). Returns how many are left.
+        """
+        deadline = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        return self.pending()
+
+    async def stop(self):
+        """
+        Stops dispatching and waits for requests already in flight. Messages
+        still queued are reported as failed, so the web UI does not wait for them.
+        """
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        for state in self._chats.values():
+            while state.messages:
+                message = state.messages.popleft()
+                if message.upload is not None:
+                    message.upload.close()
+                await self._fail(message, "не отправлено до остановки сервера")
+
+    def _prune_idle(self):
+        """Forgets chats with nothing pending whose bucket has refilled."""
+        now = time.monotonic()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        idle = [
+            chat_id
+            for chat_id, state in self._chats.items()
+            if not state.messages and not state.sending and state.bucket.is_full(now)
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def _ensure_running(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            # Очередь и семафор создаются в цикле событий, где работает диспетчер.
+            self._ready = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            for chat_id, state in self._chats.items():
+                state.sending = False
+                if state.messages:
+                    self._ready.put_nowait(chat_id)
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            chat_id = await self._ready.get()
+            state = self._chats.get(chat_id)
+            if state is None or not state.messages or state.sending:
+                continue
+            now = time.monotonic()
+            wait = max(state.blocked_until - now, state.bucket.delay(now))
+            if wait > 0:
+                # Лимит этого чата не должен задерживать остальные чаты.
+                loop.call_later(wait, self._ready.put_nowait, chat_id)
+                continue
+            while True:
+                now = time.monotonic()
+                wait = max(self._blocked_until - now, self._global.delay(now))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            await self._slots.acquire()
+            state.bucket.consume()
+            self._global.consume()
+            state.sending = True
+            task = asyncio.create_task(self._deliver(state, state.messages.popleft()))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, state: ChatQueue, message: OutboundMessage):
+        chat_id = message.chat_id
+        retry = False
+        try:
+            if message.upload is None:
+                await self.bot.send_message(chat_id=chat_id, text=message.text)
+            else:
+                media = await self.send_upload(chat_id, message.upload)
+        except RetryAfter as e:
+            self.rate_limited_count += 1
+            self._blocked_until = max(
+                self._blocked_until, time.monotonic() + e.retry_after
+            )
+            logger.warning(
+                f"[sender] Telegram ограничил частоту (429), пауза {e.retry_after} с (chat_id {chat_id})."
+            )
+            state.messages.appendleft(message)
+            retry = True
+        except BadRequest as e:  # подкласс NetworkError, но повтор не поможет
+            await self._fail(message, e)
+        except NetworkError as e:
+            message.attempts += 1
+            if message.attempts >= self.max_attempts:
+                await self._fail(message, e)
+            else:
+                self.retried_count += 1
+                delay = self.retry_base_delay * 2 ** (message.attempts - 1)
+                state.blocked_until = time.monotonic() + delay * random.uniform(0.5, 1.5)
+                logger.warning(
+                    f"[sender] Сетевая ошибка при отправке в chat_id {chat_id} "
+                    f"(попытка {message.attempts}/{self.max_attempts}): {e}"
+                )
+                state.messages.appendleft(message)
+                retry = True
+        except Exception as e:
+            await self._fail(message, e)
+        else:
+            self.sent_count += 1
+            telegram_delivery_seconds.observe(time.monotonic() - message.queued_at)
+            try:
+                if message.upload is None:
+                    stored = await self.on_sent(chat_id, message.text, message.client_id)
+                else:
+                    stored = await self.on_sent(
+                        chat_id, message.text, message.client_id, media=media
+                    )
+            except Exception as e:
+                # Сообщение уже в Telegram: клиент должен узнать об этом, даже если оно не сохранено.
+                logger.error(
+                    f"[sender] Сообщение доставлено в chat_id {chat_id}, но не сохранено: {e}",
+                    exc_info=True,
+                )
+                stored = None
+            await self._report(
+                message, {"status": "sent", "seq": stored["seq"] if stored else None}
+            )
+        finally:
+            if message.upload is not None and not retry:
+                message.upload.close()
+            self._slots.release()
+            state.sending = False
+            if state.messages:
+                self._ready.put_nowait(chat_id)
+
+    async def _fail(self, message: OutboundMessage, error: Any):
+        self.failed_count += 1
+        logger.error(
+            f"Ошибка отправки сообщения в Telegram для chat_id {message.chat_id}: {error}"
+        )
+        await self._report(message, {"status": "failed", "error": str(error)})
+
+    async def _report(self, message: OutboundMessage, payload: Dict[str, Any]):
+        payload = {"type": "delivery", "client_id": message.client_id, **payload}
+        try:
+            await self.on_status(message.chat_id, payload)
+        except Exception as e:
+            logger.error(f"[sender] Не удалось сообщить статус доставки: {e}")
@@ -0,0 +1,120 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class _Lane:
+    """Serializes the updates of one chat; dropped once nobody waits on it."""
+
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ChatLaneUpdateProcessor(BaseUpdateProcessor):
+    """
+    Processes updates of different chats concurrently, at most `workers` at
+    a time, while the updates of one chat run one after another in arrival
+    order. An update waiting behind its chat does not hold a worker, so a
+    busy chat never starves the others. Updates without a chat take a worker
+    directly.
+
+    PTB's fetcher starts a task per update without waiting, so the bound on
+    pending updates is enforced by `UpdateQueue`: it hands the fetcher a new
+    update only after `admit()` finds room among `max_pending` slots.
+    """
+
+    def __init__(self, workers: int, max_pending: int = 4096):
+        super().__init__(max(workers, max_pending))
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pool = asyncio.Semaphore(workers)
+        self._slots = asyncio.Semaphore(max_pending)
+        self._admitted = 0
+        self._lanes: Dict[int, _Lane] = {}
+        self.running = 0
+        self.processed = 0
+        # Сколько обновлений ждали завершения предыдущего обновления того же чата.
+        self.queued_behind_chat = 0
+
+    @staticmethod
+    def _chat_id(update: object) -> Optional[int]:
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def admit(self) -> None:
+        """Waits until fewer than `max_pending` admitted updates are unfinished."""
+        await self._slots.acquire()
+        self._admitted += 1
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        try:
+            await super().process_update(update, coroutine)
+        finally:
+            # Обновления, переданные в обход очереди (тесты, ручной вызов), слот не занимали.
+            if self._admitted:
+                self._admitted -= 1
+                self._slots.release()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat_id = self._chat_id(update)
+        if chat_id is None:
+            await self._run(coroutine)
+            return
+        # Между получением дорожки и lock.acquire нет await: порядок захвата
+        # совпадает с порядком поступления, а asyncio.Lock будит ждущих по очереди.
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            lane = self._lanes[chat_id] = _Lane()
+        elif lane.users:
+            self.queued_behind_chat += 1
+        lane.users += 1
+        try:
+            async with lane.lock:
+                await self._run(coroutine)
+        finally:
+            lane.users -= 1
+            if not lane.users:
+                del self._lanes[chat_id]
+
+    async def _run(self, coroutine: Awaitable[Any]):
+        async with self._pool:
+            self.running += 1
+            try:
+                await coroutine
+            finally:
+                self.running -= 1
+                self.processed += 1
+
+    def lanes(self) -> int:
+        """Chats with an update in progress or waiting."""
+        return len(self._lanes)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+class UpdateQueue(asyncio.Queue):
+    """
+    Application update queue with backpressure. `get()` waits for a free slot
+    of the processor before taking an update, so the fetcher stops at
+    `max_pending` unfinished updates; the queue itself holds at most
+    `maxsize` more, after which polling stops calling getUpdates and the
+    webhook has to refuse (see `src/routes/webhook.py`).
+    """
+
+    def __init__(self, processor: ChatLaneUpdateProcessor, maxsize: int):
+        super().__init__(maxsize)
+        self._processor = processor
+
+    async def get(self) -> Any:
+        await self._processor.admit()
+        return await super().get()
@@ -1,26 +1,32 @@
 import os  # Добавлен импорт os
+import hashlib
+import tempfile
 import logging  # Добавлен импорт logging
 from dotenv import load_dotenv
 
+from src.log_setup import LogSampler, configure_logging
+
 load_dotenv()
 
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 if not BOT_TOKEN:
     raise ValueError("TELEGRAM_BOT_TOKEN not found in .env file")
 
-SESSION_SECRET_KEY = os.getenv("SESSION_SECRET_KEY")
-if not SESSION_SECRET_KEY:
-    # Используем print, так как логгер еще может быть не полностью настроен
-    # или эта информация важна до инициализации логгера.
-    print("Warning: SESSION_SECRET_KEY not found in .env. Using default (unsafe).")
-    SESSION_SECRET_KEY = "your-super-secret-key-change-me"
 
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
+# --- Логирование ---
+# LOG_FORMAT: "text" или "json" (одна JSON-строка на запись, поля из extra= — ключи).
+# LOG_QUEUE=1 — цикл событий только кладет записи в очередь, форматирует и пишет поток.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_QUEUE = os.getenv("LOG_QUEUE", "1") == "1"
+# Строки уровня DEBUG на каждое сообщение пишутся только для каждого N-го сообщения.
+LOG_MESSAGE_SAMPLE = int(os.getenv("LOG_MESSAGE_SAMPLE", "100"))
+
+log_listener = configure_logging(LOG_LEVEL, LOG_FORMAT, LOG_QUEUE)
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logger = logging.getLogger("app_logger")
+message_log_sampler = LogSampler(LOG_MESSAGE_SAMPLE)
 
 # Предполагается, что этот файл (config.py) находится в папке src/
 # Тогда BASE_DIR будет указывать на корень проекта (папку, содержащую src/)
@@ -34,6 +40,149 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Если templates и static находятся В КОРНЕ ПРОЕКТА (на одном уровне с src/):
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 STATIC_DIR = os.path.join(BASE_DIR, "static")
+# TEMPLATES_AUTO_RELOAD=1 — перечитывать измененные шаблоны (разработка); без него шаблоны
+# компилируются один раз, а страница входа отрисовывается один раз и берется из кэша.
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "0") == "1"
 
 
 ACCESS_CODE_LENGTH = 8
+
+# --- Хранилище состояния ---
+# "memory" — словари внутри процесса (только один воркер),
+# "sqlite" — общий файл SQLite для всех воркеров на одной машине.
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(BASE_DIR, "state.db"))
+# Сколько последних сообщений хранится на чат и общий бюджет памяти истории.
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "1000"))
+HISTORY_MEMORY_BUDGET_MB = float(os.getenv("HISTORY_MEMORY_BUDGET_MB", "256"))
+# Сессия (код доступа) истекает после SESSION_TTL секунд без активности: сообщений,
+# входов и подключений WebSocket. Чат без сессии вместе с историей удаляется после
+# CHAT_IDLE_TTL секунд без активности. 0 отключает истечение.
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))
+CHAT_IDLE_TTL = float(os.getenv("CHAT_IDLE_TTL", str(30 * 24 * 3600)))
+# Фоновая очистка: период (секунды) и сколько записей обрабатывается за один шаг цикла.
+SWEEP_INTERVAL = float(os.getenv("SWEEP_INTERVAL", "30"))
+SWEEP_BATCH = int(os.getenv("SWEEP_BATCH", "500"))
+# Ограничение попыток входа (GCRA): попыток в минуту и размер всплеска с одного адреса,
+# неудачных попыток в минуту и всплеск на одно имя пользователя. Сколько ключей
+# помнит бэкенд memory и локальный кэш блокировок (вытесняются давно не использованные).
+LOGIN_IP_RATE = float(os.getenv("LOGIN_IP_RATE", "10"))
+LOGIN_IP_BURST = int(os.getenv("LOGIN_IP_BURST", "10"))
+LOGIN_USER_RATE = float(os.getenv("LOGIN_USER_RATE", "1"))
+LOGIN_USER_BURST = int(os.getenv("LOGIN_USER_BURST", "5"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Сессии браузеров хранятся на сервере, в cookie только случайный id. SESSION_MAX_AGE — срок
+# жизни (секунды) после последнего запроса; продление записывается не чаще раза в
+# SESSION_RENEW_INTERVAL секунд. SESSION_CACHE_SIZE сессий кэшируются в памяти воркера на SESSION_CACHE_TTL
+# секунд (столько другой воркер может не видеть отзыв сессии). SESSION_HTTPS_ONLY=1 — cookie Secure.
+SESSION_MAX_AGE = float(os.getenv("SESSION_MAX_AGE", str(14 * 24 * 3600)))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "5"))
+SESSION_RENEW_INTERVAL = float(os.getenv("SESSION_RENEW_INTERVAL", "3600"))
+SESSION_HTTPS_ONLY = os.getenv("SESSION_HTTPS_ONLY", "0") == "1"
+# Сколько сообщений отрисовывается на /chat и максимальный размер страницы /api/history.
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "50"))
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", "200"))
+# Полнотекстовый поиск: результатов на страницу по умолчанию; индекс перестраивается, когда
+# документов в нем больше, чем SEARCH_REBUILD_RATIO x сообщений в хранилище.
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_REBUILD_RATIO = float(os.getenv("SEARCH_REBUILD_RATIO", "2"))
+# Сколько найденных в индексе сообщений запрос проверяет по хранилищу, прежде чем вернуть страницу.
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "500"))
+# Максимальное время отправки одного кадра в WebSocket; медленный клиент отключается.
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# Очередь исходящих кадров на каждое соединение и что делать при ее переполнении:
+# drop_oldest — отбросить самый старый кадр, coalesce — заменить очередь кадром resync,
+# disconnect — отключить медленного клиента.
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "256"))
+WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest").lower()
+# Сколько пропущенных сообщений досылается при переподключении WebSocket;
+# при большем разрыве клиент перезагружает страницу.
+WS_RESUME_MAX = int(os.getenv("WS_RESUME_MAX", "500"))
+# HTTP-клиент Bot API, общий для веб-отправки и ответов обработчиков.
+# HTTP/2 требует пакета h2 (pip install "python-telegram-bot[http2]").
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "16"))
+TELEGRAM_KEEPALIVE_EXPIRY = float(os.getenv("TELEGRAM_KEEPALIVE_EXPIRY", "30"))
+TELEGRAM_HTTP_VERSION = os.getenv("TELEGRAM_HTTP_VERSION", "1.1")
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", "5"))
+TELEGRAM_WRITE_TIMEOUT = float(os.getenv("TELEGRAM_WRITE_TIMEOUT", "5"))
+TELEGRAM_POOL_TIMEOUT = float(os.getenv("TELEGRAM_POOL_TIMEOUT", "5"))
+# Максимальная длина сообщения из веб-интерфейса (ограничение Bot API).
+MAX_MESSAGE_LENGTH = 4096
+# Лимиты исходящих сообщений в Telegram (на процесс): общий и на один чат, сообщений в секунду.
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_SEND_CONCURRENCY = int(os.getenv("TELEGRAM_SEND_CONCURRENCY", "8"))
+TELEGRAM_SEND_MAX_ATTEMPTS = int(os.getenv("TELEGRAM_SEND_MAX_ATTEMPTS", "5"))
+# Файлы между Telegram и браузером: кэш недавно переданных файлов на диске (LRU, МБ),
+# максимальный размер файла из веб-интерфейса (МБ; Bot API принимает до 50), размер
+# куска потоковой передачи (КБ) и таймаут чтения/записи файла (секунды).
+MEDIA_CACHE_DIR = os.getenv(
+    "MEDIA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "webbridge-media")
+)
+MEDIA_CACHE_MB = float(os.getenv("MEDIA_CACHE_MB", "512"))
+MEDIA_UPLOAD_MAX_MB = float(os.getenv("MEDIA_UPLOAD_MAX_MB", "50"))
+MEDIA_CHUNK_KB = int(os.getenv("MEDIA_CHUNK_KB", "64"))
+MEDIA_TIMEOUT = float(os.getenv("MEDIA_TIMEOUT", "60"))
+# Максимальная длина подписи к файлу (ограничение Bot API).
+MAX_CAPTION_LENGTH = 1024
+# Сколько входящих обновлений обрабатывается одновременно (обновления одного чата — по очереди).
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "16"))
+# Сколько обновлений может быть в работе и в ожидании; сверх этого (и еще BOT_CONCURRENT_UPDATES
+# в очереди) polling перестает запрашивать обновления, а webhook отвечает 503.
+BOT_MAX_PENDING_UPDATES = int(os.getenv("BOT_MAX_PENDING_UPDATES", "4096"))
+# Журнал на диске для бэкенда "memory": пустое значение отключает сохранение.
+PERSIST_DIR = os.getenv("PERSIST_DIR", "")
+PERSIST_FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "0.05"))
+PERSIST_SEGMENT_MB = float(os.getenv("PERSIST_SEGMENT_MB", "64"))
+PERSIST_SNAPSHOT_EVERY = int(os.getenv("PERSIST_SNAPSHOT_EVERY", "100000"))
+# Период проверки задержки цикла событий для /metrics (секунды); 0 отключает.
+METRICS_LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", "0.5"))
+# Порог блокировки цикла (мс), после которого сторожевой поток записывает стек; 0 отключает.
+LOOP_SLOW_CALLBACK_MS = float(os.getenv("LOOP_SLOW_CALLBACK_MS", "0"))
+# Токен для /admin/*: профилирование и состояние цикла. Пустое значение отключает эти адреса.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Токен входа в панель оператора /operator (все активные чаты). Пустое значение отключает панель.
+OPERATOR_TOKEN = os.getenv("OPERATOR_TOKEN", "")
+# Сколько чатов в одной странице списка и сколько символов в превью последнего сообщения.
+INBOX_PAGE_SIZE = int(os.getenv("INBOX_PAGE_SIZE", "100"))
+INBOX_PREVIEW_CHARS = int(os.getenv("INBOX_PREVIEW_CHARS", "100"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+# Общий срок плавной остановки (секунды): закрытие WebSocket, досылка очереди в Telegram и
+# сброс журнала. Половина срока отводится на закрытие WebSocket.
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "10"))
+# Как часто воркер забирает события других воркеров (секунды).
+STATE_POLL_INTERVAL = float(os.getenv("STATE_POLL_INTERVAL", "0.05"))
+
+# --- Выбор лидера опроса Telegram ---
+# Только один процесс вызывает getUpdates; остальные ждут и подхватывают опрос,
+# если лидер умрет. По умолчанию включено для общего хранилища.
+BOT_LEADER_ELECTION = (
+    os.getenv("BOT_LEADER_ELECTION", "0" if STATE_BACKEND == "memory" else "1") == "1"
+)
+BOT_LEADER_LOCK_PATH = os.getenv(
+    "BOT_LEADER_LOCK_PATH", os.path.join(BASE_DIR, "bot.leader.lock")
+)
+BOT_LEADER_RETRY_INTERVAL = float(os.getenv("BOT_LEADER_RETRY_INTERVAL", "0.5"))
+
+# --- Получение обновлений Telegram ---
+# "polling" — long polling (getUpdates), "webhook" — Telegram сам присылает POST.
+BOT_UPDATE_MODE = os.getenv("BOT_UPDATE_MODE", "polling").lower()
+# Адрес Bot API; переопределяется для локального сервера Bot API или тестов.
+TELEGRAM_API_BASE_URL = os.getenv(
+    "TELEGRAM_API_BASE_URL", "https://api.telegram.org/bot"
+)
+# Адрес скачивания файлов (getFile); для локального сервера Bot API задается вместе с предыдущим.
+TELEGRAM_FILE_BASE_URL = os.getenv(
+    "TELEGRAM_FILE_BASE_URL", "https://api.telegram.org/file/bot"
+)
+# Публичный адрес приложения; если задан, webhook регистрируется при старте.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+# По умолчанию секрет выводится из токена, чтобы все воркеры знали одно значение.
+WEBHOOK_SECRET_TOKEN = (
+    os.getenv("WEBHOOK_SECRET_TOKEN")
+    or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()
+)
@@ -0,0 +1,285 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import WebSocket, status
+
+from src.config import logger
+from src.metrics import ws_send_seconds
+
+OVERFLOW_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+# Кадр, которым политика "coalesce" заменяет переполненную очередь:
+# клиент переподключается и получает пропущенное с последнего seq.
+RESYNC_FRAME = '{"type":"resync"}'
+# Пропущено больше, чем можно дослать при переподключении: клиент перезагружает страницу.
+RELOAD_PAYLOAD = {"type": "reload"}
+
+
+def encode_frame(payload: Dict[str, Any]) -> str:
+    """Serializes a payload the same way WebSocket.send_json does."""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+class Outbox:
+    """Bounded queue of encoded frames for one websocket and its writer task."""
+
+    __slots__ = ("websocket", "frames", "ready", "task", "closing")
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.frames: Deque[str] = deque()
+        self.ready = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        # (код, причина): закрыть соединение, как только очередь опустеет.
+        self.closing: Optional[Tuple[int, str]] = None
+
+
+class ConnectionRegistry:
+    """
+    Websockets connected to this worker, grouped by chat_id. A chat can have
+    any number of connections (several tabs or operators).
+
+    broadcast() never waits for the network: it appends the frame to each
+    connection's bounded outbox, and a per-connection writer task sends it
+    with a `send_timeout` bound. When an outbox is full, `overflow_policy`
+    decides what happens: "drop_oldest" discards the oldest queued frame,
+    "coalesce" replaces the whole queue with one resync frame, and
+    "disconnect" closes the slow connection.
+    """
+
+    def __init__(
+        self,
+        send_timeout: float,
+        queue_size: int = 256,
+        overflow_policy: str = "drop_oldest",
+        on_first: Optional[Callable[[int], None]] = None,
+        on_empty: Optional[Callable[[int], None]] = None,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.send_timeout = send_timeout
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.by_chat: Dict[int, Dict[WebSocket, Outbox]] = {}
+        # Вызываются, когда у чата появляется первое / исчезает последнее соединение.
+        self.on_first = on_first
+        self.on_empty = on_empty
+        # Счетчики с момента запуска.
+        self.dropped_frames = 0
+        self.coalesced_queues = 0
+        self.evicted_connections = 0
+        self._closing: Set[asyncio.Task] = set()
+
+    def add(
+        self, chat_id: int, websocket: WebSocket, backlog: Iterable[Dict[str, Any]] = ()
+    ):
+        """
+        Registers a connection and starts its writer task. `backlog` payloads
+        (e.g. messages missed while reconnecting) are sent before live ones.
+        """
+        outbox = Outbox(websocket)
+        outbox.frames.extend(encode_frame(payload) for payload in backlog)
+        if outbox.frames:
+            outbox.ready.set()
+        outbox.task = asyncio.create_task(self._writer(chat_id, outbox))
+        outboxes = self.by_chat.get(chat_id)
+        if outboxes is None:
+            self.by_chat[chat_id] = {websocket: outbox}
+            if self.on_first:
+                self.on_first(chat_id)
+        else:
+            outboxes[websocket] = outbox
+
+    def replay(
+        self, chat_id: int, websocket: WebSocket, backlog: Iterable[Dict[str, Any]]
+    ) -> bool:
+        """
+        Puts `backlog` payloads in front of everything queued for a registered
+        connection; like the backlog of add(), they are not bound by queue_size.
+        """
+        outbox = self.by_chat.get(chat_id, {}).get(websocket)
+        if outbox is None:
+            return False
+        frames = [encode_frame(payload) for payload in backlog]
+        if frames:
+            outbox.frames.extendleft(reversed(frames))
+            outbox.ready.set()
+        return True
+
+    def remove(self, chat_id: int, websocket: WebSocket) -> bool:
+        """Unregisters a connection. Returns True if it was registered."""
+        outboxes = self.by_chat.get(chat_id)
+        if not outboxes or websocket not in outboxes:
+            return False
+        self._stop_writer(outboxes.pop(websocket))
+        if not outboxes:
+            del self.by_chat[chat_id]
+            if self.on_empty:
+                self.on_empty(chat_id)
+        return True
+
+    def pop_chat(self, chat_id: int) -> Set[WebSocket]:
+        """Unregisters and returns all connections of a chat."""
+        outboxes = self.by_chat.pop(chat_id, {})
+        for outbox in outboxes.values():
+            self._stop_writer(outbox)
+        if outboxes and self.on_empty:
+            self.on_empty(chat_id)
+        return set(outboxes)
+
+    def get(self, chat_id: int) -> Set[WebSocket]:
+        return set(self.by_chat.get(chat_id, ()))
+
+    def has(self, chat_id: int) -> bool:
+        return chat_id in self.by_chat
+
+    def chat_ids(self) -> List[int]:
+        return list(self.by_chat)
+
+    def count(self) -> int:
+        return sum(len(outboxes) for outboxes in self.by_chat.values())
+
+    def clear(self):
+        for outboxes in self.by_chat.values():
+            for outbox in outboxes.values():
+                self._stop_writer(outbox)
+        self.by_chat.clear()
+
+    async def close_all(self, code: int, reason: str, timeout: float) -> int:
+        """
+        Closes every connection concurrently: each writer first sends what
+        is already queued, then closes its socket (a slow client is still
+        bounded by `send_timeout`). Waits at most `timeout` seconds in total
+        and drops the connections that are not closed by then. Returns how
+        many were dropped.
+        """
+        writers = []
+        for outboxes in self.by_chat.values():
+            for outbox in outboxes.values():
+                outbox.closing = (code, reason)
+                outbox.ready.set()
+                writers.append(outbox.task)
+        if not writers:
+            return 0
+        _, pending = await asyncio.wait(writers, timeout=timeout)
+        for chat_id in self.chat_ids():
+            for websocket in list(self.by_chat.get(chat_id, ())):
+                self.remove(chat_id, websocket)
+        return len(pending)
+
+    def stats(self) -> Dict[str, int]:
+        """Connection count, queue depths and overflow counters."""
+        depths = [
+            len(outbox.frames)
+            for outboxes in self.by_chat.values()
+            for outbox in outboxes.values()
+        ]
+        return {
+            "connections": len(depths),
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "dropped_frames": self.dropped_frames,
+            "coalesced_queues": self.coalesced_queues,
+            "evicted_connections": self.evicted_connections,
+        }
+
+    def broadcast(self, chat_id: int, payload: Dict[str, Any]) -> int:
+        """
+        Queues a payload for every connection of a chat without waiting for
+        delivery. Returns the number of connections it was queued for.
+        """
+        outboxes = self.by_chat.get(chat_id)
+        if not outboxes:
+            return 0
+        frame = encode_frame(payload)  # сериализуем один раз для всех подписчиков
+        queued = 0
+        for outbox in list(outboxes.values()):
+            if self._enqueue(chat_id, outbox, frame):
+                queued += 1
+        return queued
+
+    def send(self, chat_id: int, websocket: WebSocket, payload: Dict[str, Any]) -> bool:
+        """Queues a payload for one connection (e.g. an ack to its own request)."""
+        outbox = self.by_chat.get(chat_id, {}).get(websocket)
+        if outbox is None:
+            return False
+        return self._enqueue(chat_id, outbox, encode_frame(payload))
+
+    def _enqueue(self, chat_id: int, outbox: Outbox, frame: str) -> bool:
+        if len(outbox.frames) >= self.queue_size:
+            if self.overflow_policy == "disconnect":
+                logger.warning(
+                    f"[outbox] Очередь WebSocket chat_id {chat_id} переполнена, клиент отключен."
+                )
+                self._evict(chat_id, outbox.websocket, status.WS_1013_TRY_AGAIN_LATER)
+                return False
+            if self.overflow_policy == "coalesce":
+                self.dropped_frames += len(outbox.frames)
+                self.coalesced_queues += 1
+                outbox.frames.clear()
+                outbox.frames.append(RESYNC_FRAME)
+                outbox.ready.set()
+                logger.warning(
+                    f"[outbox] Очередь WebSocket chat_id {chat_id} переполнена, заменена на resync."
+                )
+                return True  # клиент получит сообщение при перечитывании истории
+            outbox.frames.popleft()
+            self.dropped_frames += 1
+        outbox.frames.append(frame)
+        outbox.ready.set()
+        return True
+
+    async def _writer(self, chat_id: int, outbox: Outbox):
+        frames = outbox.frames
+        while True:
+            if not frames:
+                if outbox.closing:
+                    code, reason = outbox.closing
+                    try:
+                        await asyncio.wait_for(
+                            outbox.websocket.close(code=code, reason=reason), self.send_timeout
+                        )
+                    except Exception:
+                        pass
+                    self.remove(chat_id, outbox.websocket)
+                    return
+                outbox.ready.clear()
+                await outbox.ready.wait()
+                continue
+            frame = frames.popleft()
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(outbox.websocket.send_text(frame), self.send_timeout)
+                ws_send_seconds.observe(time.perf_counter() - started)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"[outbox] Отправка в WebSocket chat_id {chat_id} превысила {self.send_timeout} с, соединение отключено."
+                )
+                break
+            except Exception as e:
+                logger.warning(f"[outbox] Ошибка отправки в WebSocket chat_id {chat_id}: {e}")
+                break
+        self._evict(chat_id, outbox.websocket, status.WS_1011_INTERNAL_ERROR)
+
+    def _evict(self, chat_id: int, websocket: WebSocket, code: int):
+        if self.remove(chat_id, websocket):
+            self.evicted_connections += 1
+            task = asyncio.create_task(self._close_quietly(websocket, code))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    def _stop_writer(outbox: Outbox):
+        if outbox.task and outbox.task is not asyncio.current_task():
+            outbox.task.cancel()
+
+    async def _close_quietly(self, websocket: WebSocket, code: int):
+        try:
+            await asyncio.wait_for(
+                websocket.close(code=code, reason="Client too slow"), self.send_timeout
+            )
+        except Exception:
+            pass
@@ -1,76 +1,336 @@
-from collections import defaultdict  # Добавлен импорт defaultdict
-from typing import Dict, List, Any, Optional
+import os
+import secrets
+from typing import Dict, List, Any, Optional, Set, Tuple
 from fastapi import WebSocket  # Этот импорт нужен для аннотаций типов
 
-chats_data: Dict[int, Dict[str, Any]] = defaultdict(
-    lambda: {"username": None, "access_code": None, "messages": []}
+from src.config import (
+    STATE_BACKEND,
+    STATE_DB_PATH,
+    HISTORY_MAX_MESSAGES,
+    HISTORY_MEMORY_BUDGET_MB,
+    SESSION_TTL,
+    CHAT_IDLE_TTL,
+    LOGIN_IP_RATE,
+    LOGIN_IP_BURST,
+    LOGIN_USER_RATE,
+    LOGIN_USER_BURST,
+    RATE_LIMIT_MAX_KEYS,
+    SESSION_MAX_AGE,
+    SESSION_CACHE_SIZE,
+    SESSION_CACHE_TTL,
+    SESSION_RENEW_INTERVAL,
+    PERSIST_DIR,
+    PERSIST_FLUSH_INTERVAL,
+    PERSIST_SEGMENT_MB,
+    PERSIST_SNAPSHOT_EVERY,
+    WS_SEND_TIMEOUT,
+    WS_QUEUE_SIZE,
+    WS_OVERFLOW_POLICY,
+    INBOX_PAGE_SIZE,
+    INBOX_PREVIEW_CHARS,
+    SEARCH_MAX_CANDIDATES,
+    SEARCH_REBUILD_RATIO,
+    logger,
 )
+from src.connections import ConnectionRegistry
+from src.history import HistoryStore
+from src.inbox import InboxIndex, OperatorHub
+from src.message_log import MessageLog
+from src.metrics import Counter, Gauge, registry
+from src.ratelimit import LoginLimiter
+from src.search import MessageSearch, SearchIndex
+from src.sessions import WebSessionStore
+from src.state import StateBackend, MemoryBackend, SQLiteBackend
+
+# Хранилище встроенного бэкенда "memory". При общем бэкенде (sqlite) эти словари
+# остаются пустыми — используйте функции этого модуля, а не словари напрямую.
+# Обычный dict: чтение неизвестного chat_id не должно создавать запись.
+chats_data: Dict[int, Dict[str, Any]] = {}
 
 code_to_chat_id: Dict[str, int] = {}
 
-active_websockets: Dict[int, WebSocket] = {}
+WORKER_ID = f"{os.getpid()}-{secrets.token_hex(4)}"
+
+
+def create_backend(name: str) -> StateBackend:
+    """Builds the state backend selected by STATE_BACKEND."""
+    if name == "memory":
+        history = HistoryStore(
+            HISTORY_MAX_MESSAGES, int(HISTORY_MEMORY_BUDGET_MB * 1024 * 1024)
+        )
+        memory = MemoryBackend(
+            chats_data,
+            code_to_chat_id,
+            history,
+            session_ttl=SESSION_TTL,
+            idle_ttl=CHAT_IDLE_TTL,
+            rate_limit_keys=RATE_LIMIT_MAX_KEYS,
+        )
+        if PERSIST_DIR:
+            journal = MessageLog(
+                PERSIST_DIR,
+                segment_bytes=int(PERSIST_SEGMENT_MB * 1024 * 1024),
+                flush_interval=PERSIST_FLUSH_INTERVAL,
+                snapshot_every=PERSIST_SNAPSHOT_EVERY,
+            )
+            journal.attach(memory)
+            journal.recover(memory.apply_record)
+            memory.journal = journal
+        return memory
+    if name == "sqlite":
+        return SQLiteBackend(
+            STATE_DB_PATH,
+            WORKER_ID,
+            HISTORY_MAX_MESSAGES,
+            session_ttl=SESSION_TTL,
+            idle_ttl=CHAT_IDLE_TTL,
+        )
+    raise ValueError(f"Unknown STATE_BACKEND: {name!r}")
+
+
+backend: StateBackend = create_backend(STATE_BACKEND)
+# Журнал сообщений (если включен PERSIST_DIR); фоновую запись запускает lifespan.
+message_log: Optional[MessageLog] = getattr(backend, "journal", None)
+
+# Сокеты всегда локальны для процесса: между воркерами передаются только события.
+# Бэкенд узнает, на каком воркере есть соединения чата, чтобы адресовать ему события.
+connections = ConnectionRegistry(
+    WS_SEND_TIMEOUT,
+    queue_size=WS_QUEUE_SIZE,
+    overflow_policy=WS_OVERFLOW_POLICY,
+    on_first=backend.register_socket_owner,
+    on_empty=backend.unregister_socket_owner,
+)
+active_websockets: Dict[int, Set[WebSocket]] = connections.by_chat
+# Попытки входа считаются в бэкенде, чтобы лимиты были общими для воркеров.
+login_limiter = LoginLimiter(
+    backend,
+    LOGIN_IP_RATE,
+    LOGIN_IP_BURST,
+    LOGIN_USER_RATE,
+    LOGIN_USER_BURST,
+    max_keys=RATE_LIMIT_MAX_KEYS,
+)
+# Сессии браузеров; без общего бэкенда кэш всегда актуален и не устаревает.
+web_sessions = WebSessionStore(
+    backend,
+    SESSION_MAX_AGE,
+    cache_size=SESSION_CACHE_SIZE,
+    cache_ttl=SESSION_CACHE_TTL if backend.shared else float("inf"),
+    renew_interval=SESSION_RENEW_INTERVAL,
+)
+# Панель оператора: индекс активных чатов и сокеты операторов этого воркера.
+operators = OperatorHub(
+    backend, connections, InboxIndex(INBOX_PREVIEW_CHARS), page_size=INBOX_PAGE_SIZE
+)
+# Полнотекстовый поиск по истории; локальное хранилище индексируется сразу (после восстановления журнала).
+search = MessageSearch(
+    backend,
+    SearchIndex(),
+    rebuild_ratio=SEARCH_REBUILD_RATIO,
+    max_candidates=SEARCH_MAX_CANDIDATES,
+)
+if not backend.shared:
+    search.index.rebuild(backend.iter_messages())
+logger.info(f"State backend: {STATE_BACKEND} (worker {WORKER_ID})")
+
+registry.register(
+    Gauge(
+        "webbridge_websocket_connections",
+        "Websockets connected to this worker.",
+        function=connections.count,
+    )
+)
+registry.register(
+    Gauge(
+        "webbridge_websocket_chats",
+        "Chats with at least one websocket on this worker.",
+        function=lambda: len(connections.by_chat),
+    )
+)
+registry.register(
+    Gauge(
+        "webbridge_websocket_queued_frames",
+        "Frames waiting in websocket outboxes.",
+        function=lambda: connections.stats()["queued_frames"],
+    )
+)
+registry.register(
+    Counter(
+        "webbridge_websocket_events",
+        "Outbox overflow events by kind.",
+        ["event"],
+        function=lambda: {
+            "dropped_frame": connections.dropped_frames,
+            "coalesced_queue": connections.coalesced_queues,
+            "evicted_connection": connections.evicted_connections,
+        },
+    )
+)
+registry.register(
+    Gauge(
+        "webbridge_store_items",
+        "Sizes of the state store (chats, sessions, messages, ...).",
+        ["kind"],
+        function=backend.stats,
+    )
+)
+registry.register(
+    Gauge(
+        "webbridge_search_index",
+        "Full-text index of this worker (documents, terms, postings, bytes, ...).",
+        ["kind"],
+        function=search.stats,
+    )
+)
 
 
 def get_chat_data(chat_id: int) -> Optional[Dict[str, Any]]:
     """Safely gets data for a chat_id."""
-    return chats_data.get(chat_id)
+    return backend.get_chat(chat_id)
+
+
+def chat_exists(chat_id: int) -> bool:
+    """Checks whether a chat has been initialized (e.g. after /start)."""
+    return backend.chat_exists(chat_id)
 
 
 def get_chat_id_by_code(access_code: str) -> Optional[int]:
     """Gets chat_id associated with an access code."""
-    return code_to_chat_id.get(access_code)
+    return backend.get_chat_id_by_code(access_code)
+
 
+def add_active_websocket(
+    chat_id: int, websocket: WebSocket, backlog: List[Dict[str, Any]] = ()
+):
+    """
+    Registers an active websocket connection (a chat may have several);
+    `backlog` is delivered to it before any live message.
+    """
+    connections.add(chat_id, websocket, backlog)
 
-def add_active_websocket(chat_id: int, websocket: WebSocket):
-    """Registers an active websocket connection."""
-    active_websockets[chat_id] = websocket
 
+def remove_active_websocket(chat_id: int, websocket: WebSocket) -> bool:
+    """Removes one websocket connection. Returns True if it was registered."""
+    return connections.remove(chat_id, websocket)
 
-def remove_active_websocket(chat_id: int) -> Optional[WebSocket]:
-    """Removes and returns a websocket connection."""
-    return active_websockets.pop(chat_id, None)
 
+def remove_chat_websockets(chat_id: int) -> Set[WebSocket]:
+    """Removes and returns all websocket connections of a chat."""
+    return connections.pop_chat(chat_id)
 
-def get_active_websocket(chat_id: int) -> Optional[WebSocket]:
-    """Gets the active websocket for a chat_id."""
-    return active_websockets.get(chat_id)
+
+def get_active_websockets(chat_id: int) -> Set[WebSocket]:
+    """Gets the active websockets for a chat_id."""
+    return connections.get(chat_id)
 
 
 def clear_chat_session(chat_id: int):
-    """Clears access code and potentially other session data for a chat."""
-    if chat_id in chats_data:
-        old_code = chats_data[chat_id].get("access_code")
-        if old_code and old_code in code_to_chat_id:
-            del code_to_chat_id[old_code]
-        chats_data[chat_id]["access_code"] = None
-        # Решение о сохранении/удалении истории сообщений остается за вами.
-        # Если нужно удалять, раскомментируйте:
-        # chats_data[chat_id]["messages"] = []
-        # Или для полного удаления данных чата (если он больше не нужен):
-        # del chats_data[chat_id]
+    """Clears the access code of a chat and revokes all its browser sessions."""
+    backend.clear_session(chat_id)
+    web_sessions.forget_chat(chat_id)
+    operators.publish({"type": "closed", "chat_id": chat_id})
+    # Решение о сохранении/удалении истории сообщений остается за вами.
 
 
 def set_chat_session(chat_id: int, username: str, access_code: str):
     """Sets up a new chat session."""
-    chats_data[chat_id]["username"] = username
-    chats_data[chat_id]["access_code"] = access_code
-    code_to_chat_id[access_code] = chat_id
+    backend.set_session(chat_id, username, access_code)
+    operators.publish({"type": "session", "chat_id": chat_id, "username": username})
     # По умолчанию сообщения не очищаются при установке новой сессии.
-    # Если это нужно, раскомментируйте:
-    # chats_data[chat_id]["messages"] = []
+
+
+def set_chat_username(chat_id: int, username: str):
+    """Updates the stored username of an existing chat."""
+    backend.set_username(chat_id, username)
+    operators.publish({"type": "username", "chat_id": chat_id, "username": username})
 
 
 def add_message_to_store(
-    chat_id: int, sender: str, text: str, timestamp: str
-) -> Optional[Dict[str, str]]:  # Уточнил тип возвращаемого значения
-    """Adds a message to the specific chat's message list."""
-    if chat_id in chats_data:
-        message_data = {"sender": sender, "text": text, "timestamp": timestamp}
-        chats_data[chat_id]["messages"].append(message_data)
-        return message_data
-    return None  # Если chat_id не найден, возвращаем None
+    chat_id: int,
+    sender: str,
+    text: str,
+    timestamp: int,
+    media: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:  # Уточнил тип возвращаемого значения
+    """Adds a message (timestamp in epoch seconds; `media` for a file, `text` is its caption)."""
+    message_data = backend.append_message(chat_id, sender, text, timestamp, media)
+    if message_data:
+        search.add(chat_id, message_data)
+        operators.publish(
+            {"type": "message", "chat_id": chat_id, "message": message_data, "at": timestamp}
+        )
+    return message_data
+
+
+def mark_chat_read(chat_id: int, seq: int):
+    """Marks the chat read by operators up to message `seq`."""
+    unread = backend.mark_read(chat_id, seq)
+    operators.publish({"type": "read", "chat_id": chat_id, "seq": seq, "unread": unread})
+
+
+async def search_messages(
+    query: str,
+    chat_id: Optional[int] = None,
+    limit: int = 20,
+    before: Optional[Tuple[int, int]] = None,
+) -> Dict[str, Any]:
+    """
+    Finds messages containing every word of `query`, newest first (in one chat
+    or all); `before` and the returned "next_before" are (chat_id, seq).
+    """
+    return await search.search(query, chat_id, limit, before)
+
+
+def touch_chat(chat_id: int):
+    """Marks the chat's session as in use (login, websocket connect), postponing its expiry."""
+    backend.touch(chat_id)
+
+
+def expire_sessions(now: float, limit: int) -> Tuple[List[int], int]:
+    """
+    Expires idle sessions and chats among up to `limit` due chats. Returns
+    the chats whose session ended and how many chats were looked at.
+    """
+    expired, processed = backend.expire(now, limit)
+    for chat_id in expired:
+        web_sessions.forget_chat(chat_id)
+        operators.publish({"type": "closed", "chat_id": chat_id})
+    return expired, processed
 
 
 def get_messages(chat_id: int) -> List[Dict[str, Any]]:
-    """Gets all messages for a chat."""
-    return list(chats_data.get(chat_id, {}).get("messages", []))
+    """Gets all stored messages for a chat (at most HISTORY_MAX_MESSAGES)."""
+    return backend.get_messages(chat_id)
+
+
+def get_messages_page(
+    chat_id: int, before_seq: Optional[int] = None, limit: int = 50
+) -> List[Dict[str, Any]]:
+    """Gets up to `limit` messages older than `before_seq` (or the newest), oldest first."""
+    return backend.get_messages_before(chat_id, before_seq, limit)
+
+
+def get_messages_after(chat_id: int, after_seq: int, limit: int) -> List[Dict[str, Any]]:
+    """Gets up to `limit` messages newer than `after_seq`, oldest first."""
+    return backend.get_messages_after(chat_id, after_seq, limit)
+
+
+def publish_chat_event(chat_id: int, payload: Dict[str, Any]):
+    """Forwards a chat event to the workers holding the chat's websocket."""
+    backend.publish(chat_id, payload)
+
+
+def poll_chat_events() -> List[Tuple[int, Dict[str, Any]]]:
+    """Returns chat events forwarded to this worker."""
+    return backend.poll_events()
+
+
+def reset_store():
+    """Clears all chats, codes and local websockets (used by tests)."""
+    backend.clear()
+    connections.clear()
+    login_limiter.clear()
+    web_sessions.clear()
+    operators.clear()
+    search.clear()
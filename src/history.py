@@ -0,0 +1,318 @@
+import heapq
+import json
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Примерная стоимость сообщения без текста: метка времени в array('q'),
+# ссылка на отправителя (интернированная строка) и ссылка на bytes в списке.
+_RECORD_OVERHEAD = 8 + 8 + 8
+
+
+def format_timestamp(ts: int) -> str:
+    """Formats epoch seconds the way the web UI has always shown them."""
+    return time.strftime(TIMESTAMP_FORMAT, time.localtime(ts))
+
+
+def dump_media(media: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Serializes file metadata for its own column; None for text messages."""
+    if media is None:
+        return None
+    return json.dumps(media, ensure_ascii=False, separators=(",", ":"))
+
+
+def message_dict(
+    seq: int, sender: str, text: str, ts: int, media: Optional[str] = None
+) -> Dict[str, Any]:
+    """Builds the message dict every backend returns; "media" is only present for files."""
+    message = {"seq": seq, "sender": sender, "text": text, "timestamp": format_timestamp(ts)}
+    if media is not None:
+        message["media"] = json.loads(media)
+    return message
+
+
+def _text_cost(text: bytes, media: Optional[str] = None) -> int:
+    return _RECORD_OVERHEAD + sys.getsizeof(text) + (sys.getsizeof(media) if media else 0)
+
+
+class MessageHistory:
+    """
+    Bounded ring buffer with the messages of one chat, stored column-wise:
+    epoch-second timestamps in an array, interned sender names, UTF-8
+    encoded texts and JSON file metadata (None for text messages). Every
+    message gets a per-chat sequence number; dicts are only built when
+    messages are serialized.
+    """
+
+    __slots__ = (
+        "capacity",
+        "_stamps",
+        "_senders",
+        "_texts",
+        "_media",
+        "_start",
+        "_size",
+        "first_seq",
+        "bytes_used",
+    )
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._stamps = array("q")
+        self._senders: List[str] = []
+        self._texts: List[bytes] = []
+        self._media: List[Optional[str]] = []
+        self._start = 0  # физический индекс самого старого сообщения
+        self._size = 0
+        self.first_seq = 1  # seq самого старого хранимого сообщения
+        self.bytes_used = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def next_seq(self) -> int:
+        return self.first_seq + self._size
+
+    def append(self, sender: str, text: str, ts: int, media: Optional[str] = None) -> int:
+        """Stores a message, evicting the oldest one when full. Returns bytes delta."""
+        encoded = text.encode("utf-8")
+        delta = _text_cost(encoded, media)
+        sender = sys.intern(sender)
+        slots = len(self._texts)
+        if self._size < slots:
+            # Есть свободные слоты (после вытеснения по бюджету) — пишем по кругу.
+            pos = (self._start + self._size) % slots
+            self._put(pos, sender, encoded, ts, media)
+            self._size += 1
+        elif slots < self.capacity:
+            self._linearize()
+            self._stamps.append(ts)
+            self._senders.append(sender)
+            self._texts.append(encoded)
+            self._media.append(media)
+            self._size += 1
+        else:
+            delta -= _text_cost(self._texts[self._start], self._media[self._start])
+            self._put(self._start, sender, encoded, ts, media)
+            self._start = (self._start + 1) % slots
+            self.first_seq += 1
+        self.bytes_used += delta
+        return delta
+
+    def evict_oldest(self, count: int) -> int:
+        """Drops up to `count` oldest messages. Returns the number of bytes freed."""
+        freed = 0
+        slots = len(self._texts)
+        for _ in range(min(count, self._size)):
+            freed += _text_cost(self._texts[self._start], self._media[self._start])
+            self._texts[self._start] = b""
+            self._media[self._start] = None
+            self._start = (self._start + 1) % slots
+            self._size -= 1
+            self.first_seq += 1
+        self.bytes_used -= freed
+        return freed
+
+    def count_after(self, seq: int, sender: str) -> int:
+        """Counts stored messages of `sender` with seq > `seq`, without serializing them."""
+        senders = self._senders
+        slots = len(senders)
+        start = max(0, seq + 1 - self.first_seq)
+        return sum(
+            1 for i in range(start, self._size) if senders[(self._start + i) % slots] == sender
+        )
+
+    def get(self, seq: int) -> Optional[Dict[str, Any]]:
+        """Returns the serialized message with the given seq, if still stored."""
+        index = seq - self.first_seq
+        if 0 <= index < self._size:
+            return self._serialize(index)
+        return None
+
+    def before(self, seq: Optional[int], limit: int) -> List[Dict[str, Any]]:
+        """Returns up to `limit` newest messages with seq < `seq`, oldest first."""
+        stop = self._size if seq is None else min(self._size, seq - self.first_seq)
+        return self.slice(stop - limit, stop)
+
+    def after(self, seq: int, limit: int) -> List[Dict[str, Any]]:
+        """Returns up to `limit` oldest messages with seq > `seq`, oldest first."""
+        start = max(0, seq + 1 - self.first_seq)
+        return self.slice(start, start + limit)
+
+    def slice(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        """Serializes messages with logical indexes [start, stop), 0 being the oldest."""
+        start = max(0, start)
+        stop = min(self._size, stop)
+        return [self._serialize(i) for i in range(start, stop)]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in range(self._size):
+            yield self._serialize(i)
+
+    def texts(self) -> Iterator[Tuple[int, int, str]]:
+        """Yields (timestamp, seq, text) of stored messages, oldest first, without formatting timestamps."""
+        slots = len(self._texts)
+        for i in range(self._size):
+            pos = (self._start + i) % slots
+            yield self._stamps[pos], self.first_seq + i, self._texts[pos].decode("utf-8")
+
+    def export(self) -> tuple:
+        """Returns a copy of the columns in logical order (for snapshots)."""
+        self._linearize()
+        size = self._size
+        return (
+            self.first_seq,
+            self._stamps[:size].tobytes(),
+            self._senders[:size],
+            self._texts[:size],
+            self._media[:size],
+        )
+
+    @classmethod
+    def restore(cls, capacity: int, exported: tuple) -> "MessageHistory":
+        """Rebuilds a history from export() output (snapshots older than files have no media column)."""
+        first_seq, stamps, senders, texts = exported[:4]
+        media = exported[4] if len(exported) > 4 else [None] * len(texts)
+        history = cls(capacity)
+        history._stamps.frombytes(stamps)
+        history._senders = [sys.intern(s) for s in senders]
+        history._texts = list(texts)
+        history._media = list(media)
+        history._size = len(texts)
+        history.first_seq = first_seq
+        history.bytes_used = sum(_text_cost(t, m) for t, m in zip(texts, media))
+        # Если лимит уменьшили между запусками — оставляем только свежие сообщения.
+        if history._size > capacity:
+            history.evict_oldest(history._size - capacity)
+            history._linearize()
+            del history._stamps[capacity:]
+            del history._senders[capacity:]
+            del history._texts[capacity:]
+            del history._media[capacity:]
+        return history
+
+    def _put(self, pos: int, sender: str, text: bytes, ts: int, media: Optional[str]):
+        self._stamps[pos] = ts
+        self._senders[pos] = sender
+        self._texts[pos] = text
+        self._media[pos] = media
+
+    def _linearize(self):
+        """Rotates the columns so the oldest message sits at index 0."""
+        if self._start:
+            s = self._start
+            self._stamps = self._stamps[s:] + self._stamps[:s]
+            self._senders = self._senders[s:] + self._senders[:s]
+            self._texts = self._texts[s:] + self._texts[:s]
+            self._media = self._media[s:] + self._media[:s]
+            self._start = 0
+
+    def _serialize(self, index: int) -> Dict[str, Any]:
+        pos = (self._start + index) % len(self._texts)
+        return message_dict(
+            self.first_seq + index,
+            self._senders[pos],
+            self._texts[pos].decode("utf-8"),
+            self._stamps[pos],
+            self._media[pos],
+        )
+
+
+class HistoryStore:
+    """
+    Message histories of all chats with a per-chat cap and a global memory
+    budget. Over budget, the oldest messages of the least recently active
+    chats are evicted first.
+    """
+
+    def __init__(self, capacity: int, budget_bytes: int):
+        self.capacity = capacity
+        self.budget_bytes = budget_bytes
+        self.bytes_used = 0
+        self._histories: "OrderedDict[int, MessageHistory]" = OrderedDict()
+
+    def get(self, chat_id: int) -> Optional[MessageHistory]:
+        return self._histories.get(chat_id)
+
+    def append(
+        self, chat_id: int, sender: str, text: str, ts: int, media: Optional[str] = None
+    ) -> Dict[str, Any]:
+        history = self._histories.get(chat_id)
+        if history is None:
+            history = self._histories[chat_id] = MessageHistory(self.capacity)
+        else:
+            self._histories.move_to_end(chat_id)
+        self.bytes_used += history.append(sender, text, ts, media)
+        if self.bytes_used > self.budget_bytes:
+            self._enforce_budget(keep=chat_id)
+        return history.get(history.next_seq - 1)
+
+    def messages(self, chat_id: int) -> List[Dict[str, Any]]:
+        history = self._histories.get(chat_id)
+        return list(history) if history else []
+
+    def messages_before(
+        self, chat_id: int, seq: Optional[int], limit: int
+    ) -> List[Dict[str, Any]]:
+        history = self._histories.get(chat_id)
+        return history.before(seq, limit) if history else []
+
+    def messages_after(self, chat_id: int, seq: int, limit: int) -> List[Dict[str, Any]]:
+        history = self._histories.get(chat_id)
+        return history.after(seq, limit) if history else []
+
+    def count_after(self, chat_id: int, seq: int, sender: str) -> int:
+        history = self._histories.get(chat_id)
+        return history.count_after(seq, sender) if history else 0
+
+    def scan(self) -> Iterator[Tuple[int, int, str]]:
+        """Yields (chat_id, seq, text) of all stored messages, merged by timestamp across chats."""
+        def chat_texts(chat_id: int, history: MessageHistory):
+            for ts, seq, text in history.texts():
+                yield ts, chat_id, seq, text
+
+        streams = [chat_texts(chat_id, h) for chat_id, h in list(self._histories.items())]
+        for _, chat_id, seq, text in heapq.merge(*streams, key=lambda item: item[0]):
+            yield chat_id, seq, text
+
+    def drop(self, chat_id: int):
+        history = self._histories.pop(chat_id, None)
+        if history:
+            self.bytes_used -= history.bytes_used
+
+    def clear(self):
+        self._histories.clear()
+        self.bytes_used = 0
+
+    def export(self) -> Dict[int, tuple]:
+        return {chat_id: h.export() for chat_id, h in self._histories.items()}
+
+    def restore(self, exported: Dict[int, tuple]):
+        self.clear()
+        for chat_id, columns in exported.items():
+            history = MessageHistory.restore(self.capacity, columns)
+            self._histories[chat_id] = history
+            self.bytes_used += history.bytes_used
+
+    def __len__(self) -> int:
+        return len(self._histories)
+
+    def message_count(self) -> int:
+        return sum(len(h) for h in self._histories.values())
+
+    def _enforce_budget(self, keep: int):
+        for chat_id, history in self._histories.items():
+            if self.bytes_used <= self.budget_bytes:
+                return
+            if chat_id == keep:
+                continue
+            self.bytes_used -= history.evict_oldest(len(history))
+        # Бюджет все еще превышен одним активным чатом — режем его хвост.
+        history = self._histories.get(keep)
+        while history and self.bytes_used > self.budget_bytes and len(history) > 1:
+            self.bytes_used -= history.evict_oldest(max(1, len(history) // 4))
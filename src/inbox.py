@@ -0,0 +1,273 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from fastapi import WebSocket
+
+from src.connections import ConnectionRegistry
+from src.state import StateBackend
+
+# Псевдо-чат, под которым в реестре соединений живут сокеты операторов и через
+# который воркеры пересылают друг другу события входящих. Telegram chat_id не бывает 0.
+INBOX_CHANNEL = 0
+
+
+class InboxEntry:
+    """One chat with an active session as the operator inbox shows it."""
+
+    __slots__ = ("chat_id", "username", "read_seq", "unread", "last", "active_at")
+
+    def __init__(
+        self,
+        chat_id: int,
+        username: Optional[str],
+        read_seq: int = 0,
+        unread: int = 0,
+        last: Optional[Dict[str, Any]] = None,
+        active_at: float = 0.0,
+    ):
+        self.chat_id = chat_id
+        self.username = username
+        self.read_seq = read_seq
+        self.unread = unread
+        self.last = last
+        self.active_at = active_at
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "chat_id": self.chat_id,
+            "username": self.username,
+            "unread": self.unread,
+            "read_seq": self.read_seq,
+            "last": self.last,
+            "active_at": self.active_at,
+        }
+
+
+class InboxIndex:
+    """
+    Active chats ordered by recency, kept up to date by inbox events instead
+    of scanning the store: a message moves its chat to the top and, if it
+    is from the user and not read yet, bumps the unread counters. The index
+    is built from the backend once (load) and only while it is loaded do
+    events change it. Previews keep the first `preview_chars` characters.
+    """
+
+    def __init__(self, preview_chars: int = 100):
+        self.preview_chars = preview_chars
+        # Самый давно активный чат первый, самый свежий — последний.
+        self.entries: "OrderedDict[int, InboxEntry]" = OrderedDict()
+        self.unread_total = 0
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, chat_id: int) -> bool:
+        return chat_id in self.entries
+
+    def preview(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        preview = {
+            "seq": message["seq"],
+            "sender": message["sender"],
+            "text": message["text"][: self.preview_chars],
+            "timestamp": message["timestamp"],
+        }
+        if "media" in message:
+            preview["media"] = message["media"]["kind"]
+        return preview
+
+    def load(self, rows: Iterable[Dict[str, Any]]):
+        """Replaces the index with backend rows (StateBackend.inbox_entries)."""
+        self.unload()
+        for row in sorted(rows, key=lambda row: row["active_at"]):
+            self.put(row)
+        self.loaded = True
+
+    def unload(self):
+        self.entries.clear()
+        self.unread_total = 0
+        self.loaded = False
+
+    def put(self, row: Dict[str, Any]) -> InboxEntry:
+        """Adds or replaces one chat from a backend row, as the most recent one."""
+        self.remove(row["chat_id"])
+        last = row.get("last")
+        entry = InboxEntry(
+            row["chat_id"],
+            row["username"],
+            row.get("read_seq", 0),
+            row.get("unread", 0),
+            self.preview(last) if last else None,
+            row.get("active_at", 0.0),
+        )
+        self.entries[entry.chat_id] = entry
+        self.unread_total += entry.unread
+        return entry
+
+    def remove(self, chat_id: int) -> bool:
+        entry = self.entries.pop(chat_id, None)
+        if entry is None:
+            return False
+        self.unread_total -= entry.unread
+        return True
+
+    def message(self, chat_id: int, message: Dict[str, Any], at: float) -> Optional[InboxEntry]:
+        """Records a new message; returns the changed entry (None if the chat is not listed)."""
+        entry = self.entries.get(chat_id)
+        if entry is None or (entry.last and message["seq"] <= entry.last["seq"]):
+            return None  # уже учтено при загрузке
+        entry.last = self.preview(message)
+        entry.active_at = max(entry.active_at, at)
+        if message["sender"] == "user" and message["seq"] > entry.read_seq:
+            entry.unread += 1
+            self.unread_total += 1
+        self.entries.move_to_end(chat_id)
+        return entry
+
+    def read(self, chat_id: int, seq: int, unread: int) -> Optional[InboxEntry]:
+        """Applies a moved read marker and the unread count the backend computed for it."""
+        entry = self.entries.get(chat_id)
+        if entry is None or seq < entry.read_seq:
+            return None
+        entry.read_seq = seq
+        self.unread_total += unread - entry.unread
+        entry.unread = unread
+        return entry
+
+    def rename(self, chat_id: int, username: str) -> Optional[InboxEntry]:
+        entry = self.entries.get(chat_id)
+        if entry is None or entry.username == username:
+            return None
+        entry.username = username
+        return entry
+
+    def newest(self, limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """Summaries of the most recently active chats, newest first."""
+        page = []
+        for index, chat_id in enumerate(reversed(self.entries)):
+            if index >= offset + limit:
+                break
+            if index >= offset:
+                page.append(self.entries[chat_id].summary())
+        return page
+
+
+class OperatorHub:
+    """
+    Operator websockets of this worker and the inbox they share. Operator
+    sockets are registered in the connection registry under INBOX_CHANNEL,
+    so they get the same bounded outboxes as chat sockets and this worker
+    becomes an owner of the channel: other workers address inbox events to
+    it. The index is loaded when the first operator connects and dropped
+    with the last one, so workers without operators keep no index.
+
+    One socket carries everything an operator needs: summaries of changed
+    chats for the list, and full messages and delivery reports of the chats
+    it watches (the ones open on its screen).
+    """
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        connections: ConnectionRegistry,
+        index: InboxIndex,
+        page_size: int = 100,
+    ):
+        self.backend = backend
+        self.connections = connections
+        self.index = index
+        self.page_size = page_size
+        self.watching: Dict[WebSocket, Set[int]] = {}
+        self.watchers: Dict[int, Set[WebSocket]] = {}
+
+    def attach(self, websocket: WebSocket):
+        """Registers an operator socket and queues the inbox snapshot for it."""
+        if not self.index.loaded:
+            # Сначала подписка на события, потом снимок: событие между ними придет
+            # повторно и будет отброшено по seq, но не потеряется.
+            self.backend.register_socket_owner(INBOX_CHANNEL)
+            self.index.load(self.backend.inbox_entries())
+        self.watching[websocket] = set()
+        self.connections.add(INBOX_CHANNEL, websocket, [self.snapshot()])
+
+    def detach(self, websocket: WebSocket):
+        self.connections.remove(INBOX_CHANNEL, websocket)
+        self.watch(websocket, ())
+        self.watching.pop(websocket, None)
+        if not self.watching:
+            self.index.unload()
+
+    def snapshot(self, offset: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "type": "inbox",
+            "offset": offset,
+            "chats": self.index.newest(limit or self.page_size, offset),
+            "total": len(self.index),
+            "unread": self.index.unread_total,
+        }
+
+    def watch(self, websocket: WebSocket, chat_ids: Iterable[int]):
+        """Replaces the set of chats whose messages this socket receives."""
+        for chat_id in self.watching.get(websocket, ()):
+            sockets = self.watchers.get(chat_id)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self.watchers[chat_id]
+        if websocket not in self.watching:
+            return
+        chat_ids = set(chat_ids)
+        self.watching[websocket] = chat_ids
+        for chat_id in chat_ids:
+            self.watchers.setdefault(chat_id, set()).add(websocket)
+
+    def send(self, websocket: WebSocket, payload: Dict[str, Any]) -> bool:
+        return self.connections.send(INBOX_CHANNEL, websocket, payload)
+
+    def publish(self, event: Dict[str, Any]):
+        """Applies an inbox event here and forwards it to the other workers with operators."""
+        self.apply(event)
+        self.backend.publish(INBOX_CHANNEL, event)
+
+    def apply(self, event: Dict[str, Any]):
+        """Updates the local index with an inbox event and streams the change to operators."""
+        if not self.index.loaded:
+            return
+        kind, chat_id = event["type"], event["chat_id"]
+        entry = None
+        if kind == "message":
+            entry = self.index.message(chat_id, event["message"], event["at"])
+            frame = {"type": "message", "chat_id": chat_id, "message": event["message"]}
+            for websocket in self.watchers.get(chat_id, ()):
+                self.send(websocket, frame)
+        elif kind == "session":
+            if chat_id in self.index:
+                entry = self.index.rename(chat_id, event["username"])
+            else:
+                rows = self.backend.inbox_entries([chat_id])
+                entry = self.index.put(rows[0]) if rows else None
+        elif kind == "username":
+            entry = self.index.rename(chat_id, event["username"])
+        elif kind == "read":
+            entry = self.index.read(chat_id, event["seq"], event["unread"])
+        elif kind == "closed":
+            if self.index.remove(chat_id):
+                self.connections.broadcast(
+                    INBOX_CHANNEL,
+                    {"type": "chat_closed", "chat_id": chat_id, "unread": self.index.unread_total},
+                )
+        if entry is not None:
+            self.connections.broadcast(
+                INBOX_CHANNEL,
+                {"type": "chat", "chat": entry.summary(), "unread": self.index.unread_total},
+            )
+
+    def forward(self, chat_id: int, payload: Dict[str, Any]):
+        """Passes a chat frame (e.g. a delivery report) to the operators watching the chat."""
+        for websocket in self.watchers.get(chat_id, ()):
+            self.send(websocket, dict(payload, chat_id=chat_id))
+
+    def clear(self):
+        self.watching.clear()
+        self.watchers.clear()
+        self.index.unload()
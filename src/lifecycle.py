@@ -0,0 +1,40 @@
+import time
+from typing import Optional
+
+from src.metrics import Gauge, registry
+
+
+class Lifecycle:
+    """
+    Drain state of this worker. While draining the worker takes no new
+    logins or websockets and /health reports 503, so a load balancer moves
+    traffic to other workers while the work in progress finishes.
+    """
+
+    def __init__(self):
+        self.draining = False
+        self.drain_started: Optional[float] = None
+
+    def start_draining(self) -> bool:
+        """Enters drain mode; returns False if the worker was already draining."""
+        if self.draining:
+            return False
+        self.draining = True
+        self.drain_started = time.time()
+        return True
+
+    def reset(self):
+        """Leaves drain mode (used by tests)."""
+        self.draining = False
+        self.drain_started = None
+
+
+lifecycle = Lifecycle()
+
+registry.register(
+    Gauge(
+        "webbridge_draining",
+        "1 while this worker is draining before shutdown.",
+        function=lambda: int(lifecycle.draining),
+    )
+)
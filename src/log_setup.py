@@ -0,0 +1,92 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, TextIO
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Атрибуты, которые есть у любой записи; все остальное пришло через extra=.
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+    "taskName",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed with extra= become top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Puts the record itself on the queue. The stock QueueHandler formats the
+    message before enqueueing (it has to be picklable); with a listener in the
+    same process all formatting can happen on the listener thread instead,
+    as long as log arguments are not mutated after the call.
+    """
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.enqueue(record)
+        except Exception:
+            self.handleError(record)
+
+
+class LogSampler:
+    """Lets through one call in `every`, for log lines written once per message."""
+
+    __slots__ = ("every", "count")
+
+    def __init__(self, every: int):
+        self.every = max(1, every)
+        self.count = 0
+
+    def __call__(self) -> bool:
+        self.count += 1
+        return self.count % self.every == 0
+
+
+def configure_logging(
+    level: str = "INFO",
+    fmt: str = "text",
+    use_queue: bool = True,
+    stream: Optional[TextIO] = None,
+) -> Optional[QueueListener]:
+    """
+    Configures the root logger. With `use_queue` the event loop only puts
+    records on a queue, and a QueueListener thread formats and writes them.
+    Returns the started listener (stopped at exit, which flushes the queue).
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.setLevel(level.upper())
+    if not use_queue:
+        root.addHandler(handler)
+        return None
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root.addHandler(DeferredQueueHandler(records))
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,197 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as TallyCounter, deque
+from typing import Any, Deque, Dict, List, Optional
+
+from src.config import (
+    LOOP_SLOW_CALLBACK_MS,
+    METRICS_LOOP_LAG_INTERVAL,
+    logger,
+)
+from src.metrics import Counter, Histogram, event_loop_lag_seconds, registry
+
+slow_callbacks_total = registry.register(
+    Counter(
+        "webbridge_slow_callbacks",
+        "Times the event loop was blocked longer than the slow-callback threshold.",
+    )
+)
+
+
+def folded_stack(frame) -> str:
+    """Stack of `frame` in the folded format of flame graphs: root first, ';'-separated."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float = 0.005) -> Dict[str, int]:
+    """
+    Statistical profile of another thread: samples its current stack every
+    `interval` seconds for `seconds` and counts identical stacks. Meant to
+    run in a helper thread while the sampled thread keeps working.
+
+    The sampler needs the GIL to take a sample, so it mostly catches the
+    loop either waiting in select() or running code that holds the GIL for
+    a whole switch interval (sys.getswitchinterval(), 5 ms). That is what
+    blocks the loop; many short callbacks are better seen with cProfile.
+    """
+    samples: Dict[str, int] = TallyCounter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        samples[folded_stack(frame)] += 1
+        del frame
+        time.sleep(interval)
+    return samples
+
+
+class LoopMonitor:
+    """
+    Health of the worker's event loop, which the bot and the web share.
+
+    - run_lag_probe() sleeps in a loop and records how late each wake-up was.
+    - With `slow_threshold` > 0 a watchdog thread pings the loop every
+      `watchdog_interval` seconds. If the ping is not answered within the
+      threshold, the loop is blocked; the watchdog captures the loop
+      thread's stack at that moment, which points at the blocking code.
+    - profile() captures an on-demand profile of the loop thread.
+    """
+
+    def __init__(
+        self,
+        lag_interval: float = 0.5,
+        slow_threshold: float = 0.0,
+        watchdog_interval: float = 0.05,
+        keep: int = 50,
+        lag_histogram: Histogram = event_loop_lag_seconds,
+    ):
+        self.lag_interval = lag_interval
+        self.slow_threshold = slow_threshold
+        self.watchdog_interval = watchdog_interval
+        self.lag_histogram = lag_histogram
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.slow_callbacks: Deque[Dict[str, Any]] = deque(maxlen=keep)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._profiling = False
+
+    def start(self) -> List[asyncio.Task]:
+        """Starts monitoring the running loop; returns the tasks to cancel on shutdown."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        tasks = []
+        if self.lag_interval > 0:
+            tasks.append(asyncio.create_task(self.run_lag_probe()))
+        if self.slow_threshold > 0 and not self._watchdog:
+            self._stop.clear()
+            self._watchdog = threading.Thread(
+                target=self._watch, name="loop-watchdog", daemon=True
+            )
+            self._watchdog.start()
+        return tasks
+
+    def stop(self):
+        self._stop.set()
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    async def run_lag_probe(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, loop.time() - started - self.lag_interval)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.lag_histogram.observe(lag)
+
+    def _watch(self):
+        while not self._stop.wait(self.watchdog_interval):
+            answered = threading.Event()
+            sent = time.monotonic()
+            try:
+                self._loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:  # цикл закрыт
+                return
+            if answered.wait(self.slow_threshold):
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            del frame
+            while not answered.wait(0.1):
+                if self._stop.is_set():
+                    return
+            self._record_slow(time.monotonic() - sent, stack)
+
+    def _record_slow(self, duration: float, stack: str):
+        slow_callbacks_total.inc()
+        self.slow_callbacks.append(
+            {"at": time.time(), "duration": round(duration, 4), "stack": stack}
+        )
+        logger.warning(
+            "Цикл событий был заблокирован %.0f мс. Стек в момент блокировки:\n%s",
+            duration * 1000,
+            stack,
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "lag_interval": self.lag_interval,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "slow_threshold": self.slow_threshold,
+            "slow_callbacks": list(self.slow_callbacks),
+        }
+
+    async def profile(self, seconds: float, mode: str = "sample", limit: int = 60) -> str:
+        """
+        Profiles the loop thread for `seconds`. "sample" returns folded stacks
+        ("frame;frame;... count", most frequent first) sampled from a helper
+        thread; "cprofile" runs cProfile in the loop thread and returns the
+        top `limit` functions by cumulative time. One profile at a time.
+        """
+        if self._profiling:
+            raise RuntimeError("A profile is already being captured")
+        self._profiling = True
+        try:
+            if mode == "sample":
+                samples = await asyncio.to_thread(
+                    sample_stacks, threading.get_ident(), seconds
+                )
+                ordered = sorted(samples.items(), key=lambda item: -item[1])
+                return "".join(f"{stack} {count}\n" for stack, count in ordered)
+            if mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    await asyncio.sleep(seconds)
+                finally:
+                    profiler.disable()
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(limit)
+                return out.getvalue()
+            raise ValueError(f"Unknown profile mode: {mode!r}")
+        finally:
+            self._profiling = False
+
+
+loop_monitor = LoopMonitor(
+    lag_interval=METRICS_LOOP_LAG_INTERVAL,
+    slow_threshold=LOOP_SLOW_CALLBACK_MS / 1000,
+)
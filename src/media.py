@@ -0,0 +1,379 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import secrets
+import shutil
+from collections import OrderedDict
+from typing import Any, AsyncIterator, BinaryIO, Dict, Optional
+
+import httpx
+from telegram import Bot
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from src.config import logger
+
+# Порядок важен: у анимации в сообщении есть и поле document.
+MEDIA_KINDS = ("photo", "animation", "video", "video_note", "voice", "audio", "document")
+DEFAULT_MIME = {
+    "photo": "image/jpeg",
+    "animation": "video/mp4",
+    "video": "video/mp4",
+    "video_note": "video/mp4",
+    "voice": "audio/ogg",
+}
+# sendPhoto принимает только такие изображения и не больше 10 МБ; остальное уходит документом.
+PHOTO_MIME_TYPES = ("image/jpeg", "image/png", "image/webp")
+PHOTO_MAX_BYTES = 10 * 1024 * 1024
+# Типы, которые браузер может показать на странице; остальные файлы только скачиваются.
+INLINE_MIME_PREFIXES = ("image/", "audio/", "video/")
+
+
+class MediaError(Exception):
+    """A file could not be fetched from Telegram."""
+
+
+def media_from_message(message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    File metadata of a Telegram message (a Message.to_dict() or a Bot API
+    result): kind, file_id, file_unique_id, name, mime and size. The
+    largest size is taken for photos. None if the message has no file.
+    """
+    for kind in MEDIA_KINDS:
+        item = message.get(kind)
+        if not item:
+            continue
+        if kind == "photo":
+            item = max(item, key=lambda size: size.get("file_size") or size["width"] * size["height"])
+        return {
+            "kind": kind,
+            "file_id": item["file_id"],
+            "file_unique_id": item["file_unique_id"],
+            "name": item.get("file_name"),
+            "mime": item.get("mime_type") or DEFAULT_MIME.get(kind),
+            "size": item.get("file_size"),
+        }
+    return None
+
+
+def media_filename(media: Dict[str, Any]) -> str:
+    if media.get("name"):
+        return media["name"]
+    extension = mimetypes.guess_extension(media.get("mime") or "") or ""
+    return media["kind"] + extension
+
+
+def is_inline(mime: Optional[str]) -> bool:
+    return bool(mime) and mime.startswith(INLINE_MIME_PREFIXES) and mime != "image/svg+xml"
+
+
+def upload_kind(mime: Optional[str], size: int) -> str:
+    """Whether a file from the web goes out as a photo or as a document."""
+    return "photo" if mime in PHOTO_MIME_TYPES and size <= PHOTO_MAX_BYTES else "document"
+
+
+class MediaUpload:
+    """A file posted from the web UI, spooled to disk until it is sent to Telegram."""
+
+    __slots__ = ("kind", "filename", "mime", "file", "caption", "size")
+
+    def __init__(
+        self, kind: str, filename: str, mime: Optional[str], file: BinaryIO, caption: str, size: int
+    ):
+        self.kind = kind
+        self.filename = filename
+        self.mime = mime
+        self.file = file
+        self.caption = caption
+        self.size = size
+
+    def close(self):
+        self.file.close()
+
+
+class CacheWriter:
+    """
+    Writes one file into the cache directory: chunks go to a temporary file,
+    which replaces the cached one on commit. A file larger than the whole
+    cache is not kept. Only touches the disk (blocking; run it in a thread):
+    the committed size is recorded with MediaCache.put on the event loop.
+    """
+
+    def __init__(self, cache: "MediaCache", key: str):
+        self.cache = cache
+        self.key = key
+        self.path = f"{cache.path(key)}.{secrets.token_hex(4)}.part"
+        self.size = 0
+        self._file: Optional[BinaryIO] = open(self.path, "wb")
+
+    def write(self, chunk: bytes):
+        if self._file is None:
+            return
+        self.size += len(chunk)
+        if self.size > self.cache.max_bytes:
+            self.abort()
+            return
+        self._file.write(chunk)
+
+    def commit(self) -> Optional[int]:
+        """Moves the file into place and returns its size; None if it was not kept."""
+        if self._file is None:
+            return None
+        self._file.close()
+        self._file = None
+        os.replace(self.path, self.cache.path(self.key))
+        return self.size
+
+    def abort(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class MediaCache:
+    """
+    Bounded on-disk LRU cache of relayed files, keyed by Telegram's
+    file_unique_id (the same file always has the same one). Sizes and
+    recency are kept in memory; files left from a previous run are adopted
+    oldest first. Over `max_bytes`, the least recently used files are
+    deleted. The index is not locked: it is only changed on the event loop,
+    files are written in threads (writer, store) and then added with put.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def key(file_unique_id: str) -> str:
+        # file_unique_id приходит от Telegram, в имени файла используем только хеш.
+        return hashlib.sha256(file_unique_id.encode()).hexdigest()[:32]
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, file_unique_id: str) -> Optional[str]:
+        """Path of the cached file (marked as recently used), or None."""
+        key = self.key(file_unique_id)
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        path = self.path(key)
+        if not os.path.exists(path):
+            self.bytes_used -= self.entries.pop(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return path
+
+    def fits(self, size: Optional[int]) -> bool:
+        return size is not None and size <= self.max_bytes
+
+    def writer(self, file_unique_id: str) -> CacheWriter:
+        """Opens a writer for a file (blocking; run it in a thread)."""
+        return CacheWriter(self, self.key(file_unique_id))
+
+    def store(self, file_unique_id: str, source: BinaryIO) -> Optional[int]:
+        """
+        Copies a file object into the cache directory (blocking; run it in a
+        thread) and returns its size for put, or None if it was not kept.
+        """
+        writer = self.writer(file_unique_id)
+        try:
+            source.seek(0)
+            shutil.copyfileobj(source, writer)
+            return writer.commit()
+        finally:
+            writer.abort()
+
+    def put(self, key: str, size: int):
+        """Records a written file as the most recently used and evicts over the limit."""
+        self.bytes_used += size - self.entries.pop(key, 0)
+        self.entries[key] = size
+        self._evict(keep=key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "files": len(self.entries),
+            "bytes": self.bytes_used,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        for key in list(self.entries):
+            self._remove(key)
+        self.hits = self.misses = self.evictions = 0
+
+    def _load(self):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".part"):
+                # Недописанный файл прошлого запуска.
+                os.unlink(path)
+            elif os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self.entries[name] = size
+            self.bytes_used += size
+        self._evict()
+
+    def _evict(self, keep: Optional[str] = None):
+        while self.bytes_used > self.max_bytes and self.entries:
+            key = next(iter(self.entries))
+            if key == keep:
+                if len(self.entries) == 1:
+                    return
+                self.entries.move_to_end(key)
+                continue
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        self.bytes_used -= self.entries.pop(key)
+        try:
+            os.unlink(self.path(key))
+        except OSError:
+            pass
+
+
+class MediaRelay:
+    """
+    Moves files between Telegram and the browser in chunks of `chunk_size`
+    bytes, never holding a whole file in memory. Downloads stream the
+    getFile content to the browser while writing it into the cache (one
+    pass, the file is on disk once the browser got it); uploads stream the
+    spooled file from disk as multipart/form-data to sendPhoto or
+    sendDocument.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        cache: MediaCache,
+        client: httpx.AsyncClient,
+        api_url: str,
+        chunk_size: int = 64 * 1024,
+    ):
+        self.bot = bot
+        self.cache = cache
+        self.client = client
+        self.api_url = api_url
+        self.chunk_size = chunk_size
+        self.downloaded_bytes = 0
+        self.uploaded_bytes = 0
+
+    async def download(self, media: Dict[str, Any]) -> AsyncIterator[bytes]:
+        """
+        Starts a download and returns an iterator of its chunks; errors before
+        the first byte (getFile, HTTP status) are raised here, as MediaError.
+        """
+        try:
+            file = await self.bot.get_file(media["file_id"])
+            response = await self.client.send(
+                self.client.build_request("GET", file.file_path), stream=True
+            )
+        except Exception as e:
+            raise MediaError(f"getFile {media['file_unique_id']}: {e}") from e
+        if response.status_code != 200:
+            await response.aclose()
+            raise MediaError(f"download {media['file_unique_id']}: HTTP {response.status_code}")
+        return self._tee(media, response)
+
+    async def _tee(self, media: Dict[str, Any], response: httpx.Response) -> AsyncIterator[bytes]:
+        # Запись на диск идет в потоках, чтобы медленный диск не задерживал цикл событий.
+        writer = None
+        try:
+            writer = await asyncio.to_thread(self.cache.writer, media["file_unique_id"])
+            async for chunk in response.aiter_bytes(self.chunk_size):
+                await asyncio.to_thread(writer.write, chunk)
+                self.downloaded_bytes += len(chunk)
+                yield chunk
+            size = await asyncio.to_thread(writer.commit)
+            if size is not None:
+                self.cache.put(writer.key, size)
+        finally:
+            # Браузер ушел или Telegram оборвал передачу: недописанный файл не кэшируется.
+            if writer is not None:
+                writer.abort()
+            await response.aclose()
+
+    async def fetch(self, media: Dict[str, Any]) -> str:
+        """Downloads a file into the cache (for Range requests) and returns its path."""
+        path = self.cache.get(media["file_unique_id"])
+        if path:
+            return path
+        async for _ in await self.download(media):
+            pass
+        path = self.cache.get(media["file_unique_id"])
+        if path is None:
+            raise MediaError(f"{media['file_unique_id']} does not fit into the cache")
+        return path
+
+    async def upload(self, chat_id: int, upload: MediaUpload) -> Dict[str, Any]:
+        """
+        Sends a file with sendPhoto or sendDocument and returns the sent
+        message. Bot API errors are raised as the telegram.error types the
+        outbound sender retries on (RetryAfter, NetworkError) or gives up on
+        (BadRequest).
+        """
+        method, field = ("sendPhoto", "photo") if upload.kind == "photo" else ("sendDocument", "document")
+        data = {"chat_id": str(chat_id)}
+        if upload.caption:
+            data["caption"] = upload.caption
+        # При повторной попытке файл читается с начала.
+        upload.file.seek(0)
+        try:
+            response = await self.client.post(
+                f"{self.api_url}/{method}",
+                data=data,
+                files={field: (upload.filename, upload.file, upload.mime or "application/octet-stream")},
+            )
+            result = response.json()
+        except httpx.HTTPError as e:
+            raise NetworkError(f"{method}: {e}") from e
+        except ValueError as e:
+            raise NetworkError(f"{method}: HTTP {response.status_code}, not JSON") from e
+        if not result.get("ok"):
+            description = result.get("description") or f"HTTP {response.status_code}"
+            retry_after = (result.get("parameters") or {}).get("retry_after")
+            if retry_after:
+                raise RetryAfter(retry_after)
+            if response.status_code >= 500:
+                raise NetworkError(description)
+            raise BadRequest(description)
+        self.uploaded_bytes += upload.size
+        sent = result["result"]
+        media = media_from_message(sent)
+        if media and upload.kind == "document":
+            # Документ хранится в Telegram байт в байт — сразу кладем его в кэш.
+            try:
+                size = await asyncio.to_thread(self.cache.store, media["file_unique_id"], upload.file)
+            except OSError as e:
+                logger.warning("[media] Не удалось сохранить файл в кэш: %s", e)
+            else:
+                if size is not None:
+                    self.cache.put(self.cache.key(media["file_unique_id"]), size)
+        return sent
+
+    async def close(self):
+        await self.client.aclose()
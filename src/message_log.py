@@ -0,0 +1,205 @@
+import asyncio
+import glob
+import json
+import marshal
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import logger
+
+# Заголовок записи: LSN, длина полезной нагрузки, CRC32 полезной нагрузки.
+_HEADER = struct.Struct("<QII")
+SNAPSHOT_VERSION = 1
+
+
+class MessageLog:
+    """
+    Append-only, segment-based journal of store mutations with group commit.
+
+    append() only encodes the record into an in-memory buffer; run() flushes
+    the buffer every flush_interval seconds with one write + fsync in a worker
+    thread, so the event loop never waits for the disk. A crash loses at most
+    the last flush_interval of acknowledged writes. Every snapshot_every
+    records a snapshot of the whole state is written and the segments it
+    covers are deleted, so recovery replays only the tail.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 64 * 1024 * 1024,
+        flush_interval: float = 0.05,
+        snapshot_every: int = 100_000,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+        self.lsn = 0  # LSN последней записи
+        self.flushed_lsn = 0
+        self._buffer: List[bytes] = []
+        self._buffer_lsn = 0
+        self._since_snapshot = 0
+        self._file = None
+        self._file_size = 0
+        self._state_source = None
+        self._io_lock = threading.Lock()
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+
+    # --- Запись ---
+
+    def append(self, record: Dict[str, Any]):
+        """Queues a record for the next group commit."""
+        self.lsn += 1
+        payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode()
+        self._buffer.append(
+            _HEADER.pack(self.lsn, len(payload), zlib.crc32(payload)) + payload
+        )
+        self._buffer_lsn = self.lsn
+        self._since_snapshot += 1
+
+    def flush(self):
+        """Writes and fsyncs the buffered records synchronously."""
+        chunk, lsn = self._take_buffer()
+        if chunk:
+            self._write(chunk, lsn)
+
+    async def run(self):
+        """Background group-commit loop; also takes periodic snapshots."""
+        while not self._closed:
+            await asyncio.sleep(self.flush_interval)
+            chunk, lsn = self._take_buffer()
+            if chunk:
+                await asyncio.to_thread(self._write, chunk, lsn)
+            if self._since_snapshot >= self.snapshot_every and self._state_source:
+                await self.snapshot()
+
+    async def close(self):
+        """Flushes everything still buffered and closes the current segment."""
+        self._closed = True
+        chunk, lsn = self._take_buffer()
+        if chunk:
+            await asyncio.to_thread(self._write, chunk, lsn)
+        with self._io_lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _take_buffer(self) -> Tuple[bytes, int]:
+        chunk = b"".join(self._buffer)
+        self._buffer = []
+        return chunk, self._buffer_lsn
+
+    def _write(self, chunk: bytes, lsn: int):
+        with self._io_lock:
+            if self._file is None or self._file_size >= self.segment_bytes:
+                self._roll(self.flushed_lsn + 1)
+            self._file.write(chunk)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file_size += len(chunk)
+            self.flushed_lsn = lsn
+
+    def _roll(self, first_lsn: int):
+        if self._file:
+            self._file.close()
+        path = os.path.join(self.directory, f"segment-{first_lsn:020d}.log")
+        self._file = open(path, "ab")
+        self._file_size = self._file.tell()
+
+    # --- Снимки ---
+
+    def attach(self, state_source):
+        """Sets the object whose export_state()/import_state() back snapshots."""
+        self._state_source = state_source
+
+    async def snapshot(self):
+        """Writes a snapshot of the current state and drops covered segments."""
+        # Снимок состояния и LSN берутся синхронно — между ними нет await.
+        state = self._state_source.export_state()
+        lsn = self.lsn
+        self._since_snapshot = 0
+        chunk, buffered_lsn = self._take_buffer()
+        await asyncio.to_thread(self._write_snapshot, state, lsn, chunk, buffered_lsn)
+
+    def _write_snapshot(self, state, lsn: int, chunk: bytes, buffered_lsn: int):
+        if chunk:
+            self._write(chunk, buffered_lsn)
+        path = os.path.join(self.directory, f"snapshot-{lsn:020d}.snap")
+        with open(path + ".tmp", "wb") as f:
+            marshal.dump((SNAPSHOT_VERSION, lsn, state), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        # Новые записи пойдут в новый сегмент, чтобы старые можно было удалить.
+        with self._io_lock:
+            self._roll(lsn + 1)
+        for old in self._snapshots()[:-1]:
+            os.remove(old)
+        segments = self._segments()
+        for (first, seg_path), (next_first, _) in zip(segments, segments[1:]):
+            if next_first <= lsn + 1:
+                os.remove(seg_path)
+        logger.info(f"Снимок состояния записан: LSN {lsn}")
+
+    # --- Восстановление ---
+
+    def recover(self, apply) -> Optional[Any]:
+        """
+        Restores state: returns the newest snapshot's state (or None) after
+        calling apply(record) for every journaled record newer than it.
+        A torn record at the end of the last segment is truncated.
+        """
+        state = None
+        snapshot_lsn = 0
+        snapshots = self._snapshots()
+        if snapshots:
+            with open(snapshots[-1], "rb") as f:
+                version, snapshot_lsn, state = marshal.load(f)
+            if version != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported snapshot version {version}")
+            if self._state_source:
+                self._state_source.import_state(state)
+        self.lsn = snapshot_lsn
+        replayed = 0
+        for _, path in self._segments():
+            for lsn, record in self._read_segment(path):
+                if lsn > snapshot_lsn:
+                    apply(record)
+                    replayed += 1
+                self.lsn = max(self.lsn, lsn)
+        self.flushed_lsn = self._buffer_lsn = self.lsn
+        logger.info(
+            f"Журнал восстановлен: снимок на LSN {snapshot_lsn}, воспроизведено записей: {replayed}"
+        )
+        return state
+
+    def _read_segment(self, path: str):
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + _HEADER.size <= len(data):
+            lsn, length, crc = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            payload = data[start : start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            yield lsn, json.loads(payload)
+            offset = start + length
+        if offset < len(data):
+            logger.warning(
+                f"Обрезан поврежденный хвост журнала {path} ({len(data) - offset} байт)"
+            )
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+
+    def _segments(self) -> List[Tuple[int, str]]:
+        paths = glob.glob(os.path.join(self.directory, "segment-*.log"))
+        return sorted((int(os.path.basename(p)[8:28]), p) for p in paths)
+
+    def _snapshots(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, "snapshot-*.snap")))
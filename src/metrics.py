@@ -0,0 +1,279 @@
+import functools
+import math
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Границы корзин гистограмм задержки, секунды.
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Metric:
+    """
+    Base of the metric types. A metric with `labelnames` is a family: values
+    are recorded on children returned by labels(), which should be looked up
+    once and kept by the caller, not on every event.
+
+    Updates take no lock: every worker records from its single event loop.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], "Metric"] = {}
+
+    def labels(self, *values: Any) -> "Metric":
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self) -> "Metric":
+        raise NotImplementedError
+
+    def _own_samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+    def samples(self) -> Iterator[Sample]:
+        if not self.labelnames:
+            yield from self._own_samples()
+            return
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            for suffix, extra, value in child._own_samples():
+                yield suffix, {**labels, **extra}, value
+
+
+class Counter(Metric):
+    """Monotonic counter. With `function`, the value is read at scrape time."""
+
+    type = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], Any]] = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self.value = 0.0
+        self.function = function
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def _new_child(self) -> "Counter":
+        return Counter(self.name, self.help)
+
+    def _own_samples(self) -> Iterator[Sample]:
+        yield "_total", {}, self.function() if self.function else self.value
+
+    def samples(self) -> Iterator[Sample]:
+        if self.function and self.labelnames:
+            yield from _function_samples(self, "_total")
+        else:
+            yield from super().samples()
+
+
+class Gauge(Metric):
+    """
+    Value that goes up and down. With `function`, the value is read at
+    scrape time; for a labelled gauge the function returns a mapping from
+    the label value (a tuple for several labels) to the value.
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], Any]] = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self.value = 0.0
+        self.function = function
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def _new_child(self) -> "Gauge":
+        return Gauge(self.name, self.help)
+
+    def _own_samples(self) -> Iterator[Sample]:
+        yield "", {}, self.function() if self.function else self.value
+
+    def samples(self) -> Iterator[Sample]:
+        if self.function and self.labelnames:
+            yield from _function_samples(self, "")
+        else:
+            yield from super().samples()
+
+
+def _function_samples(metric: Metric, suffix: str) -> Iterator[Sample]:
+    for key, value in metric.function().items():
+        key = key if isinstance(key, tuple) else (key,)
+        yield suffix, dict(zip(metric.labelnames, map(str, key))), value
+
+
+class Histogram(Metric):
+    """
+    Fixed-bucket histogram. observe() is a bisect over the bucket bounds and
+    two additions; cumulative counts are only computed at scrape time.
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def _new_child(self) -> "Histogram":
+        return Histogram(self.name, self.help, buckets=self.bounds)
+
+    def _own_samples(self) -> Iterator[Sample]:
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += count
+            yield "_bucket", {"le": _format_value(bound)}, cumulative
+        yield "_sum", {}, self.sum
+        yield "_count", {}, cumulative
+
+
+class MetricsRegistry:
+    """Metrics of one worker rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str):
+        self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(
+                    f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+def timed(histogram: Histogram):
+    """Decorator recording the run time of a coroutine function in `histogram`."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+registry = MetricsRegistry()
+
+# --- Метрики горячего пути ---
+update_handler_seconds = registry.register(
+    Histogram(
+        "webbridge_update_handler_seconds",
+        "Time spent in a Telegram update handler.",
+        ["handler"],
+    )
+)
+ws_broadcast_seconds = registry.register(
+    Histogram(
+        "webbridge_ws_broadcast_seconds",
+        "Time to queue a message frame for every websocket of a chat.",
+    )
+)
+ws_send_seconds = registry.register(
+    Histogram(
+        "webbridge_ws_send_seconds",
+        "Time to write one frame to a websocket.",
+    )
+)
+web_send_seconds = registry.register(
+    Histogram(
+        "webbridge_web_send_seconds",
+        "Time to handle a message sent from the web UI, up to the response.",
+        ["route"],
+    )
+)
+telegram_delivery_seconds = registry.register(
+    Histogram(
+        "webbridge_telegram_delivery_seconds",
+        "Time from queueing a web message to Telegram accepting it.",
+    )
+)
+event_loop_lag_seconds = registry.register(
+    Histogram(
+        "webbridge_event_loop_lag_seconds",
+        "How late the event loop woke up a sleeping probe task.",
+    )
+)
+
@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+def gcra(
+    tat: Optional[float], now: float, interval: float, tolerance: float
+) -> Tuple[Optional[float], float]:
+    """
+    Generic cell rate algorithm: one float of state per key (the theoretical
+    arrival time). A request is allowed if it does not come earlier than
+    `tolerance` before the TAT. Returns the new TAT (None if denied) and
+    the seconds to wait before retrying (0 if allowed).
+    """
+    tat = now if tat is None or tat < now else tat
+    allow_at = tat - tolerance
+    if now < allow_at:
+        return None, allow_at - now
+    return tat + interval, 0.0
+
+
+def gcra_params(rate_per_minute: float, burst: int) -> Tuple[float, float]:
+    """(interval, tolerance) for `rate_per_minute` requests with bursts of up to `burst`."""
+    interval = 60.0 / rate_per_minute
+    return interval, interval * (max(1, burst) - 1)
+
+
+class GCRATable:
+    """GCRA state of many keys with LRU eviction: memory stays bounded by `max_keys`."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    def hit(
+        self, key: str, now: float, interval: float, tolerance: float, consume: bool = True
+    ) -> float:
+        tat = self._tats.get(key)
+        new_tat, retry_after = gcra(tat, now, interval, tolerance)
+        if new_tat is not None and consume:
+            self._tats[key] = new_tat
+            self._tats.move_to_end(key)
+            if len(self._tats) > self.max_keys:
+                self._tats.popitem(last=False)
+        return retry_after
+
+    def clear(self):
+        self._tats.clear()
+
+
+class LoginLimiter:
+    """
+    Throttles /login: every attempt spends a token of the client address,
+    every failed attempt a token of the username, so neither a botnet
+    guessing codes for one user nor one client spraying many users gets
+    far. Buckets live in the state backend (shared between workers for
+    sqlite). Denials are also remembered locally, so while a key is blocked
+    repeated attempts are rejected without touching the backend.
+    """
+
+    def __init__(
+        self,
+        backend,
+        ip_rate: float,
+        ip_burst: int,
+        user_rate: float,
+        user_burst: int,
+        max_keys: int = 100_000,
+    ):
+        self.backend = backend
+        self.ip_params = gcra_params(ip_rate, ip_burst)
+        self.user_params = gcra_params(user_rate, user_burst)
+        self.max_keys = max_keys
+        self._blocked: "OrderedDict[str, float]" = OrderedDict()
+
+    def check(self, ip: str, username: str, now: Optional[float] = None) -> float:
+        """
+        Called before an attempt is processed. Returns 0 if it may proceed
+        (spending a token of `ip`), else the seconds to wait.
+        """
+        now = time.time() if now is None else now
+        ip_key, user_key = f"ip:{ip}", f"user:{username.lower()}"
+        for key in (ip_key, user_key):
+            blocked_until = self._blocked.get(key)
+            if blocked_until is not None:
+                if blocked_until > now:
+                    return blocked_until - now
+                del self._blocked[key]
+        retry_after = self.backend.rate_limit(user_key, now, *self.user_params, consume=False)
+        if retry_after:
+            return self._block(user_key, now, retry_after)
+        retry_after = self.backend.rate_limit(ip_key, now, *self.ip_params)
+        if retry_after:
+            return self._block(ip_key, now, retry_after)
+        return 0.0
+
+    def failed(self, username: str, now: Optional[float] = None):
+        """Spends a token of the username after a failed attempt."""
+        now = time.time() if now is None else now
+        self.backend.rate_limit(f"user:{username.lower()}", now, *self.user_params)
+
+    def _block(self, key: str, now: float, retry_after: float) -> float:
+        self._blocked[key] = now + retry_after
+        self._blocked.move_to_end(key)
+        if len(self._blocked) > self.max_keys:
+            self._blocked.popitem(last=False)
+        return retry_after
+
+    def clear(self):
+        self._blocked.clear()
@@ -0,0 +1,60 @@
+import hmac
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+
+from src.bot.core import drain_connections
+from src.config import ADMIN_TOKEN, DRAIN_TIMEOUT, PROFILE_MAX_SECONDS, logger
+from src.data_store import connections
+from src.lifecycle import lifecycle
+from src.loop_monitor import loop_monitor
+
+router = APIRouter(prefix="/admin", tags=["Admin"], include_in_schema=False)
+
+
+def require_admin(request: Request):
+    """Checks the `Authorization: Bearer <ADMIN_TOKEN>` header; without ADMIN_TOKEN the routes do not exist."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    token = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        logger.warning("Admin: отклонен запрос с неверным токеном.")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+
+@router.get("/loop", dependencies=[Depends(require_admin)])
+async def loop_state():
+    """Event-loop lag and the stacks of recent loop blockings."""
+    return loop_monitor.snapshot()
+
+
+@router.get("/profile", dependencies=[Depends(require_admin)])
+async def capture_profile(seconds: float = 5.0, mode: str = "sample"):
+    """
+    Profiles this worker's event loop for `seconds`. mode=sample returns
+    folded stacks (input for flamegraph.pl / speedscope), mode=cprofile
+    returns cProfile statistics.
+    """
+    if mode not in ("sample", "cprofile"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown mode")
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+    logger.info("Admin: профилирование цикла событий (%s, %.1f с).", mode, seconds)
+    try:
+        report = await loop_monitor.profile(seconds, mode)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return PlainTextResponse(report)
+
+
+@router.post("/drain", dependencies=[Depends(require_admin)])
+async def drain():
+    """
+    Takes this worker out of rotation before a deploy: /health turns 503,
+    new logins and websockets are refused, and open websockets are closed
+    with 1012 so the pages reconnect to other workers. Irreversible until
+    the worker restarts.
+    """
+    logger.info("Admin: запрошен дренаж воркера.")
+    total = connections.count()
+    stuck = await drain_connections(DRAIN_TIMEOUT)
+    return {"draining": lifecycle.draining, "closed": total - stuck, "pending": stuck}
@@ -1,3 +1,7 @@
+import hmac
+import math
+from typing import Optional
+
 from fastapi import (
     APIRouter,
     Request,
@@ -6,20 +10,33 @@ from fastapi import (
     HTTPException,
     status,
 )
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
 
-from src.config import logger, TEMPLATES_DIR
-from src.data_store import get_chat_id_by_code, get_chat_data
+from src.config import logger
+from src.lifecycle import lifecycle
+from src.data_store import get_chat_id_by_code, get_chat_data, login_limiter, touch_chat
+from src.metrics import Counter, registry
+from src.templating import page_cache
 
-templates = Jinja2Templates(directory=TEMPLATES_DIR)
 router = APIRouter()
 
+login_attempts = registry.register(
+    Counter("webbridge_login_attempts", "Login attempts by outcome.", ["outcome"])
+)
+login_succeeded = login_attempts.labels("success")
+login_failed = login_attempts.labels("failure")
+login_limited = login_attempts.labels("limited")
+
+
+def _same(stored: Optional[str], given: str) -> bool:
+    """Constant-time comparison, so response time does not tell how much of a secret matched."""
+    return stored is not None and hmac.compare_digest(stored.encode(), given.encode())
+
 
 @router.get("/", response_class=HTMLResponse, tags=["Auth"])
 async def get_login_page(request: Request):
-    """Serves the login page."""
-    return templates.TemplateResponse(request=request, name="login.html")
+    """Serves the login page (rendered once, see PageCache)."""
+    return page_cache.response(request, "login.html")
 
 
 @router.post("/login", tags=["Auth"])
@@ -27,7 +44,26 @@ async def login(
     request: Request, username: str = Form(...), access_code: str = Form(...)
 ):
     """Handles the login form submission."""
+    if lifecycle.draining:
+        # Воркер останавливается: балансировщик отправит повтор на другой воркер.
+        return PlainTextResponse(
+            "Сервер перезапускается. Повторите вход через несколько секунд.",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
     clean_username = username.strip().lstrip("@")
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = login_limiter.check(client_ip, clean_username)
+    if retry_after:
+        # Дешевый ответ без шаблона: под перебором страница не рендерится.
+        login_limited.inc()
+        logger.debug("Вход ограничен: %s, username='%s'.", client_ip, clean_username)
+        return PlainTextResponse(
+            "Слишком много попыток входа. Повторите позже.",
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
     chat_id = get_chat_id_by_code(access_code)
 
     error_message = None
@@ -37,34 +73,39 @@ async def login(
         chat_info = get_chat_data(chat_id)
         if (
             chat_info
-            and chat_info.get("access_code") == access_code
-            and chat_info.get("username") == clean_username
+            and _same(chat_info.get("access_code"), access_code)
+            and _same(chat_info.get("username"), clean_username)
         ):
             logger.info(f"Успешный вход для @{clean_username} (chat_id: {chat_id})")
             request.session["chat_id"] = chat_id
             request.session["username"] = clean_username
+            touch_chat(chat_id)
             login_success = True
         else:
             logger.warning(
-                f"Неудачная попытка входа (данные не совпали): username='{clean_username}', code='{access_code}', chat_id={chat_id}, stored_user={chat_info.get('username') if chat_info else 'N/A'}, stored_code={chat_info.get('access_code') if chat_info else 'N/A'}"
+                "Неудачная попытка входа (данные не совпали): username='%s', chat_id=%s, адрес %s",
+                clean_username,
+                chat_id,
+                client_ip,
             )
             error_message = (
                 "Имя пользователя или код доступа не совпадают с активной сессией."
             )
     else:
         logger.warning(
-            f"Неудачная попытка входа (код не найден): username='{clean_username}', code='{access_code}'"
+            "Неудачная попытка входа (код не найден): username='%s', адрес %s",
+            clean_username,
+            client_ip,
         )
         error_message = "Неверный код доступа."
 
     if login_success:
+        login_succeeded.inc()
         return RedirectResponse(url="/chat", status_code=status.HTTP_303_SEE_OTHER)
     else:
-        return templates.TemplateResponse(
-            request=request,
-            name="login.html",
-            context={"error": error_message},
-        )
+        login_failed.inc()
+        login_limiter.failed(clean_username)
+        return page_cache.response(request, "login.html", {"error": error_message})
 
 
 @router.get("/logout", tags=["Auth"])
@@ -1,3 +1,5 @@
+from urllib.parse import quote
+
 from fastapi import (
     APIRouter,
     Request,
@@ -6,14 +8,15 @@ from fastapi import (
     HTTPException,  # Оставляем, так как может быть использован в будущем
     status,
 )
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from pydantic import BaseModel
 
-from src.config import logger, TEMPLATES_DIR
-from src.data_store import get_chat_data, get_messages
-from src.bot.core import telegram_bot, add_message
+from src.config import logger, CHAT_PAGE_SIZE, HISTORY_PAGE_MAX, SEARCH_PAGE_SIZE
+from src.data_store import get_chat_data, get_messages_page, search_messages
+from src.bot.core import queue_web_message
+from src.metrics import timed, web_send_seconds
+from src.templating import templates
 
-templates = Jinja2Templates(directory=TEMPLATES_DIR)
 router = APIRouter(tags=["Chat"])
 
 
@@ -45,6 +48,13 @@ async def get_current_chat_session(
     return {"chat_id": chat_id, "username": request.session["username"]}
 
 
+def load_history_page(chat_id: int, before: int | None, limit: int) -> tuple[list, bool]:
+    """Loads one keyset page and tells whether older messages exist."""
+    messages = get_messages_page(chat_id, before, limit + 1)
+    has_more = len(messages) > limit
+    return (messages[1:] if has_more else messages), has_more
+
+
 @router.get("/chat", response_class=HTMLResponse)
 async def get_chat_page(
     request: Request,
@@ -56,54 +66,115 @@ async def get_chat_page(
 
     chat_id = session_data["chat_id"]
     username = session_data["username"]
-    messages = get_messages(chat_id)
+    # Отрисовываем только последние сообщения, более старые подгружаются через /api/history.
+    messages, has_more = load_history_page(chat_id, None, CHAT_PAGE_SIZE)
 
     context = {
         "chat_id": chat_id,
         "username": username,
         "messages": messages,
+        "has_more": has_more,
+        "page_size": CHAT_PAGE_SIZE,
     }
     return templates.TemplateResponse(
         request=request, name="chat.html", context=context
     )
 
 
-@router.post("/send_message")
-async def send_message_from_web(
-    request: Request,
-    message: str = Form(...),
+@router.get("/api/history")
+async def get_history(
+    before: int | None = None,
+    limit: int = CHAT_PAGE_SIZE,
     session_data: dict | RedirectResponse = Depends(get_current_chat_session),
 ):
-    """Handles sending a message from the web interface to Telegram."""
+    """Returns a page of messages older than `before` (keyset pagination by seq)."""
     if isinstance(session_data, RedirectResponse):
-        return session_data
+        return JSONResponse(
+            {"detail": "Not authenticated"}, status_code=status.HTTP_401_UNAUTHORIZED
+        )
+
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    messages, has_more = load_history_page(session_data["chat_id"], before, limit)
+    return {
+        "messages": messages,
+        "has_more": has_more,
+        "next_before": messages[0]["seq"] if messages and has_more else None,
+    }
+
+
+@router.get("/api/search")
+async def search_history(
+    q: str,
+    before: int | None = None,
+    limit: int = SEARCH_PAGE_SIZE,
+    session_data: dict | RedirectResponse = Depends(get_current_chat_session),
+):
+    """
+    Finds messages of the session's chat containing every word of `q`, newest
+    first; `before` is the `next_before` seq of the previous page.
+    """
+    if isinstance(session_data, RedirectResponse):
+        return JSONResponse(
+            {"detail": "Not authenticated"}, status_code=status.HTTP_401_UNAUTHORIZED
+        )
 
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
     chat_id = session_data["chat_id"]
+    found = await search_messages(q, chat_id, limit, None if before is None else (chat_id, before))
+    return {
+        "messages": [hit["message"] for hit in found["results"]],
+        # seq сообщения, на котором остановился поиск (сама выдача может быть короче limit).
+        "next_before": found["next_before"][1] if found["next_before"] else None,
+    }
 
-    if not message or not message.strip():
-        return RedirectResponse(
-            url="/chat?error=empty_message", status_code=status.HTTP_303_SEE_OTHER
+
+class OutgoingMessage(BaseModel):
+    text: str
+    client_id: str | None = None
+
+
+@router.post("/api/messages", status_code=status.HTTP_202_ACCEPTED)
+@timed(web_send_seconds.labels("/api/messages"))
+async def post_message(
+    payload: OutgoingMessage,
+    session_data: dict | RedirectResponse = Depends(get_current_chat_session),
+):
+    """
+    Queues a message for Telegram without re-rendering the page. Delivery is
+    reported over the WebSocket; the same can be done by sending
+    {"type": "send", ...} over the socket itself.
+    """
+    if isinstance(session_data, RedirectResponse):
+        return JSONResponse(
+            {"detail": "Not authenticated"}, status_code=status.HTTP_401_UNAUTHORIZED
         )
 
-    try:
-        logger.info(
-            f"Отправка сообщения от админа в chat_id {chat_id}: {message[:50]}..."
+    error = queue_web_message(session_data["chat_id"], payload.text, payload.client_id)
+    if error:
+        return JSONResponse(
+            {"client_id": payload.client_id, "status": "rejected", "error": error},
+            status_code=status.HTTP_400_BAD_REQUEST,
         )
-        await telegram_bot.send_message(chat_id=chat_id, text=message)
-        await add_message(chat_id, "admin", message)
+    return {"client_id": payload.client_id, "status": "queued"}
 
-        return RedirectResponse(url="/chat", status_code=status.HTTP_303_SEE_OTHER)
 
-    except Exception as e:
-        logger.error(f"Ошибка отправки сообщения в Telegram для chat_id {chat_id}: {e}")
-        error_detail = f"Не удалось отправить сообщение: {e}"
-        # По умолчанию возвращаем RedirectResponse с ошибкой
+@router.post("/send_message")
+@timed(web_send_seconds.labels("/send_message"))
+async def send_message_from_web(
+    request: Request,
+    message: str = Form(...),
+    session_data: dict | RedirectResponse = Depends(get_current_chat_session),
+):
+    """
+    Form fallback for browsers without JavaScript: queues the message and
+    redirects back to the chat.
+    """
+    if isinstance(session_data, RedirectResponse):
+        return session_data
+
+    error = queue_web_message(session_data["chat_id"], message)
+    if error:
         return RedirectResponse(
-            url=f"/chat?error={error_detail}", status_code=status.HTTP_303_SEE_OTHER
+            url=f"/chat?error={quote(error)}", status_code=status.HTTP_303_SEE_OTHER
         )
-        # Если вы предпочитаете HTTPException, раскомментируйте следующую строку
-        # и закомментируйте RedirectResponse выше:
-        # raise HTTPException(
-        #     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        #     detail=error_detail,
-        # )
+    return RedirectResponse(url="/chat", status_code=status.HTTP_303_SEE_OTHER)
@@ -0,0 +1,187 @@
+from urllib.parse import quote
+
+from fastapi import APIRouter, Request, status
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from src.bot.core import media_cache, media_relay, queue_web_media
+from src.config import MAX_CAPTION_LENGTH, MEDIA_UPLOAD_MAX_MB, logger
+from src.data_store import get_chat_data, get_messages_after
+from src.media import MediaError, MediaUpload, is_inline, media_filename, upload_kind
+from src.routes.operator import is_operator, require_enabled
+
+router = APIRouter(tags=["Media"])
+
+MEDIA_UPLOAD_MAX_BYTES = int(MEDIA_UPLOAD_MAX_MB * 1024 * 1024)
+# Запас на заголовки частей и поля формы сверх размера самого файла.
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def session_chat_id(request: Request) -> int | None:
+    """chat_id of the browser session if its Telegram session is still active."""
+    chat_id = request.session.get("chat_id")
+    if not chat_id:
+        return None
+    chat_info = get_chat_data(chat_id)
+    return chat_id if chat_info and chat_info.get("access_code") else None
+
+
+def not_authenticated() -> JSONResponse:
+    return JSONResponse({"detail": "Not authenticated"}, status_code=status.HTTP_401_UNAUTHORIZED)
+
+
+def media_headers(media: dict) -> dict:
+    """Files come from users: only images, audio and video are shown inline, nothing runs."""
+    disposition = "inline" if is_inline(media.get("mime")) else "attachment"
+    return {
+        "Content-Disposition": f"{disposition}; filename*=utf-8''{quote(media_filename(media))}",
+        "Cache-Control": "private, max-age=86400",
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": "sandbox",
+    }
+
+
+@router.get("/media/{chat_id}/{seq}")
+async def get_media(request: Request, chat_id: int, seq: int):
+    """
+    The file of a stored message, for the chat's own session or an operator.
+    A cached file is served from disk with Range support; otherwise the
+    getFile content is streamed through in chunks and cached on the way.
+    """
+    if session_chat_id(request) != chat_id and not is_operator(request.session):
+        return not_authenticated()
+    found = get_messages_after(chat_id, seq - 1, 1)
+    if not found or found[0]["seq"] != seq or "media" not in found[0]:
+        return JSONResponse({"detail": "Not found"}, status_code=status.HTTP_404_NOT_FOUND)
+    media = found[0]["media"]
+    media_type = media.get("mime") or "application/octet-stream"
+    headers = media_headers(media)
+    try:
+        path = media_cache.get(media["file_unique_id"])
+        if path is None and "range" in request.headers and media_cache.fits(media.get("size")):
+            # Запрос части файла (перемотка аудио и видео) — сначала докачиваем файл в кэш.
+            path = await media_relay.fetch(media)
+        if path is not None:
+            return FileResponse(path, media_type=media_type, headers=headers)
+        chunks = await media_relay.download(media)
+    except MediaError as e:
+        logger.warning("[media] Не удалось получить файл из Telegram (chat_id %s): %s", chat_id, e)
+        return JSONResponse(
+            {"detail": "File is not available"}, status_code=status.HTTP_502_BAD_GATEWAY
+        )
+    if media.get("size"):
+        headers["Content-Length"] = str(media["size"])
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+
+async def limited_stream(request: Request, limit: int):
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise UploadTooLarge()
+        yield chunk
+
+
+async def read_upload(request: Request) -> tuple[MediaUpload | None, str | None, JSONResponse | None]:
+    """
+    Parses a multipart form with `file`, optional `caption` and `client_id`.
+    The file is spooled to disk as it arrives and stays open after the
+    response: the outbound queue sends and closes it later.
+    """
+    limit = MEDIA_UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES
+    too_large = JSONResponse(
+        {"status": "rejected", "error": f"Файл больше {MEDIA_UPLOAD_MAX_MB:g} МБ"},
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    )
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > limit:
+        return None, None, too_large
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        return None, None, JSONResponse(
+            {"status": "rejected", "error": "Ожидается multipart/form-data"},
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    parser = MultiPartParser(
+        request.headers,
+        limited_stream(request, limit),
+        max_files=1,
+        max_fields=2,
+        max_part_size=MAX_CAPTION_LENGTH * 4,
+    )
+    try:
+        form = await parser.parse()
+    except UploadTooLarge:
+        return None, None, too_large
+    except MultiPartException as e:
+        return None, None, JSONResponse(
+            {"status": "rejected", "error": e.message}, status_code=status.HTTP_400_BAD_REQUEST
+        )
+    client_id = form.get("client_id")
+    client_id = client_id if isinstance(client_id, str) else None
+    file = form.get("file")
+    if not isinstance(file, UploadFile):
+        await form.close()
+        return None, client_id, JSONResponse(
+            {"client_id": client_id, "status": "rejected", "error": "Нет файла"},
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    caption = form.get("caption")
+    size = file.size or 0
+    upload = MediaUpload(
+        upload_kind(file.content_type, size),
+        file.filename or "file",
+        file.content_type,
+        file.file,
+        caption if isinstance(caption, str) else "",
+        size,
+    )
+    return upload, client_id, None
+
+
+async def queue_upload(request: Request, chat_id: int) -> JSONResponse:
+    upload, client_id, error_response = await read_upload(request)
+    if error_response:
+        return error_response
+    error = queue_web_media(chat_id, upload, client_id)
+    if error:
+        return JSONResponse(
+            {"client_id": client_id, "status": "rejected", "error": error},
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    return JSONResponse(
+        {"client_id": client_id, "status": "queued"}, status_code=status.HTTP_202_ACCEPTED
+    )
+
+
+@router.post("/api/media", status_code=status.HTTP_202_ACCEPTED)
+async def post_media(request: Request):
+    """
+    Queues a file for the session's chat (multipart: file, caption,
+    client_id). Delivery is reported over the WebSocket, as for /api/messages.
+    """
+    chat_id = session_chat_id(request)
+    if chat_id is None:
+        return not_authenticated()
+    return await queue_upload(request, chat_id)
+
+
+@router.post(
+    "/api/operator/chats/{chat_id}/media",
+    status_code=status.HTTP_202_ACCEPTED,
+    include_in_schema=False,
+)
+async def post_operator_media(request: Request, chat_id: int):
+    """Queues a file from the operator to any active chat."""
+    require_enabled()
+    if not is_operator(request.session):
+        return not_authenticated()
+    chat_info = get_chat_data(chat_id)
+    if not (chat_info and chat_info.get("access_code")):
+        return JSONResponse({"detail": "Not found"}, status_code=status.HTTP_404_NOT_FOUND)
+    return await queue_upload(request, chat_id)
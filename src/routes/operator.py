@@ -0,0 +1,216 @@
+import hmac
+import json
+import math
+
+from fastapi import (
+    APIRouter,
+    Form,
+    HTTPException,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse
+
+from src.bot.core import queue_web_message
+from src.config import (
+    HISTORY_PAGE_MAX,
+    INBOX_PAGE_SIZE,
+    OPERATOR_TOKEN,
+    SEARCH_PAGE_SIZE,
+    logger,
+)
+from src.data_store import (
+    get_chat_data,
+    login_limiter,
+    mark_chat_read,
+    operators,
+    search_messages,
+)
+from src.lifecycle import lifecycle
+from src.routes.chat import load_history_page
+from src.search import decode_cursor, encode_cursor
+from src.templating import page_cache, templates
+
+router = APIRouter(tags=["Operator"], include_in_schema=False)
+
+
+def operator_limit_key(client_ip: str) -> str:
+    """
+    Login limiter key for the operator token. Failures are counted per
+    address: with one shared key anyone could lock every operator out by
+    sending wrong tokens. Telegram usernames have no '#', so it never
+    collides with a user's key.
+    """
+    return f"#operator@{client_ip}"
+
+
+def require_enabled():
+    """Without OPERATOR_TOKEN the operator routes do not exist."""
+    if not OPERATOR_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+
+def is_operator(session: dict) -> bool:
+    return bool(OPERATOR_TOKEN) and session.get("operator") is True
+
+
+@router.get("/operator", response_class=HTMLResponse)
+async def get_operator_page(request: Request):
+    """The inbox of all active chats, or the operator login form."""
+    require_enabled()
+    if not is_operator(request.session):
+        return page_cache.response(request, "operator_login.html")
+    return templates.TemplateResponse(
+        request=request, name="operator.html", context={"page_size": INBOX_PAGE_SIZE}
+    )
+
+
+@router.post("/operator/login")
+async def operator_login(request: Request, token: str = Form(...)):
+    """Checks the operator token and marks the browser session as an operator one."""
+    require_enabled()
+    if lifecycle.draining:
+        return PlainTextResponse(
+            "Сервер перезапускается. Повторите вход через несколько секунд.",
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+    client_ip = request.client.host if request.client else "unknown"
+    limit_key = operator_limit_key(client_ip)
+    retry_after = login_limiter.check(client_ip, limit_key)
+    if retry_after:
+        return PlainTextResponse(
+            "Слишком много попыток входа. Повторите позже.",
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    if not hmac.compare_digest(token.encode(), OPERATOR_TOKEN.encode()):
+        logger.warning("Оператор: неверный токен, адрес %s.", client_ip)
+        login_limiter.failed(limit_key)
+        return page_cache.response(
+            request, "operator_login.html", {"error": "Неверный токен оператора."}
+        )
+    logger.info("Оператор вошел в панель (адрес %s).", client_ip)
+    request.session["operator"] = True
+    return RedirectResponse(url="/operator", status_code=status.HTTP_303_SEE_OTHER)
+
+
+@router.get("/operator/logout")
+async def operator_logout(request: Request):
+    request.session.pop("operator", None)
+    return RedirectResponse(url="/operator", status_code=status.HTTP_303_SEE_OTHER)
+
+
+@router.get("/api/operator/chats/{chat_id}/messages")
+async def get_chat_messages(
+    request: Request, chat_id: int, before: int | None = None, limit: int = INBOX_PAGE_SIZE
+):
+    """A history page of any chat for the operator (keyset pagination by seq, as /api/history)."""
+    require_enabled()
+    if not is_operator(request.session):
+        return JSONResponse(
+            {"detail": "Not authenticated"}, status_code=status.HTTP_401_UNAUTHORIZED
+        )
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    messages, has_more = load_history_page(chat_id, before, limit)
+    return {
+        "messages": messages,
+        "has_more": has_more,
+        "next_before": messages[0]["seq"] if messages and has_more else None,
+    }
+
+
+@router.get("/api/operator/search")
+async def search_chats(
+    request: Request,
+    q: str,
+    chat_id: int | None = None,
+    before: str | None = None,
+    limit: int = SEARCH_PAGE_SIZE,
+):
+    """
+    Finds messages containing every word of `q` across all chats (or in
+    `chat_id`), newest first. `before` is the opaque `next_before` of the
+    previous page.
+    """
+    require_enabled()
+    if not is_operator(request.session):
+        return JSONResponse(
+            {"detail": "Not authenticated"}, status_code=status.HTTP_401_UNAUTHORIZED
+        )
+    limit = max(1, min(limit, HISTORY_PAGE_MAX))
+    try:
+        cursor = None if before is None else decode_cursor(before)
+    except ValueError:
+        return JSONResponse({"detail": "Bad cursor"}, status_code=status.HTTP_400_BAD_REQUEST)
+    found = await search_messages(q, chat_id, limit, cursor)
+    next_before = found["next_before"]
+    return dict(found, next_before=encode_cursor(next_before) if next_before else None)
+
+
+def handle_operator_frame(websocket: WebSocket, data: str):
+    """
+    Handles a frame from the operator page:
+    {"type": "watch", "chat_ids"} - chats whose messages the socket receives;
+    {"type": "read", "chat_id", "seq"} - marks the chat read up to seq;
+    {"type": "send", "chat_id", "client_id", "text"} - replies to the chat,
+    acked right away, delivery reported to the chat's watchers;
+    {"type": "page", "offset", "limit"} - another page of the chat list.
+    """
+    try:
+        frame = json.loads(data)
+    except ValueError:
+        frame = None
+    if not isinstance(frame, dict):
+        return
+    kind = frame.get("type")
+    try:
+        if kind == "watch":
+            operators.watch(websocket, [int(chat_id) for chat_id in frame.get("chat_ids", [])])
+        elif kind == "read":
+            mark_chat_read(int(frame["chat_id"]), int(frame["seq"]))
+        elif kind == "send":
+            chat_id, client_id, text = int(frame["chat_id"]), frame.get("client_id"), frame.get("text")
+            chat_info = get_chat_data(chat_id)
+            if not chat_info or not chat_info.get("access_code"):
+                error = "Чат не найден или сессия завершена"
+            else:
+                error = queue_web_message(chat_id, text if isinstance(text, str) else "", client_id)
+            ack = {"type": "ack", "chat_id": chat_id, "client_id": client_id, "status": "queued"}
+            if error:
+                ack.update(status="rejected", error=error)
+            operators.send(websocket, ack)
+        elif kind == "page":
+            limit = max(1, min(int(frame.get("limit", INBOX_PAGE_SIZE)), HISTORY_PAGE_MAX))
+            operators.send(websocket, operators.snapshot(max(0, int(frame.get("offset", 0))), limit))
+    except (KeyError, TypeError, ValueError):
+        logger.debug("Оператор: некорректный кадр %.200s (игнорируется)", data)
+
+
+@router.websocket("/operator/ws")
+async def operator_websocket(websocket: WebSocket):
+    """
+    One socket per operator tab: the inbox snapshot first, then changes of
+    the chat list and the messages of the watched chats.
+    """
+    if not is_operator(websocket.session):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Not an operator")
+        return
+    if lifecycle.draining:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Server draining")
+        return
+    await websocket.accept()
+    operators.attach(websocket)
+    logger.info("Оператор: открыт сокет панели.")
+    try:
+        while True:
+            handle_operator_frame(websocket, await websocket.receive_text())
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Оператор: неожиданная ошибка сокета: {e}", exc_info=True)
+    finally:
+        operators.detach(websocket)
+        logger.info("Оператор: сокет панели закрыт.")
@@ -0,0 +1,41 @@
+import asyncio
+import hmac
+
+from fastapi import APIRouter, Request, Response, status
+from telegram import Update
+
+from src.config import logger, BOT_UPDATE_MODE, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN
+from src.bot.core import application
+
+router = APIRouter(tags=["Telegram"])
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+@router.post(WEBHOOK_PATH, include_in_schema=False)
+async def telegram_webhook(request: Request):
+    """Accepts updates pushed by Telegram and queues them for the Application."""
+    if BOT_UPDATE_MODE != "webhook":
+        return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+    secret = request.headers.get(SECRET_HEADER, "")
+    if not hmac.compare_digest(secret.encode(), WEBHOOK_SECRET_TOKEN.encode()):
+        logger.warning("Webhook: отклонен запрос с неверным секретным токеном.")
+        return Response(status_code=status.HTTP_403_FORBIDDEN)
+
+    try:
+        data = await request.json()
+        update = Update.de_json(data, application.bot)
+    except Exception as e:
+        logger.warning(f"Webhook: не удалось разобрать обновление: {e}")
+        return Response(status_code=status.HTTP_400_BAD_REQUEST)
+
+    # Обработка идет в фоне, как и при long polling. Если очередь заполнена,
+    # Telegram получает 503 и повторит доставку позже: так ожидающие обновления
+    # не копятся в памяти без ограничения.
+    try:
+        application.update_queue.put_nowait(update)
+    except asyncio.QueueFull:
+        logger.warning("Webhook: очередь обновлений заполнена, Telegram повторит доставку.")
+        return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response(status_code=status.HTTP_200_OK)
@@ -1,3 +1,7 @@
+import json
+import time
+from typing import Optional
+
 from fastapi import (
     APIRouter,
     WebSocket,
@@ -8,21 +12,29 @@ from fastapi import (
     Request,
 )
 
-from src.config import logger
+from src.config import WS_RESUME_MAX, logger
+from src.bot.core import queue_web_message
+from src.connections import RELOAD_PAYLOAD
+from src.lifecycle import lifecycle
+from src.metrics import web_send_seconds
 from src.data_store import (
+    connections,
     add_active_websocket,
     remove_active_websocket,
     get_chat_data,
+    get_messages_after,
+    touch_chat,
 )
 
 router = APIRouter(prefix="/ws", tags=["WebSocket"])
+ws_send_latency = web_send_seconds.labels("/ws")
 
 
 async def validate_websocket_session(websocket: WebSocket, client_chat_id: int) -> int:
     """
     Validates the WebSocket connection against the browser session
     and server-side chat data. Returns the validated chat_id.
-    Relies on SessionMiddleware being active.
+    Relies on ServerSessionMiddleware being active.
     """
     try:
         session_chat_id = websocket.session.get("chat_id")
@@ -54,7 +66,7 @@ async def validate_websocket_session(websocket: WebSocket, client_chat_id: int)
 
     except AttributeError as e:
         logger.error(
-            f"WebSocket: Ошибка доступа к websocket.session: {e}. Убедитесь, что SessionMiddleware настроена правильно.",
+            f"WebSocket: Ошибка доступа к websocket.session: {e}. Убедитесь, что ServerSessionMiddleware настроена правильно.",
             exc_info=True,
         )
         raise WebSocketDisconnect(
@@ -73,22 +85,68 @@ async def validate_websocket_session(websocket: WebSocket, client_chat_id: int)
         )
 
 
+def handle_client_frame(chat_id: int, websocket: WebSocket, data: str):
+    """
+    Handles a frame from the page. {"type": "send", "client_id", "text"}
+    queues a message for Telegram and is acked on the same socket right
+    away; the delivery result follows as a "delivery" frame.
+    """
+    try:
+        frame = json.loads(data)
+    except ValueError:
+        frame = None
+    if not isinstance(frame, dict) or frame.get("type") != "send":
+        logger.debug("WebSocket: Получено от клиента %s: %.200s (игнорируется)", chat_id, data)
+        return
+    started = time.perf_counter()
+    client_id = frame.get("client_id")
+    text = frame.get("text")
+    error = queue_web_message(chat_id, text if isinstance(text, str) else "", client_id)
+    ack = {"type": "ack", "client_id": client_id, "status": "queued"}
+    if error:
+        ack.update(status="rejected", error=error)
+    connections.send(chat_id, websocket, ack)
+    ws_send_latency.observe(time.perf_counter() - started)
+
+
 @router.websocket("/{client_chat_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
     client_chat_id: int = Depends(validate_websocket_session),
+    after: Optional[int] = None,
 ):
-    """Handles WebSocket connections for real-time updates."""
+    """
+    Handles WebSocket connections for real-time updates. `after` is the last
+    seq the client has; messages stored since then are replayed first.
+    """
+    if lifecycle.draining:
+        # 1013 "try again later": страница переподключится, уже к другому воркеру.
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Server draining")
+        return
     await websocket.accept()
     logger.info(f"WebSocket: Установлено соединение для chat_id: {client_chat_id}")
+    # Сначала регистрируем сокет (в общем режиме это строка socket_owners), потом
+    # читаем хвост: сообщение, которое другой воркер сохранит в промежутке, придет
+    # и в хвосте, и событием, а повтор клиент отсечет по seq. В обратном порядке
+    # событие такого сообщения никому не адресовано и теряется.
     add_active_websocket(client_chat_id, websocket)
+    if after is not None:
+        backlog = get_messages_after(client_chat_id, after, WS_RESUME_MAX + 1)
+        if len(backlog) > WS_RESUME_MAX:
+            backlog = [RELOAD_PAYLOAD]
+        elif backlog:
+            logger.info(
+                f"WebSocket: Досылаем {len(backlog)} пропущенных сообщений для chat_id {client_chat_id}"
+            )
+        # Между регистрацией и этой строкой нет await: живых кадров этого воркера
+        # в очереди еще нет, хвост уходит первым.
+        connections.replay(client_chat_id, websocket, backlog)
+    touch_chat(client_chat_id)
 
     try:
         while True:
             data = await websocket.receive_text()
-            logger.debug(
-                f"WebSocket: Получено от клиента {client_chat_id}: {data} (игнорируется)"
-            )
+            handle_client_frame(client_chat_id, websocket, data)
 
     except WebSocketDisconnect as e:
         logger.info(
@@ -100,7 +158,7 @@ async def websocket_endpoint(
             exc_info=True,
         )
     finally:
-        removed_socket = remove_active_websocket(client_chat_id)
+        removed_socket = remove_active_websocket(client_chat_id, websocket)
         if removed_socket:
             logger.info(
                 f"WebSocket: Запись об активном соединении для chat_id {client_chat_id} удалена."
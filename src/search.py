@@ -0,0 +1,310 @@
+import asyncio
+import html
+import re
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.state import StateBackend
+
+# Слова из латиницы, кириллицы и цифр; остальное (пунктуация, эмодзи) — разделители.
+_WORD_RE = re.compile(r"[0-9a-zа-яё]+")
+_TAG_RE = re.compile(r"<[^>]*>")
+MAX_TERM_LENGTH = 32
+# Сколько сообщений индексируется за один срез, между срезами цикл событий свободен.
+INDEX_BATCH = 2000
+# Сколько найденных в индексе сообщений проверяется по хранилищу за один запрос.
+MAX_CANDIDATES = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into search terms: HTML tags dropped, case folded, "ё"
+    folded to "е", single letters skipped and long words cut to
+    MAX_TERM_LENGTH. Order is kept, duplicates are not removed.
+    """
+    text = html.unescape(_TAG_RE.sub(" ", text)).casefold().replace("ё", "е")
+    return [
+        word[:MAX_TERM_LENGTH]
+        for word in _WORD_RE.findall(text)
+        if len(word) > 1 or word.isdigit()
+    ]
+
+
+def encode_cursor(cursor: Tuple[int, int]) -> str:
+    """Opaque form of a (chat_id, seq) listing position for URLs."""
+    return f"{cursor[0]}:{cursor[1]}"
+
+
+def decode_cursor(token: str) -> Tuple[int, int]:
+    """Parses encode_cursor() output; raises ValueError on anything else."""
+    chat_id, separator, seq = token.partition(":")
+    if not separator:
+        raise ValueError(f"Bad cursor: {token!r}")
+    return int(chat_id), int(seq)
+
+
+def matches(terms: Iterable[str], text: str) -> bool:
+    """Checks that `text` contains every term (re-checks a hit against the stored message)."""
+    words = set(tokenize(text))
+    return all(term in words for term in terms)
+
+
+class SearchIndex:
+    """
+    Inverted index of message texts kept in memory. Every added message
+    gets a document id (its position in the add order); postings are
+    sorted arrays of 4-byte document ids per term, plus one such array
+    per chat, and the chat_id and seq of each document sit in two 8-byte
+    arrays. Nothing is removed: messages that left the store (history
+    limits, expired chats) are skipped by the caller when a hit cannot be
+    loaded, and `rebuild` compacts the index from the store.
+    """
+
+    def __init__(self):
+        self._chats = array("q")
+        self._seqs = array("q")
+        self._postings: Dict[str, array] = {}
+        self._by_chat: Dict[int, array] = {}
+        self.postings = 0
+
+    def __len__(self) -> int:
+        return len(self._seqs)
+
+    def add(self, chat_id: int, seq: int, text: str):
+        doc = len(self._seqs)
+        self._chats.append(chat_id)
+        self._seqs.append(seq)
+        docs = self._by_chat.get(chat_id)
+        if docs is None:
+            docs = self._by_chat[chat_id] = array("I")
+        docs.append(doc)
+        terms = set(tokenize(text))
+        for term in terms:
+            docs = self._postings.get(term)
+            if docs is None:
+                docs = self._postings[term] = array("I")
+            docs.append(doc)
+        self.postings += len(terms)
+
+    def rebuild(self, messages: Iterable[Tuple[int, int, str]]):
+        """Replaces the contents with `messages` as (chat_id, seq, text), oldest first."""
+        self.clear()
+        for chat_id, seq, text in messages:
+            self.add(chat_id, seq, text)
+
+    def position(self, chat_id: int, seq: int) -> int:
+        """
+        Document id bound that continues a listing below message (chat_id, seq):
+        its document, or where it would be if a rebuild dropped the message.
+        Document ids change on rebuild, (chat_id, seq) does not; seqs grow
+        with document ids within a chat, so the chat's list is searched.
+        A chat with no documents left ends the listing.
+        """
+        docs = self._by_chat.get(chat_id)
+        if not docs:
+            return 0
+        i = bisect_left(docs, seq, key=self._seqs.__getitem__)
+        return docs[i] if i < len(docs) else docs[-1] + 1
+
+    def candidates(
+        self, terms: List[str], chat_id: Optional[int] = None, before: Optional[int] = None
+    ) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yields (document id, chat_id, seq) of documents containing every
+        term, newest first, starting below document id `before`. The
+        shortest posting list is walked, the others are probed by binary
+        search, so the cost follows the rarest term and stops as soon as
+        the caller has enough hits.
+        """
+        if not terms:
+            return
+        lists = [self._postings.get(term) for term in set(terms)]
+        if chat_id is not None:
+            lists.append(self._by_chat.get(chat_id))
+        if not all(lists):
+            return
+        lists.sort(key=len)
+        shortest, others = lists[0], lists[1:]
+        stop = len(shortest) if before is None else bisect_left(shortest, before)
+        # Документы идут по убыванию, поэтому верхняя граница поиска в каждом списке только сужается.
+        bounds = [len(docs) for docs in others]
+        for i in range(stop - 1, -1, -1):
+            doc = shortest[i]
+            for k, docs in enumerate(others):
+                j = bounds[k] = bisect_left(docs, doc, 0, bounds[k])
+                if j == len(docs) or docs[j] != doc:
+                    break
+            else:
+                yield doc, self._chats[doc], self._seqs[doc]
+
+    def stats(self) -> Dict[str, int]:
+        """Documents, distinct terms, postings and the approximate size of the arrays in bytes."""
+        # На каждый документ: chat_id и seq (8 + 8 байт) и запись в списке своего чата (4 байта).
+        return {
+            "documents": len(self),
+            "terms": len(self._postings),
+            "postings": self.postings,
+            "bytes": 20 * len(self) + 4 * self.postings,
+        }
+
+    def clear(self):
+        self._chats = array("q")
+        self._seqs = array("q")
+        self._postings.clear()
+        self._by_chat.clear()
+        self.postings = 0
+
+
+class MessageSearch:
+    """
+    Full-text search over the message history of the state backend. With a
+    local backend every stored message is indexed as it is added; with a
+    shared one (SQLite) the index follows the messages table by seq, so it
+    also sees messages stored by other workers. Hits are loaded from the
+    backend and re-checked, so messages that left the store are skipped.
+
+    Catching up and rebuilding work in slices of `batch` messages and
+    yield to the event loop between them. A rebuild fills a new index while
+    searches keep using the old one.
+    """
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        index: SearchIndex,
+        rebuild_ratio: float = 2.0,
+        batch: int = INDEX_BATCH,
+        max_candidates: int = MAX_CANDIDATES,
+    ):
+        self.backend = backend
+        self.index = index
+        self.rebuild_ratio = rebuild_ratio
+        self.batch = batch
+        self.max_candidates = max_candidates
+        self.synced_seq = 0
+        self.stale_hits = 0
+        self.rebuilds = 0
+        self.rebuilding = False
+        # Сообщения, добавленные во время перестройки локального хранилища.
+        self._added_while_rebuilding: Optional[List[Tuple[int, int, str]]] = None
+
+    def add(self, chat_id: int, message: Dict[str, Any]):
+        if self.backend.shared:
+            return
+        self.index.add(chat_id, message["seq"], message["text"])
+        if self._added_while_rebuilding is not None:
+            self._added_while_rebuilding.append((chat_id, message["seq"], message["text"]))
+
+    def _sync_batch(self) -> int:
+        # Чтение и добавление идут без await: параллельные sync не проиндексируют строку дважды.
+        rows = self.backend.messages_since(self.synced_seq, self.batch)
+        for chat_id, seq, text in rows:
+            self.index.add(chat_id, seq, text)
+        if rows:
+            self.synced_seq = rows[-1][1]
+        return len(rows)
+
+    async def sync(self):
+        """Indexes messages stored since the last sync (shared backends only)."""
+        if not self.backend.shared:
+            return
+        while self._sync_batch() == self.batch:
+            await asyncio.sleep(0)
+
+    async def rebuild(self):
+        """Rebuilds the index from the backend, dropping messages that are no longer stored."""
+        if self.rebuilding:
+            return
+        self.rebuilding = True
+        fresh = SearchIndex()
+        try:
+            if self.backend.shared:
+                seq = 0
+                while True:
+                    rows = self.backend.messages_since(seq, self.batch)
+                    for chat_id, seq, text in rows:
+                        fresh.add(chat_id, seq, text)
+                    if len(rows) < self.batch:
+                        break
+                    await asyncio.sleep(0)
+                # Сохраненное за время перестройки догонит следующий sync.
+                self.index, self.synced_seq = fresh, seq
+            else:
+                self._added_while_rebuilding = []
+                messages = self.backend.iter_messages()
+                while True:
+                    rows = list(islice(messages, self.batch))
+                    for chat_id, seq, text in rows:
+                        fresh.add(chat_id, seq, text)
+                    if len(rows) < self.batch:
+                        break
+                    await asyncio.sleep(0)
+                # Добавленное за время перестройки могло попасть и в срез хранилища — повтор отсекается при поиске.
+                for chat_id, seq, text in self._added_while_rebuilding:
+                    fresh.add(chat_id, seq, text)
+                self.index = fresh
+        finally:
+            self._added_while_rebuilding = None
+            self.rebuilding = False
+        self.rebuilds += 1
+
+    async def maintain(self):
+        """Catches up with a shared store and rebuilds once most documents are gone from the store."""
+        await self.sync()
+        if len(self.index) > self.rebuild_ratio * self.backend.message_count() + 1000:
+            await self.rebuild()
+
+    async def search(
+        self,
+        query: str,
+        chat_id: Optional[int] = None,
+        limit: int = 20,
+        before: Optional[Tuple[int, int]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Messages containing every word of `query`, newest first, in one chat
+        or in all. `next_before` is the (chat_id, seq) to pass as `before` for
+        the next page (None on the last one); it stays valid across rebuilds.
+        Hits are loaded from the backend in one call per `limit` candidates,
+        and at most `max_candidates` are checked per request: a page can come
+        back short, with `next_before` set, when most hits left the store.
+        """
+        terms = tokenize(query)
+        await self.sync()
+        index = self.index
+        bound = None if before is None else index.position(*before)
+        candidates = index.candidates(terms, chat_id, bound)
+        results, seen, last, checked = [], set(), None, 0
+        exhausted = False
+        while len(results) < limit and checked < self.max_candidates:
+            wanted = min(limit - len(results), self.max_candidates - checked)
+            chunk = [(hit_chat_id, seq) for _, hit_chat_id, seq in islice(candidates, wanted)]
+            checked += len(chunk)
+            found = self.backend.load_messages(chunk) if chunk else {}
+            for key in chunk:
+                last = key
+                message = found.get(key)
+                if message is None or not matches(terms, message["text"]):
+                    self.stale_hits += 1
+                    continue
+                if key in seen:
+                    continue
+                seen.add(key)
+                results.append({"chat_id": key[0], "message": message})
+            if len(chunk) < wanted:
+                exhausted = True
+                break
+        return {
+            "results": results,
+            "next_before": None if exhausted or last is None else last,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.index.stats(), stale_hits=self.stale_hits, rebuilds=self.rebuilds)
+
+    def clear(self):
+        self.index.clear()
+        self.synced_seq = 0
+        self.stale_hits = 0
@@ -0,0 +1,223 @@
+import hashlib
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import cookie_parser
+
+from src.state import StateBackend
+
+# Ключи сессии, смена которых означает вход: при их изменении выдается новый id.
+IDENTITY_KEYS = ("chat_id", "operator")
+# Служебное поле в данных бэкенда: когда срок сессии последний раз продлевался (time.time()).
+RENEWED_KEY = "_renewed"
+
+
+class WebSessionStore:
+    """
+    Browser sessions kept on the server. The cookie holds only an opaque
+    random id; the backend stores the session under the id's SHA-256, so a
+    leaked database does not yield usable cookies. Loaded sessions are
+    cached in an LRU of `cache_size` entries for `cache_ttl` seconds: with a
+    shared backend another worker's revocation is seen after at most
+    `cache_ttl`, revocations on this worker drop the cache at once.
+
+    Like Starlette's signed cookie, a session lives `max_age` seconds after
+    its last use, not after its creation: `load_renewing` pushes the expiry
+    forward, writing at most once per `renew_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        backend: StateBackend,
+        max_age: float,
+        cache_size: int = 10_000,
+        cache_ttl: float = 5.0,
+        renew_interval: float = 3600.0,
+    ):
+        self.backend = backend
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.renew_interval = renew_interval
+        # ключ -> (chat_id, данные, до какого времени запись в кэше верна, когда продлена)
+        self._cache: "OrderedDict[str, Tuple[Optional[int], Dict[str, Any], float, float]]" = (
+            OrderedDict()
+        )
+        self._cached_by_chat: Dict[Optional[int], Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def new_id() -> str:
+        return secrets.token_urlsafe(32)
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return hashlib.sha256(session_id.encode()).hexdigest()
+
+    def load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session's data, or None if it is unknown, expired or revoked. Do not mutate it."""
+        entry = self._load(self._key(session_id))
+        return entry[0] if entry else None
+
+    def load_renewing(self, session_id: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Like `load`, and extends the session's expiry to `max_age` from now
+        if it was last extended over `renew_interval` ago. The flag tells
+        whether it was, so the caller can refresh the cookie's Max-Age.
+        """
+        entry = self._load(self._key(session_id))
+        if entry is None:
+            return None, False
+        data, renewed = entry
+        if time.time() - renewed < self.renew_interval:
+            return data, False
+        self.save(session_id, data)
+        return data, True
+
+    def _load(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        now = time.monotonic()
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry[2] > now:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return entry[1], entry[3]
+            self._uncache(key)
+        self.misses += 1
+        data = self.backend.load_web_session(key, time.time())
+        if data is None:
+            return None
+        data = dict(data)
+        # Сессии, сохраненные до продления по использованию, продлеваются при первом запросе.
+        renewed = data.pop(RENEWED_KEY, 0.0)
+        self._cache_put(key, data.get("chat_id"), data, now, renewed)
+        return data, renewed
+
+    def save(self, session_id: str, data: Dict[str, Any]):
+        key = self._key(session_id)
+        chat_id = data.get("chat_id")
+        renewed = time.time()
+        self.backend.save_web_session(
+            key, chat_id, dict(data, **{RENEWED_KEY: renewed}), renewed + self.max_age
+        )
+        self._uncache(key)
+        self._cache_put(key, chat_id, data, time.monotonic(), renewed)
+
+    def delete(self, session_id: str):
+        key = self._key(session_id)
+        self.backend.delete_web_session(key)
+        self._uncache(key)
+
+    def forget_chat(self, chat_id: int):
+        """Drops cached sessions of a chat whose browser sessions the backend has revoked."""
+        for key in self._cached_by_chat.pop(chat_id, ()):
+            self._cache.pop(key, None)
+
+    def clear(self):
+        self._cache.clear()
+        self._cached_by_chat.clear()
+
+    def _cache_put(
+        self, key: str, chat_id: Optional[int], data: Dict[str, Any], now: float, renewed: float
+    ):
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = (chat_id, data, now + self.cache_ttl, renewed)
+        self._cached_by_chat.setdefault(chat_id, set()).add(key)
+        if len(self._cache) > self.cache_size:
+            self._uncache(next(iter(self._cache)))
+
+    def _uncache(self, key: str):
+        entry = self._cache.pop(key, None)
+        if entry is None:
+            return
+        keys = self._cached_by_chat.get(entry[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._cached_by_chat[entry[0]]
+
+
+class ServerSessionMiddleware:
+    """
+    Drop-in replacement of Starlette's SessionMiddleware (`request.session`,
+    `websocket.session`) backed by a WebSessionStore. The cookie is only
+    written when a session is created, rotated, renewed or ended, not on
+    every response. A new id is issued whenever the session's identity (chat_id or
+    the operator flag) changes on login, so an id planted before login is
+    never authenticated.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: WebSessionStore,
+        cookie_name: str = "session",
+        https_only: bool = False,
+        same_site: str = "lax",
+    ):
+        self.app = app
+        self.store = store
+        self.cookie_name = cookie_name
+        attributes = f"path=/; Max-Age={int(store.max_age)}; httponly; samesite={same_site}"
+        if https_only:
+            attributes += "; secure"
+        self._attributes = attributes
+        self._expired = f"{cookie_name}=null; path=/; Max-Age=0; httponly; samesite={same_site}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id = None
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                session_id = cookie_parser(value.decode("latin-1")).get(self.cookie_name)
+                break
+        if scope["type"] == "websocket":
+            stored = self.store.load(session_id) if session_id else None
+            scope["session"] = dict(stored) if stored else {}
+            await self.app(scope, receive, send)
+            return
+
+        # Продлевается только HTTP-запросом: ответ обновляет и Max-Age cookie.
+        stored, renewed = self.store.load_renewing(session_id) if session_id else (None, False)
+        scope["session"] = dict(stored) if stored else {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                cookie = self._commit(session_id, stored, scope["session"])
+                if cookie is None and renewed:
+                    cookie = f"{self.cookie_name}={session_id}; {self._attributes}"
+                if cookie:
+                    MutableHeaders(scope=message).append("Set-Cookie", cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _commit(
+        self,
+        session_id: Optional[str],
+        stored: Optional[Dict[str, Any]],
+        session: Dict[str, Any],
+    ) -> Optional[str]:
+        """Persists a changed session; returns the Set-Cookie value if the cookie must change."""
+        if session == (stored or {}):
+            # Неизвестный или отозванный id больше не нужен браузеру.
+            return self._expired if session_id and stored is None else None
+        if not session:
+            self.store.delete(session_id)
+            return self._expired
+        if stored and all(stored.get(key) == session.get(key) for key in IDENTITY_KEYS):
+            self.store.save(session_id, dict(session))
+            return None
+        if stored:
+            self.store.delete(session_id)
+        session_id = self.store.new_id()
+        self.store.save(session_id, dict(session))
+        return f"{self.cookie_name}={session_id}; {self._attributes}"
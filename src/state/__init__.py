@@ -0,0 +1,5 @@
+from src.state.base import StateBackend
+from src.state.memory import MemoryBackend
+from src.state.sqlite import SQLiteBackend
+
+__all__ = ["StateBackend", "MemoryBackend", "SQLiteBackend"]
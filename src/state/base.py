@@ -0,0 +1,175 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class StateBackend(ABC):
+    """
+    Storage for chat sessions and message history behind src.data_store.
+    Implementations are synchronous: every call is a short local operation.
+    """
+
+    # True if several worker processes see the same state through this backend.
+    shared: bool = False
+
+    @abstractmethod
+    def get_chat(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        """Returns the session record ("username", "access_code") or None."""
+
+    @abstractmethod
+    def chat_exists(self, chat_id: int) -> bool:
+        """Checks whether the chat has been initialized."""
+
+    @abstractmethod
+    def get_chat_id_by_code(self, access_code: str) -> Optional[int]:
+        """Resolves an access code to its chat_id."""
+
+    @abstractmethod
+    def set_session(self, chat_id: int, username: str, access_code: str) -> None:
+        """Creates or replaces the session of a chat."""
+
+    @abstractmethod
+    def clear_session(self, chat_id: int) -> None:
+        """Drops the access code and browser sessions of a chat, keeping its history."""
+
+    @abstractmethod
+    def set_username(self, chat_id: int, username: str) -> None:
+        """Updates the username of an existing chat."""
+
+    @abstractmethod
+    def append_message(
+        self,
+        chat_id: int,
+        sender: str,
+        text: str,
+        timestamp: int,
+        media: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Stores a message (timestamp in epoch seconds; `media` is the metadata
+        of an attached file, `text` its caption) and returns its serialized
+        form with a per-chat increasing "seq", or None for unknown chats.
+        """
+
+    @abstractmethod
+    def get_messages(self, chat_id: int) -> List[Dict[str, Any]]:
+        """Returns the message history of a chat, oldest first."""
+
+    @abstractmethod
+    def get_messages_before(
+        self, chat_id: int, before_seq: Optional[int], limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Keyset page: up to `limit` newest messages with seq < before_seq
+        (the newest ones if before_seq is None), oldest first.
+        """
+
+    @abstractmethod
+    def get_messages_after(
+        self, chat_id: int, after_seq: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        """Up to `limit` oldest messages with seq > after_seq, oldest first."""
+
+    def load_messages(
+        self, keys: List[Tuple[int, int]]
+    ) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        """Stored messages among `keys` as (chat_id, seq), by key; messages no longer stored are left out."""
+        found = {}
+        for chat_id, seq in keys:
+            page = self.get_messages_after(chat_id, seq - 1, 1)
+            if page and page[0]["seq"] == seq:
+                found[(chat_id, seq)] = page[0]
+        return found
+
+    @abstractmethod
+    def iter_messages(self) -> Iterator[Tuple[int, int, str]]:
+        """All stored messages as (chat_id, seq, text), roughly oldest first (builds the search index)."""
+
+    def messages_since(self, after_seq: int, limit: int) -> List[Tuple[int, int, str]]:
+        """
+        Up to `limit` messages stored by any worker with seq > after_seq, as
+        (chat_id, seq, text) in seq order. Only shared backends, whose seq
+        is global, implement it; local ones index messages as they are added.
+        """
+        return []
+
+    @abstractmethod
+    def save_web_session(
+        self, key: str, chat_id: Optional[int], data: Dict[str, Any], expires_at: float
+    ) -> None:
+        """
+        Creates or replaces a browser session. `key` identifies it (a hash
+        of the id in the cookie); clearing or removing the chat's session
+        removes its browser sessions too.
+        """
+
+    @abstractmethod
+    def load_web_session(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        """Returns the data of a browser session that has not expired at `now`, or None."""
+
+    @abstractmethod
+    def delete_web_session(self, key: str) -> None:
+        """Removes a browser session (logout)."""
+
+    @abstractmethod
+    def inbox_entries(self, chat_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """
+        Chats with an active session (all, or those among `chat_ids`) for the
+        operator inbox: "chat_id", "username", "read_seq", "unread" (user
+        messages after read_seq), "last" (the newest message or None) and
+        "active_at" (epoch seconds of the last activity).
+        """
+
+    @abstractmethod
+    def mark_read(self, chat_id: int, seq: int) -> int:
+        """Moves the chat's read marker forward to `seq`; returns how many user messages are still unread."""
+
+    def touch(self, chat_id: int) -> None:
+        """Records activity (login, websocket connect) that keeps the session alive."""
+
+    def expire(self, now: float, limit: int) -> Tuple[List[int], int]:
+        """
+        Looks at up to `limit` chats that may be due at `now`: clears sessions
+        idle for longer than the session TTL and removes chats (with their
+        history) idle for longer than the chat TTL. Messages count as
+        activity too. Returns the chat_ids whose sessions were cleared and
+        how many chats were looked at (fewer than `limit`: nothing else due).
+        """
+        return [], 0
+
+    @abstractmethod
+    def rate_limit(
+        self, key: str, now: float, interval: float, tolerance: float, consume: bool = True
+    ) -> float:
+        """
+        One GCRA step (src.ratelimit.gcra) for `key`: returns 0 if a request
+        is allowed at `now`, recording it unless `consume` is False, else the
+        seconds to wait.
+        """
+
+    def register_socket_owner(self, chat_id: int) -> None:
+        """Records that this worker holds a websocket for the chat."""
+
+    def unregister_socket_owner(self, chat_id: int) -> None:
+        """Forgets that this worker holds a websocket for the chat."""
+
+    def publish(self, chat_id: int, payload: Dict[str, Any]) -> None:
+        """Sends a chat event to the workers holding its websocket. No-op for local backends."""
+
+    def poll_events(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """Returns events addressed to this worker since the last call."""
+        return []
+
+    def message_count(self) -> int:
+        """Number of stored messages, cheap enough to read on every sweeper pass."""
+        return self.stats().get("messages", 0)
+
+    def stats(self) -> Dict[str, int]:
+        """Sizes of the stores ("chats", "sessions", "messages", ...) for /metrics."""
+        return {}
+
+    def close(self) -> None:
+        """Releases backend resources."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Removes all state (used by tests)."""
@@ -0,0 +1,61 @@
+import heapq
+from typing import Dict, Hashable, Iterator, List, Tuple
+
+
+class ExpiryIndex:
+    """
+    Min-heap of deadlines with at most one live entry per key.
+
+    schedule() is O(log n) and keeps the earliest deadline of a key; a later
+    deadline is not pushed, so callers re-check the real deadline when the
+    key is popped and schedule it again if it is still alive. This keeps
+    per-event work (e.g. every message) at zero: activity only moves the
+    real deadline later, which pop_due() callers discover lazily.
+
+    Entries left behind by discard() or an earlier schedule() are skipped
+    on pop and the heap is rebuilt when they outnumber live keys, so its
+    size stays proportional to the number of keys under any churn.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, Hashable]] = []
+        self._deadlines: Dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def schedule(self, key: Hashable, deadline: float):
+        current = self._deadlines.get(key)
+        if current is not None and current <= deadline:
+            return
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        self._maybe_compact()
+
+    def discard(self, key: Hashable):
+        if self._deadlines.pop(key, None) is not None:
+            self._maybe_compact()
+
+    def pop_due(self, now: float, limit: int) -> Iterator[Hashable]:
+        """Yields (and unschedules) up to `limit` keys whose deadline is <= now, earliest first."""
+        heap = self._heap
+        popped = 0
+        while heap and popped < limit and heap[0][0] <= now:
+            deadline, key = heapq.heappop(heap)
+            if self._deadlines.get(key) != deadline:
+                continue  # устаревшая запись
+            del self._deadlines[key]
+            popped += 1
+            yield key
+
+    def clear(self):
+        self._heap.clear()
+        self._deadlines.clear()
+
+    def _maybe_compact(self):
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, k) for k, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
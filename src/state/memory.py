@@ -0,0 +1,331 @@
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from src.history import HistoryStore, dump_media
+from src.ratelimit import GCRATable
+from src.state.base import StateBackend
+from src.state.expiry import ExpiryIndex
+
+
+class MemoryBackend(StateBackend):
+    """
+    Keeps state in process-local dicts. Only correct with a single worker.
+    With a journal (src.message_log.MessageLog) every mutation is also
+    appended to the on-disk log, so state survives restarts.
+
+    Expiry: every chat has one entry in an ExpiryIndex at its earliest
+    possible deadline (last activity + the TTL of its state). Activity only
+    updates `last_active`; expire() re-checks the real deadline of each
+    popped chat and reschedules it if it was active meanwhile. After a
+    restart the recovered chats count as active at recovery time.
+    """
+
+    shared = False
+
+    def __init__(
+        self,
+        chats: Dict[int, Dict[str, Any]],
+        codes: Dict[str, int],
+        history: HistoryStore,
+        journal=None,
+        session_ttl: float = 0.0,
+        idle_ttl: float = 0.0,
+        rate_limit_keys: int = 100_000,
+    ):
+        self.chats = chats
+        self.codes = codes
+        self.history = history
+        self.journal = journal
+        # 0 — не истекает.
+        self.session_ttl = session_ttl
+        self.idle_ttl = idle_ttl
+        self.last_active: Dict[int, float] = {}
+        self.expiry = ExpiryIndex()
+        self.rate_limits = GCRATable(rate_limit_keys)
+        # Сессии браузеров: ключ -> (chat_id, данные, срок), и ключи по чатам для отзыва.
+        self.web_sessions: Dict[str, Tuple[Optional[int], Dict[str, Any], float]] = {}
+        self.chat_web_sessions: Dict[Optional[int], Set[str]] = {}
+        # Докуда операторы прочитали чат (seq).
+        self.read_seqs: Dict[int, int] = {}
+
+    def get_chat(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        return self.chats.get(chat_id)
+
+    def chat_exists(self, chat_id: int) -> bool:
+        return chat_id in self.chats
+
+    def get_chat_id_by_code(self, access_code: str) -> Optional[int]:
+        return self.codes.get(access_code)
+
+    def set_session(self, chat_id: int, username: str, access_code: str) -> None:
+        info = self.chats.get(chat_id)
+        if info is None:
+            info = self.chats[chat_id] = {"username": None, "access_code": None}
+        info["username"] = username
+        info["access_code"] = access_code
+        self.codes[access_code] = chat_id
+        self._touch(chat_id, time.time())
+        if self.journal:
+            self.journal.append(
+                {"t": "s", "c": chat_id, "u": username, "a": access_code}
+            )
+
+    def clear_session(self, chat_id: int) -> None:
+        self._drop_web_sessions(chat_id)
+        if chat_id in self.chats:
+            old_code = self.chats[chat_id].get("access_code")
+            if old_code and old_code in self.codes:
+                del self.codes[old_code]
+            self.chats[chat_id]["access_code"] = None
+            # Теперь чат ждет удаления по idle_ttl.
+            self._schedule(chat_id)
+            if self.journal:
+                self.journal.append({"t": "x", "c": chat_id})
+
+    def set_username(self, chat_id: int, username: str) -> None:
+        if chat_id in self.chats:
+            self.chats[chat_id]["username"] = username
+            if self.journal:
+                self.journal.append({"t": "u", "c": chat_id, "u": username})
+
+    def append_message(
+        self,
+        chat_id: int,
+        sender: str,
+        text: str,
+        timestamp: int,
+        media: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        if chat_id in self.chats:
+            if self.journal:
+                record = {"t": "m", "c": chat_id, "s": sender, "x": text, "ts": timestamp}
+                if media is not None:
+                    record["md"] = media
+                self.journal.append(record)
+            if timestamp > self.last_active.get(chat_id, 0):
+                self.last_active[chat_id] = timestamp
+            return self.history.append(chat_id, sender, text, timestamp, dump_media(media))
+        return None
+
+    def get_messages(self, chat_id: int) -> List[Dict[str, Any]]:
+        return self.history.messages(chat_id)
+
+    def get_messages_before(
+        self, chat_id: int, before_seq: Optional[int], limit: int
+    ) -> List[Dict[str, Any]]:
+        return self.history.messages_before(chat_id, before_seq, limit)
+
+    def get_messages_after(
+        self, chat_id: int, after_seq: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        return self.history.messages_after(chat_id, after_seq, limit)
+
+    def iter_messages(self) -> Iterator[Tuple[int, int, str]]:
+        return self.history.scan()
+
+    def message_count(self) -> int:
+        return self.history.message_count()
+
+    def save_web_session(
+        self, key: str, chat_id: Optional[int], data: Dict[str, Any], expires_at: float
+    ) -> None:
+        self._unlink_web_session(key)
+        self.web_sessions[key] = (chat_id, data, expires_at)
+        self.chat_web_sessions.setdefault(chat_id, set()).add(key)
+        if self.journal:
+            self.journal.append({"t": "w", "c": chat_id, "k": key, "u": data, "e": expires_at})
+
+    def load_web_session(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        entry = self.web_sessions.get(key)
+        if entry is None:
+            return None
+        if entry[2] <= now:
+            self.delete_web_session(key)
+            return None
+        return entry[1]
+
+    def delete_web_session(self, key: str) -> None:
+        chat_id = self._unlink_web_session(key)
+        if chat_id is not False and self.journal:
+            self.journal.append({"t": "wd", "c": chat_id, "k": key})
+
+    def _unlink_web_session(self, key: str):
+        """Removes a browser session from both maps; returns its chat_id or False if unknown."""
+        entry = self.web_sessions.pop(key, None)
+        if entry is None:
+            return False
+        keys = self.chat_web_sessions.get(entry[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.chat_web_sessions[entry[0]]
+        return entry[0]
+
+    def _drop_web_sessions(self, chat_id: int):
+        # Журналировать не нужно: при повторе записи "x"/"d" сессии удалятся снова.
+        for key in self.chat_web_sessions.pop(chat_id, ()):
+            self.web_sessions.pop(key, None)
+
+    def inbox_entries(self, chat_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        entries = []
+        for chat_id in self.chats if chat_ids is None else chat_ids:
+            info = self.chats.get(chat_id)
+            if not info or not info["access_code"]:
+                continue
+            read_seq = self.read_seqs.get(chat_id, 0)
+            last = self.history.messages_before(chat_id, None, 1)
+            entries.append(
+                {
+                    "chat_id": chat_id,
+                    "username": info["username"],
+                    "read_seq": read_seq,
+                    "unread": self.history.count_after(chat_id, read_seq, "user"),
+                    "last": last[0] if last else None,
+                    "active_at": self.last_active.get(chat_id, 0),
+                }
+            )
+        return entries
+
+    def mark_read(self, chat_id: int, seq: int) -> int:
+        if chat_id not in self.chats:
+            return 0
+        read_seq = self.read_seqs.get(chat_id, 0)
+        if seq > read_seq:
+            self.read_seqs[chat_id] = read_seq = seq
+            if self.journal:
+                self.journal.append({"t": "r", "c": chat_id, "q": seq})
+        return self.history.count_after(chat_id, read_seq, "user")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "chats": len(self.chats),
+            "sessions": len(self.codes),
+            "web_sessions": len(self.web_sessions),
+            "messages": self.history.message_count(),
+            "history_bytes": self.history.bytes_used,
+        }
+
+    def touch(self, chat_id: int) -> None:
+        if chat_id in self.chats:
+            self._touch(chat_id, time.time())
+
+    def _touch(self, chat_id: int, at: float):
+        if at > self.last_active.get(chat_id, 0):
+            self.last_active[chat_id] = at
+        self._schedule(chat_id)
+
+    def _schedule(self, chat_id: int):
+        if chat_id not in self.expiry:
+            deadline = self._deadline(chat_id)
+            if deadline is not None:
+                self.expiry.schedule(chat_id, deadline)
+
+    def _deadline(self, chat_id: int) -> Optional[float]:
+        info = self.chats.get(chat_id)
+        if info is None:
+            return None
+        ttl = self.session_ttl if info["access_code"] else self.idle_ttl
+        if ttl <= 0:
+            return None
+        return self.last_active.get(chat_id, 0) + ttl
+
+    def expire(self, now: float, limit: int) -> Tuple[List[int], int]:
+        expired = []
+        processed = 0
+        for chat_id in self.expiry.pop_due(now, limit):
+            processed += 1
+            deadline = self._deadline(chat_id)
+            if deadline is None:
+                continue
+            if deadline > now:  # чат был активен после постановки в индекс
+                self.expiry.schedule(chat_id, deadline)
+            elif self.chats[chat_id]["access_code"]:
+                self.clear_session(chat_id)
+                expired.append(chat_id)
+            else:
+                self.drop_chat(chat_id)
+        return expired, processed
+
+    def drop_chat(self, chat_id: int) -> None:
+        """Removes a chat with its session and history."""
+        info = self.chats.pop(chat_id, None)
+        if info is None:
+            return
+        if info["access_code"]:
+            self.codes.pop(info["access_code"], None)
+        self.history.drop(chat_id)
+        self._drop_web_sessions(chat_id)
+        self.read_seqs.pop(chat_id, None)
+        self.last_active.pop(chat_id, None)
+        self.expiry.discard(chat_id)
+        if self.journal:
+            self.journal.append({"t": "d", "c": chat_id})
+
+    def rate_limit(
+        self, key: str, now: float, interval: float, tolerance: float, consume: bool = True
+    ) -> float:
+        return self.rate_limits.hit(key, now, interval, tolerance, consume)
+
+    def clear(self) -> None:
+        self.chats.clear()
+        self.codes.clear()
+        self.history.clear()
+        self.last_active.clear()
+        self.expiry.clear()
+        self.rate_limits.clear()
+        self.web_sessions.clear()
+        self.chat_web_sessions.clear()
+        self.read_seqs.clear()
+
+    # --- Снимки и восстановление из журнала ---
+
+    def export_state(self) -> Dict[str, Any]:
+        return {
+            "chats": {
+                chat_id: (info["username"], info["access_code"])
+                for chat_id, info in self.chats.items()
+            },
+            "history": self.history.export(),
+            "web_sessions": dict(self.web_sessions),
+            "read_seqs": dict(self.read_seqs),
+        }
+
+    def import_state(self, state: Dict[str, Any]) -> None:
+        self.clear()
+        for chat_id, (username, access_code) in state["chats"].items():
+            self.chats[chat_id] = {"username": username, "access_code": access_code}
+            if access_code:
+                self.codes[access_code] = chat_id
+        self.history.restore(state["history"])
+        for key, (chat_id, data, expires_at) in state.get("web_sessions", {}).items():
+            self.save_web_session(key, chat_id, data, expires_at)
+        self.read_seqs.update(state.get("read_seqs", {}))
+        now = time.time()
+        for chat_id in self.chats:
+            self._touch(chat_id, now)
+
+    def apply_record(self, record: Dict[str, Any]) -> None:
+        """Replays one journal record without journaling it again."""
+        journal, self.journal = self.journal, None
+        try:
+            kind, chat_id = record["t"], record["c"]
+            if kind == "s":
+                self.set_session(chat_id, record["u"], record["a"])
+            elif kind == "x":
+                self.clear_session(chat_id)
+            elif kind == "u":
+                self.set_username(chat_id, record["u"])
+            elif kind == "m":
+                self.append_message(
+                    chat_id, record["s"], record["x"], record["ts"], record.get("md")
+                )
+            elif kind == "d":
+                self.drop_chat(chat_id)
+            elif kind == "w":
+                self.save_web_session(record["k"], chat_id, record["u"], record["e"])
+            elif kind == "wd":
+                self.delete_web_session(record["k"])
+            elif kind == "r":
+                self.mark_read(chat_id, record["q"])
+        finally:
+            self.journal = journal
@@ -0,0 +1,608 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from src.history import dump_media, message_dict
+from src.ratelimit import gcra
+from src.state.base import StateBackend
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    chat_id INTEGER PRIMARY KEY,
+    username TEXT,
+    access_code TEXT UNIQUE,
+    last_active REAL,
+    expires_at REAL,
+    read_seq INTEGER
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    sender TEXT NOT NULL,
+    text TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    media TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_chat_id ON messages (chat_id, id);
+CREATE TABLE IF NOT EXISTS socket_owners (
+    chat_id INTEGER NOT NULL,
+    worker_id TEXT NOT NULL,
+    PRIMARY KEY (chat_id, worker_id)
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    heartbeat REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_target ON events (target, id);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    tat REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rate_limits_tat ON rate_limits (tat);
+CREATE TABLE IF NOT EXISTS web_sessions (
+    key TEXT PRIMARY KEY,
+    chat_id INTEGER,
+    data TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS web_sessions_chat_id ON web_sessions (chat_id);
+CREATE INDEX IF NOT EXISTS web_sessions_expires_at ON web_sessions (expires_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS messages_counted_insert AFTER INSERT ON messages BEGIN
+    UPDATE counters SET value = value + 1 WHERE name = 'messages';
+END;
+CREATE TRIGGER IF NOT EXISTS messages_counted_delete AFTER DELETE ON messages BEGIN
+    UPDATE counters SET value = value - 1 WHERE name = 'messages';
+END;
+"""
+
+# Столбцы, добавленные после первой версии схемы: (имя, тип).
+CHAT_COLUMNS_ADDED = (("last_active", "REAL"), ("expires_at", "REAL"), ("read_seq", "INTEGER"))
+# Описание файла (JSON) хранится отдельно от подписи в text.
+MESSAGE_COLUMNS_ADDED = (("media", "TEXT"),)
+
+# Сколько секунд событие живет в таблице events, прежде чем будет удалено.
+EVENT_RETENTION_SECONDS = 60.0
+# Как часто воркер отмечается в таблице workers и через сколько секунд без отметки
+# воркер считается упавшим: его строки socket_owners удаляются, события ему больше не пишутся.
+WORKER_HEARTBEAT_SECONDS = 10.0
+WORKER_EXPIRY_SECONDS = 60.0
+# Сколько секунд stats() отдает сохраненные размеры таблиц вместо нового подсчета.
+STATS_TTL_SECONDS = 30.0
+
+
+class SQLiteBackend(StateBackend):
+    """
+    Shares state between worker processes of one host through a SQLite file
+    in WAL mode. Cross-worker notifications go through the `events` table:
+    an event is addressed to every worker listed in `socket_owners` for the
+    chat, and each worker polls only the rows addressed to it.
+
+    Expiry works like in MemoryBackend, with the indexed `expires_at`
+    column as the earliest possible deadline of a chat. The time of the
+    chat's last message counts as activity, read from the messages index
+    only when a chat comes due, so sending a message costs no extra write.
+
+    Rate-limit buckets are rows of `rate_limits`, so login limits hold
+    across workers; rows whose TAT has passed carry no state and are pruned.
+
+    Each worker refreshes its row in `workers` while polling events. Socket
+    owners of workers silent for `worker_expiry` seconds (a crashed process
+    never runs `close()`) are removed, so nothing is published to them.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        path: str,
+        worker_id: str,
+        max_messages: int = 1000,
+        session_ttl: float = 0.0,
+        idle_ttl: float = 0.0,
+        heartbeat_interval: float = WORKER_HEARTBEAT_SECONDS,
+        worker_expiry: float = WORKER_EXPIRY_SECONDS,
+        stats_ttl: float = STATS_TTL_SECONDS,
+    ):
+        self.path = path
+        self.worker_id = worker_id
+        self.max_messages = max_messages
+        # Лишние сообщения чата удаляются после каждых trim_every его вставок на этом
+        # воркере: в таблице на чат не больше max_messages + trim_every x воркеров строк.
+        self.trim_every = min(64, max(1, max_messages // 16))
+        self._inserts: Dict[int, int] = {}
+        self.session_ttl = session_ttl
+        self.idle_ttl = idle_ttl
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_expiry = worker_expiry
+        self.stats_ttl = stats_ttl
+        # Чаты, сокеты которых есть на этом воркере: восстанавливаются, если строки удалили.
+        self._owned: Set[int] = set()
+        self._stats: Optional[Dict[str, int]] = None
+        self._stats_at = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=5.0, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        row = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()
+        self._last_event_id = row[0]
+        self._last_prune = time.monotonic()
+        self._last_rate_prune = time.monotonic()
+        with self._lock:
+            self._heartbeat()
+
+    def _migrate(self):
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chats)")}
+        for name, kind in CHAT_COLUMNS_ADDED:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE chats ADD COLUMN {name} {kind}")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(messages)")}
+        for name, kind in MESSAGE_COLUMNS_ADDED:
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE messages ADD COLUMN {name} {kind}")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chats_expires_at ON chats (expires_at)"
+        )
+        # Число сообщений ведут триггеры; таблица считается целиком один раз, при создании счетчика.
+        self._conn.execute(
+            "INSERT OR IGNORE INTO counters (name, value) SELECT 'messages', COUNT(*) FROM messages"
+        )
+        if self.session_ttl > 0 or self.idle_ttl > 0:
+            # Чаты без срока (из старой схемы или при выключенных TTL) проверяются при первом проходе.
+            now = time.time()
+            self._conn.execute(
+                "UPDATE chats SET last_active = COALESCE(last_active, ?), expires_at = ? "
+                "WHERE expires_at IS NULL",
+                (now, now),
+            )
+
+    def _fetchone(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def get_chat(self, chat_id: int) -> Optional[Dict[str, Any]]:
+        row = self._fetchone(
+            "SELECT username, access_code FROM chats WHERE chat_id = ?", (chat_id,)
+        )
+        if row is None:
+            return None
+        return {"username": row[0], "access_code": row[1]}
+
+    def chat_exists(self, chat_id: int) -> bool:
+        return (
+            self._fetchone("SELECT 1 FROM chats WHERE chat_id = ?", (chat_id,))
+            is not None
+        )
+
+    def get_chat_id_by_code(self, access_code: str) -> Optional[int]:
+        row = self._fetchone(
+            "SELECT chat_id FROM chats WHERE access_code = ?", (access_code,)
+        )
+        return row[0] if row else None
+
+    def set_session(self, chat_id: int, username: str, access_code: str) -> None:
+        now = time.time()
+        self._execute(
+            "INSERT INTO chats (chat_id, username, access_code, last_active, expires_at) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET "
+            "username = excluded.username, access_code = excluded.access_code, "
+            "last_active = excluded.last_active, "
+            "expires_at = COALESCE(MIN(expires_at, excluded.expires_at), expires_at, excluded.expires_at)",
+            (chat_id, username, access_code, now, self._ttl_deadline(now, self.session_ttl)),
+        )
+
+    def clear_session(self, chat_id: int) -> None:
+        self._execute("DELETE FROM web_sessions WHERE chat_id = ?", (chat_id,))
+        if self.idle_ttl <= 0:
+            self._execute("UPDATE chats SET access_code = NULL WHERE chat_id = ?", (chat_id,))
+            return
+        # Срок хранения чата без сессии может наступить раньше срока сессии.
+        self._execute(
+            "UPDATE chats SET access_code = NULL, "
+            "expires_at = COALESCE(MIN(expires_at, COALESCE(last_active, 0) + ?1), "
+            "COALESCE(last_active, 0) + ?1) WHERE chat_id = ?2",
+            (self.idle_ttl, chat_id),
+        )
+
+    def set_username(self, chat_id: int, username: str) -> None:
+        self._execute(
+            "UPDATE chats SET username = ? WHERE chat_id = ?", (username, chat_id)
+        )
+
+    def append_message(
+        self,
+        chat_id: int,
+        sender: str,
+        text: str,
+        timestamp: int,
+        media: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        encoded_media = dump_media(media)
+        # Глобальный AUTOINCREMENT id монотонен и внутри каждого чата — это и есть seq.
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO messages (chat_id, sender, text, timestamp, media) "
+                "SELECT chat_id, ?, ?, ?, ? FROM chats WHERE chat_id = ?",
+                (sender, text, timestamp, encoded_media, chat_id),
+            )
+            if cursor.rowcount == 0:
+                return None
+            seq = cursor.lastrowid
+            inserts = self._inserts.get(chat_id, 0) + 1
+            if inserts >= self.trim_every:
+                self._inserts.pop(chat_id, None)
+                self._trim_history(chat_id)
+            else:
+                self._inserts[chat_id] = inserts
+        return message_dict(seq, sender, text, timestamp, encoded_media)
+
+    def _trim_history(self, chat_id: int):
+        """Keeps only the newest max_messages of a chat (amortized over the chat's inserts)."""
+        self._conn.execute(
+            "DELETE FROM messages WHERE chat_id = ? AND id < ("
+            "SELECT id FROM messages WHERE chat_id = ? "
+            "ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (chat_id, chat_id, self.max_messages - 1),
+        )
+
+    def get_messages(self, chat_id: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, sender, text, timestamp, media FROM messages "
+                "WHERE chat_id = ? ORDER BY id DESC LIMIT ?",
+                (chat_id, self.max_messages),
+            ).fetchall()
+        return [self._row_to_message(row) for row in reversed(rows)]
+
+    def get_messages_after(
+        self, chat_id: int, after_seq: int, limit: int
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, sender, text, timestamp, media FROM messages "
+                "WHERE chat_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (chat_id, after_seq, limit),
+            ).fetchall()
+        return [self._row_to_message(row) for row in rows]
+
+    def get_messages_before(
+        self, chat_id: int, before_seq: Optional[int], limit: int
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, sender, text, timestamp, media FROM messages "
+                "WHERE chat_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (chat_id, before_seq if before_seq is not None else 2**63 - 1, limit),
+            ).fetchall()
+        return [self._row_to_message(row) for row in reversed(rows)]
+
+    def load_messages(
+        self, keys: List[Tuple[int, int]]
+    ) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        # seq — глобальный id, поэтому все сообщения читаются одним запросом.
+        if not keys:
+            return {}
+        wanted = set(keys)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chat_id, id, sender, text, timestamp, media FROM messages "
+                f"WHERE id IN ({', '.join('?' * len(wanted))})",
+                tuple(seq for _, seq in wanted),
+            ).fetchall()
+        return {
+            (row[0], row[1]): self._row_to_message(row[1:])
+            for row in rows
+            if (row[0], row[1]) in wanted
+        }
+
+    def iter_messages(self) -> Iterator[Tuple[int, int, str]]:
+        after = 0
+        while True:
+            rows = self.messages_since(after, 5000)
+            if not rows:
+                return
+            yield from rows
+            after = rows[-1][1]
+
+    def messages_since(self, after_seq: int, limit: int) -> List[Tuple[int, int, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT chat_id, id, text FROM messages WHERE id > ? ORDER BY id LIMIT ?",
+                (after_seq, limit),
+            ).fetchall()
+
+    def message_count(self) -> int:
+        (count,) = self._fetchone("SELECT value FROM counters WHERE name = 'messages'")
+        return count
+
+    def inbox_entries(self, chat_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        # Последнее сообщение и число непрочитанных берутся по индексу (chat_id, id).
+        sql = (
+            "SELECT c.chat_id, c.username, COALESCE(c.read_seq, 0), "
+            "MAX(COALESCE(c.last_active, 0), COALESCE(m.timestamp, 0)), "
+            "(SELECT COUNT(*) FROM messages u WHERE u.chat_id = c.chat_id "
+            "AND u.id > COALESCE(c.read_seq, 0) AND u.sender = 'user'), "
+            "m.id, m.sender, m.text, m.timestamp, m.media "
+            "FROM chats c LEFT JOIN messages m ON m.id = "
+            "(SELECT MAX(id) FROM messages WHERE chat_id = c.chat_id) "
+            "WHERE c.access_code IS NOT NULL"
+        )
+        params: tuple = ()
+        if chat_ids is not None:
+            sql += f" AND c.chat_id IN ({', '.join('?' * len(chat_ids))})"
+            params = tuple(chat_ids)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {
+                "chat_id": chat_id,
+                "username": username,
+                "read_seq": read_seq,
+                "unread": unread,
+                "last": self._row_to_message(last) if last[0] is not None else None,
+                "active_at": active_at,
+            }
+            for chat_id, username, read_seq, active_at, unread, *last in rows
+        ]
+
+    def mark_read(self, chat_id: int, seq: int) -> int:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE chats SET read_seq = MAX(COALESCE(read_seq, 0), ?) WHERE chat_id = ?",
+                (seq, chat_id),
+            )
+            (unread,) = self._conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE chat_id = ?1 AND sender = 'user' "
+                "AND id > (SELECT read_seq FROM chats WHERE chat_id = ?1)",
+                (chat_id,),
+            ).fetchone()
+        return unread
+
+    @staticmethod
+    def _row_to_message(row: tuple) -> Dict[str, Any]:
+        seq, sender, text, ts, media = row
+        return message_dict(seq, sender, text, int(ts), media)
+
+    @staticmethod
+    def _ttl_deadline(last_active: float, ttl: float) -> Optional[float]:
+        return last_active + ttl if ttl > 0 else None
+
+    def touch(self, chat_id: int) -> None:
+        self._execute(
+            "UPDATE chats SET last_active = ?1, expires_at = COALESCE(expires_at, "
+            "?1 + CASE WHEN access_code IS NULL THEN ?2 ELSE ?3 END) WHERE chat_id = ?4",
+            (
+                time.time(),
+                self.idle_ttl if self.idle_ttl > 0 else None,
+                self.session_ttl if self.session_ttl > 0 else None,
+                chat_id,
+            ),
+        )
+
+    def expire(self, now: float, limit: int) -> Tuple[List[int], int]:
+        expired = []
+        with self._lock:
+            # BEGIN IMMEDIATE: воркеры проходят одни и те же строки по очереди.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT chat_id, access_code, last_active, "
+                    "(SELECT timestamp FROM messages WHERE messages.chat_id = chats.chat_id "
+                    "ORDER BY id DESC LIMIT 1) "
+                    "FROM chats WHERE expires_at <= ? ORDER BY expires_at LIMIT ?",
+                    (now, limit),
+                ).fetchall()
+                for chat_id, access_code, last_active, last_message in rows:
+                    last = max(last_active or 0, last_message or 0)
+                    ttl = self.session_ttl if access_code else self.idle_ttl
+                    deadline = self._ttl_deadline(last, ttl)
+                    if deadline is None or deadline > now:
+                        self._conn.execute(
+                            "UPDATE chats SET expires_at = ? WHERE chat_id = ?",
+                            (deadline, chat_id),
+                        )
+                    elif access_code:
+                        self._conn.execute(
+                            "UPDATE chats SET access_code = NULL, expires_at = ? WHERE chat_id = ?",
+                            (self._ttl_deadline(last, self.idle_ttl), chat_id),
+                        )
+                        self._conn.execute(
+                            "DELETE FROM web_sessions WHERE chat_id = ?", (chat_id,)
+                        )
+                        expired.append(chat_id)
+                    else:
+                        self._conn.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+                        self._conn.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
+                        self._conn.execute(
+                            "DELETE FROM web_sessions WHERE chat_id = ?", (chat_id,)
+                        )
+                if len(rows) < limit:
+                    # Очередь сроков пройдена: заодно удаляем истекшие сессии браузеров.
+                    self._conn.execute("DELETE FROM web_sessions WHERE expires_at <= ?", (now,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return expired, len(rows)
+
+    def save_web_session(
+        self, key: str, chat_id: Optional[int], data: Dict[str, Any], expires_at: float
+    ) -> None:
+        self._execute(
+            "INSERT INTO web_sessions (key, chat_id, data, expires_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET chat_id = excluded.chat_id, "
+            "data = excluded.data, expires_at = excluded.expires_at",
+            (key, chat_id, json.dumps(data), expires_at),
+        )
+
+    def load_web_session(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        row = self._fetchone(
+            "SELECT data FROM web_sessions WHERE key = ? AND expires_at > ?", (key, now)
+        )
+        return json.loads(row[0]) if row else None
+
+    def delete_web_session(self, key: str) -> None:
+        self._execute("DELETE FROM web_sessions WHERE key = ?", (key,))
+
+    def rate_limit(
+        self, key: str, now: float, interval: float, tolerance: float, consume: bool = True
+    ) -> float:
+        with self._lock:
+            if not consume:
+                row = self._conn.execute(
+                    "SELECT tat FROM rate_limits WHERE key = ?", (key,)
+                ).fetchone()
+                return gcra(row[0] if row else None, now, interval, tolerance)[1]
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tat FROM rate_limits WHERE key = ?", (key,)
+                ).fetchone()
+                tat, retry_after = gcra(row[0] if row else None, now, interval, tolerance)
+                if tat is not None:
+                    self._conn.execute(
+                        "INSERT INTO rate_limits (key, tat) VALUES (?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                        (key, tat),
+                    )
+                if time.monotonic() - self._last_rate_prune > EVENT_RETENTION_SECONDS:
+                    # Ключ с TAT в прошлом равносилен отсутствующему: строку можно удалить.
+                    self._last_rate_prune = time.monotonic()
+                    self._conn.execute("DELETE FROM rate_limits WHERE tat < ?", (now,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return retry_after
+
+    def register_socket_owner(self, chat_id: int) -> None:
+        with self._lock:
+            self._owned.add(chat_id)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO socket_owners (chat_id, worker_id) VALUES (?, ?)",
+                (chat_id, self.worker_id),
+            )
+
+    def unregister_socket_owner(self, chat_id: int) -> None:
+        with self._lock:
+            self._owned.discard(chat_id)
+            self._conn.execute(
+                "DELETE FROM socket_owners WHERE chat_id = ? AND worker_id = ?",
+                (chat_id, self.worker_id),
+            )
+
+    def _heartbeat(self):
+        """Refreshes this worker's row and drops socket owners of silent workers."""
+        now = time.time()
+        self._last_heartbeat = time.monotonic()
+        updated = self._conn.execute(
+            "UPDATE workers SET heartbeat = ? WHERE worker_id = ?", (now, self.worker_id)
+        ).rowcount
+        if not updated:
+            # Новый воркер или цикл событий стоял дольше worker_expiry, и другой
+            # воркер уже удалил наши строки: регистрируемся заново.
+            self._conn.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, heartbeat) VALUES (?, ?)",
+                (self.worker_id, now),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO socket_owners (chat_id, worker_id) VALUES (?, ?)",
+                [(chat_id, self.worker_id) for chat_id in self._owned],
+            )
+        # Строки воркеров без свежей отметки (и неизвестных, например из старой схемы).
+        deadline = now - self.worker_expiry
+        self._conn.execute(
+            "DELETE FROM socket_owners WHERE worker_id NOT IN "
+            "(SELECT worker_id FROM workers WHERE heartbeat >= ?)",
+            (deadline,),
+        )
+        self._conn.execute("DELETE FROM workers WHERE heartbeat < ?", (deadline,))
+
+    def publish(self, chat_id: int, payload: Dict[str, Any]) -> None:
+        # Одна строка на каждого воркера-владельца сокета, кроме себя.
+        self._execute(
+            "INSERT INTO events (target, chat_id, payload, created) "
+            "SELECT worker_id, chat_id, ?, ? FROM socket_owners "
+            "WHERE chat_id = ? AND worker_id != ?",
+            (json.dumps(payload), time.time(), chat_id, self.worker_id),
+        )
+
+    def poll_events(self) -> List[Tuple[int, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, chat_id, payload FROM events "
+                "WHERE target = ? AND id > ? ORDER BY id LIMIT 1000",
+                (self.worker_id, self._last_event_id),
+            ).fetchall()
+            if rows:
+                self._last_event_id = rows[-1][0]
+            now = time.monotonic()
+            if now - self._last_heartbeat > self.heartbeat_interval:
+                self._heartbeat()
+            if now - self._last_prune > EVENT_RETENTION_SECONDS:
+                self._last_prune = now
+                self._conn.execute(
+                    "DELETE FROM events WHERE created < ?",
+                    (time.time() - EVENT_RETENTION_SECONDS,),
+                )
+        return [(chat_id, json.loads(payload)) for _, chat_id, payload in rows]
+
+    def stats(self) -> Dict[str, int]:
+        # Число сообщений ведут триггеры; остальные таблицы считаются целиком,
+        # поэтому их размеры пересчитываются не чаще раза в stats_ttl секунд.
+        now = time.monotonic()
+        if self._stats is None or now - self._stats_at >= self.stats_ttl:
+            chats, sessions = self._fetchone(
+                "SELECT COUNT(*), COUNT(access_code) FROM chats"
+            )
+            (events,) = self._fetchone("SELECT COUNT(*) FROM events")
+            (web_sessions,) = self._fetchone("SELECT COUNT(*) FROM web_sessions")
+            self._stats = {
+                "chats": chats,
+                "sessions": sessions,
+                "web_sessions": web_sessions,
+                "events": events,
+            }
+            self._stats_at = now
+        return dict(self._stats, messages=self.message_count())
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM socket_owners WHERE worker_id = ?", (self.worker_id,)
+            )
+            self._conn.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+            self._conn.close()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM messages")
+            self._conn.execute("DELETE FROM chats")
+            self._conn.execute("DELETE FROM events")
+            self._conn.execute("DELETE FROM socket_owners")
+            self._conn.execute("DELETE FROM rate_limits")
+            self._conn.execute("DELETE FROM web_sessions")
+            self._inserts.clear()
+            self._owned.clear()
+            self._stats = None
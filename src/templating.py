@@ -0,0 +1,53 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from fastapi.templating import Jinja2Templates
+
+from src.assets import Asset, AssetManifest, PrecomputedResponse
+from src.config import STATIC_DIR, TEMPLATES_AUTO_RELOAD, TEMPLATES_DIR
+
+# Статика загружается в память один раз при старте; шаблоны ссылаются на нее через asset_url().
+assets = AssetManifest(STATIC_DIR)
+
+templates = Jinja2Templates(directory=TEMPLATES_DIR)
+# Без автоперезагрузки скомпилированный шаблон берется из кэша Jinja без проверки файла.
+templates.env.auto_reload = TEMPLATES_AUTO_RELOAD
+templates.env.globals["asset_url"] = assets.url
+
+
+class PageCache:
+    """
+    Fully rendered, precompressed responses of templates whose output
+    depends only on a small context (the login page and its error
+    variants). Such templates must not use `request`. Disabled while
+    templates are reloaded from disk.
+    """
+
+    def __init__(self, max_pages: int = 32):
+        self.max_pages = max_pages
+        self._pages: "OrderedDict[tuple, Asset]" = OrderedDict()
+
+    def response(
+        self, request: Request, name: str, context: Optional[Dict[str, Any]] = None
+    ) -> PrecomputedResponse:
+        context = context or {}
+        key = (name, tuple(sorted(context.items())))
+        page = self._pages.get(key)
+        if page is None:
+            body = templates.get_template(name).render(context).encode()
+            page = Asset(body, "text/html; charset=utf-8")
+            if not TEMPLATES_AUTO_RELOAD:
+                self._pages[key] = page
+                if len(self._pages) > self.max_pages:
+                    self._pages.popitem(last=False)
+        return page.response(
+            request.headers.get("accept-encoding", ""),
+            request.headers.get("if-none-match", ""),
+        )
+
+    def clear(self):
+        self._pages.clear()
+
+
+page_cache = PageCache()
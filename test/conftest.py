@@ -4,7 +4,7 @@ from httpx import AsyncClient, ASGITransport
 from unittest.mock import AsyncMock, MagicMock, patch
 
 from src.app import app
-from src.data_store import chats_data, code_to_chat_id, active_websockets
+from src.data_store import reset_store, set_chat_session
 # from src.config import SESSION_SECRET_KEY # Не используется напрямую в этой фикстуре
 
 
@@ -23,13 +23,9 @@ async def client():
 @pytest_asyncio.fixture(scope="function", autouse=True)
 async def clear_data_stores():
     """Фикстура для очистки хранилищ данных до и после каждого теста."""
-    chats_data.clear()
-    code_to_chat_id.clear()
-    active_websockets.clear()
+    reset_store()
     yield
-    chats_data.clear()
-    code_to_chat_id.clear()
-    active_websockets.clear()
+    reset_store()
 
 
 @pytest.fixture(scope="function")
@@ -45,9 +41,8 @@ def mock_telegram_bot(mocker):
 @pytest.fixture(scope="function")
 def mock_add_message(mocker):
     """Фикстура для мокирования функции add_message."""
-    mock = mocker.patch("src.routes.chat.add_message", new_callable=AsyncMock)
+    mock = mocker.patch("src.bot.core.add_message", new_callable=AsyncMock)
     mocker.patch("src.bot.handlers.add_message", new=mock)
-    mocker.patch("src.bot.core.add_message", new=mock)
     return mock
 
 
@@ -65,12 +60,7 @@ def setup_active_session():
     test_chat_id = 12345
     test_username = "testuser"
     test_access_code = "testcode123"
-    chats_data[test_chat_id] = {
-        "username": test_username,
-        "access_code": test_access_code,
-        "messages": [],
-    }
-    code_to_chat_id[test_access_code] = test_chat_id
+    set_chat_session(test_chat_id, test_username, test_access_code)
     return {
         "chat_id": test_chat_id,
         "username": test_username,
@@ -0,0 +1,72 @@
+import gzip
+
+import pytest
+from httpx import AsyncClient
+
+from src.assets import AssetManifest, negotiate
+from src.templating import assets
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_negotiate_respects_quality():
+    """Тест: выбирается лучшая допустимая кодировка, q=0 ее запрещает."""
+    available = ("", "gzip", "br")
+    assert negotiate("gzip, deflate, br", available) == "br"
+    assert negotiate("br;q=0, gzip", available) == "gzip"
+    assert negotiate("*", ("", "gzip")) == "gzip"
+    assert negotiate("identity", available) == ""
+
+
+async def test_manifest_hashes_names(tmp_path):
+    """Тест: имя с хешем содержимого меняется вместе с файлом и помечено как неизменяемое."""
+    (tmp_path / "app.js").write_text("console.log(1);")
+    first = AssetManifest(str(tmp_path)).url("app.js")
+    (tmp_path / "app.js").write_text("console.log(2);")
+    manifest = AssetManifest(str(tmp_path))
+
+    assert first != manifest.url("app.js")
+    assert manifest.url("missing.css") == "/static/missing.css"
+    _, immutable = manifest.lookup(manifest.url("app.js").removeprefix("/static/"))
+    assert immutable
+    assert manifest.lookup("app.js")[1] is False
+
+
+async def test_static_served_compressed_with_etag(client: AsyncClient):
+    """Тест: CSS отдается сжатым по имени с хешем, повторный запрос с ETag получает 304."""
+    url = assets.url("css/style.css")
+    assert url != "/static/css/style.css"
+
+    response = await client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["vary"] == "Accept-Encoding"
+    with open("static/css/style.css", "rb") as f:
+        assert response.content == f.read()  # httpx распаковывает gzip
+
+    revalidated = await client.get(
+        "/static/css/style.css",
+        headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]},
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.headers["cache-control"] == "no-cache"
+
+
+async def test_login_page_rendered_once(client: AsyncClient, monkeypatch):
+    """Тест: страница входа отрисовывается один раз и ссылается на CSS с хешем."""
+    from src.templating import page_cache, templates
+
+    page_cache.clear()
+    renders = []
+    get_template = templates.get_template
+    monkeypatch.setattr(
+        templates, "get_template", lambda name: renders.append(name) or get_template(name)
+    )
+
+    for _ in range(3):
+        response = await client.get("/")
+        assert response.status_code == 200
+    assert renders == ["login.html"]
+    assert assets.url("css/style.css") in response.text
+    assert response.headers["content-type"] == "text/html; charset=utf-8"
@@ -0,0 +1,60 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from src.bot import core
+from src.bot.core import sweep_once
+from src.bot.leader import LeaderElector
+from src.data_store import add_active_websocket, backend, get_chat_data, set_chat_session
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_sweeper_expires_session_and_closes_socket(mock_websocket, monkeypatch):
+    """Тест: очистка снимает истекшую сессию и закрывает сокет чата с кодом 1008."""
+    monkeypatch.setattr(backend, "session_ttl", 60)
+    set_chat_session(1, "alice", "code1")
+    add_active_websocket(1, mock_websocket)
+
+    assert await sweep_once(time.time() + 61, batch=1) == 1
+
+    assert get_chat_data(1)["access_code"] is None
+    mock_websocket.close.assert_awaited_once()
+    assert mock_websocket.close.call_args.kwargs["code"] == 1008
+
+
+async def test_sweeper_closes_orphaned_sockets(mock_websocket):
+    """Тест: сокет чата без активной сессии закрывается."""
+    add_active_websocket(2, mock_websocket)
+
+    assert await sweep_once(time.time()) == 0
+
+    mock_websocket.close.assert_awaited_once()
+
+
+async def test_only_the_leader_sets_webhook(monkeypatch, tmp_path):
+    """Тест: в режиме webhook setWebhook вызывает только воркер, ставший лидером."""
+    app = MagicMock()
+    app.initialize = AsyncMock()
+    app.start = AsyncMock()
+    app.bot.set_webhook = AsyncMock()
+    lock_path = str(tmp_path / "bot.leader.lock")
+    monkeypatch.setattr(core, "application", app)
+    monkeypatch.setattr(core, "bot_leader", LeaderElector(lock_path))
+    monkeypatch.setattr(core, "BOT_UPDATE_MODE", "webhook")
+    monkeypatch.setattr(core, "WEBHOOK_URL", "https://example.com")
+    monkeypatch.setattr(core, "BOT_LEADER_ELECTION", True)
+    monkeypatch.setattr(core, "BOT_LEADER_RETRY_INTERVAL", 0.01)
+    other_worker = LeaderElector(lock_path)
+    assert other_worker.try_acquire()
+
+    task = asyncio.create_task(core.run_telegram_bot())
+    await asyncio.sleep(0.05)
+    app.bot.set_webhook.assert_not_awaited()
+
+    other_worker.release()
+    await asyncio.wait_for(task, 1)
+    app.bot.set_webhook.assert_awaited_once()
+    core.bot_leader.release()
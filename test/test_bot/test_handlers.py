@@ -4,6 +4,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 from src.bot.handlers import (
     start,
     handle_message,
+    handle_media,
     start_new_session,
     close_session_command,
 )
@@ -108,6 +109,34 @@ async def test_handle_message_no_session(mock_update, mock_context, mock_add_mes
     assert "Пожалуйста, начните сессию" in call_args[0]
     assert call_kwargs["reply_markup"] == markup
 
+
+
+async def test_handle_media_stores_file_metadata(
+    mock_update, mock_context, setup_active_session, mock_add_message
+):
+    """Тест: документ от пользователя сохраняется описанием файла с подписью."""
+    mock_update.message.caption = "договор"
+    mock_update.message.to_dict = MagicMock(
+        return_value={
+            "document": {
+                "file_id": "f1",
+                "file_unique_id": "u1",
+                "file_name": "contract.pdf",
+                "mime_type": "application/pdf",
+                "file_size": 1234,
+            }
+        }
+    )
+
+    with patch("src.bot.handlers.logger") as logger:
+        await handle_media(mock_update, mock_context)
+
+    assert mock_add_message.call_args.args == (setup_active_session["chat_id"], "user", "договор")
+    media = mock_add_message.call_args.kwargs["media"]
+    assert media["name"] == "contract.pdf" and media["size"] == 1234
+    # Строка на каждый файл идет через тот же семплер DEBUG, что и для текста.
+    logger.info.assert_not_called()
+
 # TODO: Добавьте тесты для start_new_session и close_session_command по аналогии,
 # проверяя вызовы close_existing_session (который тоже можно мокировать),
 # изменения в data_store и ответы пользователю.
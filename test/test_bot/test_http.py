@@ -0,0 +1,42 @@
+import pytest
+from telegram import Bot
+
+from benchmarks.fake_telegram import FakeBotAPI
+from src.bot.http import BotAPIStats, PooledHTTPXRequest
+
+pytestmark = pytest.mark.asyncio
+
+TOKEN = "123:abc"
+
+
+async def send_sequentially(keepalive_expiry: float, count: int) -> BotAPIStats:
+    fake = FakeBotAPI(TOKEN)
+    base_url = await fake.start()
+    stats = BotAPIStats()
+    request = PooledHTTPXRequest(
+        stats, keepalive_expiry=keepalive_expiry, connection_pool_size=4
+    )
+    try:
+        async with Bot(TOKEN, base_url=base_url, request=request) as bot:
+            for i in range(count):
+                await bot.send_message(chat_id=1, text=f"msg {i}")
+    finally:
+        await fake.stop()
+    return stats
+
+
+async def test_keep_alive_reuses_one_connection():
+    """Тест: последовательные запросы идут через одно keep-alive соединение."""
+    stats = await send_sequentially(keepalive_expiry=30, count=10)
+
+    snapshot = stats.snapshot()
+    assert snapshot["requests"] == 11  # getMe при инициализации + 10 отправок
+    assert snapshot["connections_opened"] == 1
+    assert snapshot["reuse_ratio"] == pytest.approx(10 / 11)
+
+
+async def test_without_keep_alive_every_request_connects():
+    """Тест: без keep-alive счетчик показывает новое соединение на каждый запрос."""
+    stats = await send_sequentially(keepalive_expiry=0, count=5)
+
+    assert stats.snapshot()["connections_opened"] == 6
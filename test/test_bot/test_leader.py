@@ -0,0 +1,20 @@
+from src.bot.leader import LeaderElector
+
+
+def test_only_one_leader(tmp_path):
+    """Тест: лидером может быть только один процесс; после освобождения лидерство переходит."""
+    lock_path = str(tmp_path / "bot.leader.lock")
+    first = LeaderElector(lock_path)
+    second = LeaderElector(lock_path)
+    try:
+        assert first.try_acquire()
+        assert first.is_leader
+        assert not second.try_acquire()
+        assert not second.is_leader
+
+        first.release()
+        assert second.try_acquire()
+        assert not first.try_acquire()
+    finally:
+        first.release()
+        second.release()
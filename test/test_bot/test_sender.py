@@ -0,0 +1,195 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from src.bot.sender import OutboundSender
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_sender(send_side_effect=None, **kwargs):
+    """Создает отправитель с моком Bot и собирает отчеты о доставке."""
+    bot = AsyncMock()
+    calls = []
+
+    async def send_message(chat_id, text):
+        calls.append((chat_id, text, time.monotonic()))
+        if send_side_effect:
+            send_side_effect(len(calls))
+
+    bot.send_message = send_message
+    statuses = []
+
+    async def on_sent(chat_id, text, client_id):
+        return {"seq": len(calls)}
+
+    async def on_status(chat_id, payload):
+        statuses.append(payload)
+
+    sender = OutboundSender(bot, on_sent, on_status, **kwargs)
+    return sender, calls, statuses
+
+
+async def wait_for_statuses(statuses, count, timeout=2):
+    deadline = time.monotonic() + timeout
+    while len(statuses) < count and time.monotonic() < deadline:
+        await asyncio.sleep(0.005)
+
+
+async def test_per_chat_order_and_rate():
+    """Тест: сообщения одного чата уходят по порядку и не чаще лимита чата."""
+    sender, calls, statuses = make_sender(chat_rate=20, chat_burst=1)
+    for i in range(3):
+        sender.submit(1, f"a{i}", client_id=f"c{i}")
+    sender.submit(2, "b0")
+
+    await wait_for_statuses(statuses, 4)
+    await sender.stop()
+
+    assert [text for chat_id, text, _ in calls if chat_id == 1] == ["a0", "a1", "a2"]
+    times = [t for chat_id, _, t in calls if chat_id == 1]
+    assert all(later - earlier >= 0.04 for earlier, later in zip(times, times[1:]))
+    # Лимит чата 1 не задерживает чат 2.
+    assert calls[1][:2] == (2, "b0")
+    assert statuses[0] == {"type": "delivery", "client_id": "c0", "status": "sent", "seq": 1}
+
+
+async def test_retry_after_pauses_sending():
+    """Тест: после 429 отправка возобновляется не раньше retry_after."""
+
+    def flood_once(call_number):
+        if call_number == 1:
+            raise RetryAfter(0.1)
+
+    sender, calls, statuses = make_sender(flood_once)
+    sender.submit(1, "hello", client_id="x")
+
+    await wait_for_statuses(statuses, 1)
+    await sender.stop()
+
+    assert len(calls) == 2
+    assert calls[1][2] - calls[0][2] >= 0.1
+    assert statuses == [{"type": "delivery", "client_id": "x", "status": "sent", "seq": 2}]
+    assert sender.stats()["rate_limited"] == 1
+
+
+async def test_network_errors_retried_then_reported_failed():
+    """Тест: сетевые ошибки повторяются до max_attempts, затем клиент получает failed."""
+
+    def always_down(call_number):
+        raise NetworkError("connection reset")
+
+    sender, calls, statuses = make_sender(always_down, max_attempts=3, retry_base_delay=0.01)
+    sender.submit(1, "hello", client_id="x")
+
+    await wait_for_statuses(statuses, 1)
+    await sender.stop()
+
+    assert len(calls) == 3
+    assert statuses[0]["status"] == "failed"
+    assert sender.stats() == {
+        "pending": 0,
+        "sent": 0,
+        "failed": 1,
+        "retried": 2,
+        "rate_limited": 0,
+    }
+
+
+async def test_bad_request_is_not_retried():
+    """Тест: ошибки запроса (например, чат недоступен) не повторяются."""
+
+    def reject(call_number):
+        raise BadRequest("Chat not found")
+
+    sender, calls, statuses = make_sender(reject)
+    sender.submit(1, "hello")
+
+    await wait_for_statuses(statuses, 1)
+    await sender.stop()
+
+    assert len(calls) == 1
+    assert statuses[0]["status"] == "failed"
+    assert "Chat not found" in statuses[0]["error"]
+
+
+async def test_upload_is_sent_stored_and_closed_once():
+    """Тест: файл уходит через send_upload, повторяется после сетевой ошибки и закрывается один раз."""
+    attempts = []
+
+    async def send_upload(chat_id, upload):
+        attempts.append(upload)
+        if len(attempts) == 1:
+            raise NetworkError("reset")
+        return {"kind": "photo"}
+
+    upload = MagicMock()
+    stored = []
+    sender, calls, statuses = make_sender(retry_base_delay=0.01)
+    sender.send_upload = send_upload
+
+    async def on_sent(chat_id, text, client_id, media=None):
+        stored.append((text, media))
+        return {"seq": 1}
+
+    sender.on_sent = on_sent
+    sender.submit(1, "подпись", client_id="f", upload=upload)
+
+    await wait_for_statuses(statuses, 1)
+    await sender.stop()
+
+    assert calls == [] and len(attempts) == 2
+    assert stored == [("подпись", {"kind": "photo"})]
+    assert statuses == [{"type": "delivery", "client_id": "f", "status": "sent", "seq": 1}]
+    upload.close.assert_called_once()
+
+
+async def test_flush_waits_for_queue_within_timeout():
+    """Тест: flush дожидается отправки очереди, но не дольше срока."""
+    sender, calls, _ = make_sender(chat_rate=20, chat_burst=1)
+    for i in range(3):
+        sender.submit(1, f"m{i}")
+    assert await sender.flush(timeout=2) == 0
+    assert len(calls) == 3
+
+    for i in range(20):
+        sender.submit(2, f"n{i}")
+    assert await sender.flush(timeout=0.05) > 0
+    await sender.stop()
+
+
+async def test_store_failure_still_reports_sent():
+    """Тест: если доставленное сообщение не удалось сохранить, клиент все равно получает sent."""
+    sender, calls, statuses = make_sender()
+
+    async def on_sent(chat_id, text, client_id):
+        raise RuntimeError("database is locked")
+
+    sender.on_sent = on_sent
+    sender.submit(1, "hello", client_id="x")
+
+    await wait_for_statuses(statuses, 1)
+    await sender.stop()
+
+    assert len(calls) == 1
+    assert statuses == [{"type": "delivery", "client_id": "x", "status": "sent", "seq": None}]
+
+
+async def test_stop_reports_unsent_messages_failed():
+    """Тест: сообщения, оставшиеся в очереди при остановке, получают failed, файлы закрываются."""
+    sender, calls, statuses = make_sender(chat_rate=0.01, chat_burst=1)
+    upload = MagicMock()
+    sender.submit(1, "first", client_id="a")
+    sender.submit(1, "second", client_id="b")
+    sender.submit(1, "file", client_id="c", upload=upload)
+    await wait_for_statuses(statuses, 1)
+
+    await sender.stop()
+
+    assert [s["client_id"] for s in statuses] == ["a", "b", "c"]
+    assert [s["status"] for s in statuses] == ["sent", "failed", "failed"]
+    assert sender.pending() == 0
+    upload.close.assert_called_once()
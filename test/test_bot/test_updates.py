@@ -0,0 +1,94 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from telegram import Update
+
+from src.bot.updates import ChatLaneUpdateProcessor, UpdateQueue
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_update(chat_id: int) -> MagicMock:
+    update = MagicMock(spec=Update)
+    update.effective_chat.id = chat_id
+    return update
+
+
+async def test_updates_of_one_chat_keep_order():
+    """Тест: обновления одного чата обрабатываются по очереди, даже если первое медленнее."""
+    processor = ChatLaneUpdateProcessor(workers=8)
+    done = []
+
+    async def handle(name, delay):
+        await asyncio.sleep(delay)
+        done.append(name)
+
+    await asyncio.gather(
+        *(
+            processor.process_update(make_update(1), handle(f"m{i}", 0.03 - i * 0.01))
+            for i in range(3)
+        )
+    )
+
+    assert done == ["m0", "m1", "m2"]
+    assert processor.queued_behind_chat == 2
+    assert processor.lanes() == 0
+
+
+async def test_busy_chat_does_not_block_other_chats():
+    """Тест: медленный чат не задерживает другие, а число одновременных обработчиков ограничено."""
+    processor = ChatLaneUpdateProcessor(workers=2)
+    release = asyncio.Event()
+    done = []
+    peak = 0
+
+    async def handle(name, wait=False):
+        nonlocal peak
+        peak = max(peak, processor.running)
+        if wait:
+            await release.wait()
+        done.append(name)
+
+    # Пять обновлений чата 1 ждут друг друга, но занимают только один обработчик.
+    slow = [
+        asyncio.create_task(processor.process_update(make_update(1), handle(f"a{i}", True)))
+        for i in range(5)
+    ]
+    await asyncio.gather(
+        *(processor.process_update(make_update(chat_id), handle(f"c{chat_id}")) for chat_id in (2, 3, 4))
+    )
+    assert done == ["c2", "c3", "c4"]
+
+    release.set()
+    await asyncio.gather(*slow)
+    assert done[3:] == [f"a{i}" for i in range(5)]
+    assert peak <= 2
+    assert processor.processed == 8
+
+
+async def test_queue_stops_handing_out_updates_at_max_pending():
+    """Тест: очередь не отдает новое обновление, пока max_pending предыдущих не завершены."""
+    processor = ChatLaneUpdateProcessor(workers=2, max_pending=2)
+    queue = UpdateQueue(processor, maxsize=1)
+    release = asyncio.Event()
+    tasks = []
+
+    async def handle():
+        await release.wait()
+
+    for chat_id in (1, 2):
+        queue.put_nowait(make_update(chat_id))
+        update = await queue.get()
+        tasks.append(asyncio.create_task(processor.process_update(update, handle())))
+    queue.put_nowait(make_update(3))
+    with pytest.raises(asyncio.QueueFull):
+        queue.put_nowait(make_update(4))
+
+    fetch = asyncio.create_task(queue.get())
+    await asyncio.sleep(0.01)
+    assert not fetch.done()
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert (await asyncio.wait_for(fetch, 1)).effective_chat.id == 3
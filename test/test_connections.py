@@ -0,0 +1,165 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.connections import RESYNC_FRAME, ConnectionRegistry
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_socket(send_text=None) -> AsyncMock:
+    ws = AsyncMock()
+    ws.send_text = send_text or AsyncMock()
+    ws.close = AsyncMock()
+    return ws
+
+
+def make_stalled_socket():
+    """Сокет, отправка в который блокируется до установки события."""
+    release = asyncio.Event()
+    sent = []
+
+    async def send_text(frame):
+        await release.wait()
+        sent.append(frame)
+
+    return make_socket(send_text=send_text), release, sent
+
+
+async def test_broadcast_reaches_every_connection_of_chat():
+    """Тест: сообщение доставляется во все вкладки чата, но не в чужие чаты."""
+    registry = ConnectionRegistry(send_timeout=1)
+    tabs = [make_socket() for _ in range(3)]
+    other = make_socket()
+    for ws in tabs:
+        registry.add(1, ws)
+    registry.add(2, other)
+
+    assert registry.broadcast(1, {"sender": "admin", "text": "Привет"}) == 3
+    await asyncio.sleep(0.01)
+
+    for ws in tabs:
+        ws.send_text.assert_awaited_once_with('{"sender":"admin","text":"Привет"}')
+    other.send_text.assert_not_called()
+    assert registry.count() == 4
+    registry.clear()
+
+
+async def test_replay_goes_before_queued_frames_and_past_the_bound():
+    """Тест: досылаемый хвост уходит раньше уже поставленных кадров и не ограничен очередью."""
+    registry = ConnectionRegistry(send_timeout=1, queue_size=2)
+    ws = make_socket()
+    registry.add(1, ws)
+    registry.broadcast(1, {"seq": 9})
+
+    assert registry.replay(1, ws, [{"seq": 5}, {"seq": 6}, {"seq": 7}])
+    assert not registry.replay(2, ws, [{"seq": 1}])
+    await asyncio.sleep(0.01)
+
+    sent = [call.args[0] for call in ws.send_text.await_args_list]
+    assert sent == ['{"seq":5}', '{"seq":6}', '{"seq":7}', '{"seq":9}']
+    registry.clear()
+
+
+async def test_slow_connection_is_dropped_without_blocking_others():
+    """Тест: зависший клиент отключается по таймауту, остальные получают сообщение."""
+    registry = ConnectionRegistry(send_timeout=0.05)
+    fast = make_socket()
+    slow, _, _ = make_stalled_socket()
+    registry.add(1, fast)
+    registry.add(1, slow)
+
+    registry.broadcast(1, {"text": "x"})
+    await asyncio.sleep(0.01)
+    fast.send_text.assert_awaited_once()
+    await asyncio.sleep(0.1)
+
+    assert registry.get(1) == {fast}
+    assert registry.stats()["evicted_connections"] == 1
+    slow.close.assert_awaited_once()
+    registry.clear()
+
+
+@pytest.mark.parametrize(
+    "policy, expected_frames, connected",
+    [
+        ("drop_oldest", ['{"n":0}', '{"n":3}', '{"n":4}'], True),
+        ("coalesce", ['{"n":0}', RESYNC_FRAME, '{"n":4}'], True),
+        ("disconnect", [], False),
+    ],
+)
+async def test_overflow_policies(policy, expected_frames, connected):
+    """Тест: переполнение очереди обрабатывается согласно политике."""
+    registry = ConnectionRegistry(send_timeout=1, queue_size=2, overflow_policy=policy)
+    ws, release, sent = make_stalled_socket()
+    registry.add(1, ws)
+
+    registry.broadcast(1, {"n": 0})
+    await asyncio.sleep(0)  # писатель забрал первый кадр и ждет сеть
+    for n in range(1, 5):
+        registry.broadcast(1, {"n": n})
+    release.set()
+    await asyncio.sleep(0.01)
+
+    assert registry.has(1) is connected
+    if connected:
+        assert sent == expected_frames
+        assert registry.stats()["dropped_frames"] == 2
+    else:
+        ws.close.assert_awaited_once()
+    registry.clear()
+
+
+async def test_owner_hooks_fire_on_first_and_last_connection():
+    """Тест: бэкенд уведомляется только о первом и последнем соединении чата."""
+    events = []
+    registry = ConnectionRegistry(
+        send_timeout=1,
+        on_first=lambda chat_id: events.append(("first", chat_id)),
+        on_empty=lambda chat_id: events.append(("empty", chat_id)),
+    )
+    a, b = make_socket(), make_socket()
+
+    registry.add(7, a)
+    registry.add(7, b)
+    assert registry.remove(7, a) is True
+    assert registry.remove(7, a) is False
+    assert events == [("first", 7)]
+    registry.remove(7, b)
+
+    assert events == [("first", 7), ("empty", 7)]
+    assert not registry.has(7)
+
+
+async def test_close_all_sends_queued_frames_then_closes():
+    """Тест: при дренаже сначала уходят накопленные кадры, затем сокет закрывается с 1012."""
+    registry = ConnectionRegistry(send_timeout=1)
+    sockets = [make_socket() for _ in range(3)]
+    for chat_id, ws in enumerate(sockets):
+        registry.add(chat_id, ws)
+        registry.broadcast(chat_id, {"text": "последнее"})
+
+    assert await registry.close_all(1012, "Server restarting", timeout=1) == 0
+
+    for ws in sockets:
+        ws.send_text.assert_awaited_once()
+        ws.close.assert_awaited_once_with(code=1012, reason="Server restarting")
+    assert registry.count() == 0
+
+
+async def test_close_all_is_bounded_by_timeout():
+    """Тест: зависший клиент не задерживает остановку дольше общего срока."""
+    registry = ConnectionRegistry(send_timeout=10)
+    fast = make_socket()
+    slow, _, _ = make_stalled_socket()
+    registry.add(1, fast)
+    registry.add(2, slow)
+    registry.broadcast(2, {"text": "x"})
+
+    started = asyncio.get_running_loop().time()
+    assert await registry.close_all(1012, "Server restarting", timeout=0.1) == 1
+
+    assert asyncio.get_running_loop().time() - started < 1
+    fast.close.assert_awaited_once()
+    assert registry.count() == 0
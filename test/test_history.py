@@ -0,0 +1,45 @@
+from src.history import HistoryStore, MessageHistory
+
+
+def test_ring_buffer_keeps_newest_messages():
+    """Тест: при переполнении вытесняются самые старые сообщения, seq не сбрасывается."""
+    history = MessageHistory(capacity=3)
+    for i in range(5):
+        history.append("user", f"сообщение {i}", 1_700_000_000 + i)
+
+    messages = list(history)
+    assert len(history) == 3
+    assert [m["text"] for m in messages] == ["сообщение 2", "сообщение 3", "сообщение 4"]
+    assert [m["seq"] for m in messages] == [3, 4, 5]
+    assert history.get(2) is None
+    assert history.get(5)["text"] == "сообщение 4"
+
+
+def test_refill_after_eviction():
+    """Тест: после вытеснения буфер снова заполняется в правильном порядке."""
+    history = MessageHistory(capacity=4)
+    for i in range(3):
+        history.append("user", str(i), 0)
+    history.evict_oldest(2)
+    for i in range(3, 7):
+        history.append("admin", str(i), 0)
+
+    assert [m["text"] for m in history] == ["3", "4", "5", "6"]
+    assert [m["seq"] for m in history] == [4, 5, 6, 7]
+    assert history.slice(1, 3) == [history.get(5), history.get(6)]
+
+
+def test_memory_budget_evicts_least_recent_chats():
+    """Тест: при превышении бюджета первыми теряют историю давно неактивные чаты."""
+    store = HistoryStore(capacity=1000, budget_bytes=20_000)
+    for i in range(50):
+        store.append(1, "user", "x" * 100, 0)
+    for i in range(50):
+        store.append(2, "user", "y" * 100, 0)
+    for i in range(100):
+        store.append(3, "user", "z" * 100, 0)
+
+    assert store.bytes_used <= 20_000
+    assert store.messages(1) == []
+    assert len(store.messages(3)) > 0
+    assert store.messages(3)[-1]["seq"] == 100
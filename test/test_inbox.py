@@ -0,0 +1,126 @@
+import asyncio
+import json
+from collections import defaultdict
+from unittest.mock import AsyncMock
+
+import pytest
+
+from src.connections import ConnectionRegistry
+from src.history import HistoryStore
+from src.inbox import INBOX_CHANNEL, InboxIndex, OperatorHub
+from src.state import MemoryBackend
+
+pytestmark = pytest.mark.asyncio
+
+
+def message(seq: int, sender: str = "user", text: str = "текст") -> dict:
+    return {"seq": seq, "sender": sender, "text": text, "timestamp": "2024-01-01 00:00:00"}
+
+
+def row(chat_id: int, active_at: float, unread: int = 0, read_seq: int = 0, last=None) -> dict:
+    return {
+        "chat_id": chat_id,
+        "username": f"u{chat_id}",
+        "read_seq": read_seq,
+        "unread": unread,
+        "last": last,
+        "active_at": active_at,
+    }
+
+
+@pytest.fixture
+def hub():
+    chats = defaultdict(lambda: {"username": None, "access_code": None})
+    backend = MemoryBackend(chats, {}, HistoryStore(100, 1024 * 1024))
+    registry = ConnectionRegistry(send_timeout=1)
+    hub = OperatorHub(backend, registry, InboxIndex(preview_chars=5), page_size=10)
+    yield hub, backend
+    registry.clear()
+    backend.close()
+
+
+def operator_socket() -> AsyncMock:
+    ws = AsyncMock()
+    ws.frames = []
+    ws.send_text = AsyncMock(side_effect=lambda frame: ws.frames.append(json.loads(frame)))
+    return ws
+
+
+async def test_index_orders_by_recency_and_counts_unread():
+    """Тест: новое сообщение поднимает чат наверх, непрочитанные считаются только от пользователя."""
+    index = InboxIndex(preview_chars=3)
+    index.load([row(1, 10.0, unread=2, last=message(2)), row(2, 20.0), row(3, 5.0)])
+    assert [chat["chat_id"] for chat in index.newest(10)] == [2, 1, 3]
+    assert index.unread_total == 2
+
+    index.message(3, message(1, text="длинный текст"), 30.0)
+    index.message(2, message(1, sender="admin"), 31.0)
+    assert [chat["chat_id"] for chat in index.newest(2)] == [2, 3]
+    assert [chat["chat_id"] for chat in index.newest(10, offset=2)] == [1]
+    assert index.newest(1, offset=1)[0]["last"]["text"] == "дли"
+    assert index.unread_total == 3
+
+    # Сообщение, уже учтенное при загрузке, не считается повторно.
+    assert index.message(1, message(2), 40.0) is None
+    assert index.read(1, 2, 0).unread == 0
+    assert index.read(1, 1, 5) is None  # отметка не сдвигается назад
+    assert index.unread_total == 1
+
+    index.remove(3)
+    assert index.unread_total == 0 and 3 not in index
+
+
+async def test_hub_streams_changes_to_operators(hub):
+    """Тест: оператор получает снимок, изменения списка и сообщения только открытых чатов."""
+    hub, backend = hub
+    backend.set_session(7, "gina", "code7")
+    backend.append_message(7, "user", "hello", 1_700_000_000)
+
+    ws = operator_socket()
+    hub.attach(ws)
+    hub.watch(ws, [7])
+    hub.apply({"type": "message", "chat_id": 7, "message": message(5), "at": 1_700_000_010})
+    hub.apply({"type": "message", "chat_id": 8, "message": message(1), "at": 1_700_000_011})
+    hub.apply({"type": "closed", "chat_id": 7})
+    await asyncio.sleep(0.01)
+
+    snapshot, live, chat, closed = ws.frames
+    assert snapshot["type"] == "inbox" and snapshot["total"] == 1
+    assert snapshot["chats"][0]["last"]["text"] == "hello"
+    assert chat["type"] == "chat" and chat["unread"] == 2
+    assert chat["chat"]["last"]["text"] == "текст"[:5]
+    assert live == {"type": "message", "chat_id": 7, "message": message(5)}
+    assert closed == {"type": "chat_closed", "chat_id": 7, "unread": 0}
+
+    hub.detach(ws)
+    assert not hub.index.loaded and not hub.watchers
+    assert hub.connections.count() == 0
+
+
+async def test_hub_loads_new_session_and_applies_read(hub):
+    """Тест: новая сессия подтягивается точечным запросом, прочтение обнуляет счетчик."""
+    hub, backend = hub
+    ws = operator_socket()
+    hub.attach(ws)
+
+    backend.set_session(9, "hank", "code9")
+    stored = backend.append_message(9, "user", "hi", 1_700_000_000)
+    hub.apply({"type": "session", "chat_id": 9, "username": "hank"})
+    assert hub.index.unread_total == 1
+
+    unread = backend.mark_read(9, stored["seq"])
+    hub.apply({"type": "read", "chat_id": 9, "seq": stored["seq"], "unread": unread})
+    await asyncio.sleep(0.01)
+    assert hub.index.unread_total == 0
+    assert [frame["unread"] for frame in ws.frames[1:]] == [1, 0]
+    assert ws.frames[-1]["chat"]["read_seq"] == stored["seq"]
+    hub.detach(ws)
+
+
+async def test_events_are_ignored_without_operators(hub):
+    """Тест: воркер без операторов не держит индекс."""
+    hub, backend = hub
+    backend.set_session(1, "ivan", "code1")
+    hub.apply({"type": "session", "chat_id": 1, "username": "ivan"})
+    assert len(hub.index) == 0 and not hub.index.loaded
+    assert INBOX_CHANNEL not in hub.connections.chat_ids()
@@ -0,0 +1,45 @@
+import io
+import json
+import logging
+
+import pytest
+
+from src.log_setup import LogSampler, configure_logging
+
+
+@pytest.fixture
+def restore_root_logger():
+    """Возвращает корневой логгер в исходное состояние после теста."""
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_queued_json_logging(restore_root_logger):
+    """Тест: записи уходят через очередь и пишутся JSON с полями из extra."""
+    stream = io.StringIO()
+    listener = configure_logging("INFO", "json", use_queue=True, stream=stream)
+    log = logging.getLogger("test_log_setup")
+
+    log.info("Сообщение %s добавлено", 7, extra={"chat_id": 42})
+    log.debug("не пишется: %s", "debug")
+    listener.stop()  # дожидается, пока поток запишет очередь
+
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    entry = json.loads(lines[0])
+    assert entry["msg"] == "Сообщение 7 добавлено"
+    assert entry["level"] == "INFO"
+    assert entry["chat_id"] == 42
+
+
+def test_sampler_passes_one_in_n():
+    """Тест: выборка пропускает каждое N-е событие."""
+    sampler = LogSampler(10)
+    assert sum(sampler() for _ in range(100)) == 10
+    assert all(LogSampler(1)() for _ in range(3))
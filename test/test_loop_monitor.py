@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+import pytest
+
+from src.loop_monitor import LoopMonitor
+
+pytestmark = pytest.mark.asyncio
+
+
+def block_loop(seconds: float):
+    time.sleep(seconds)
+
+
+async def spin(seconds: float):
+    await asyncio.sleep(0.05)
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:  # занимает цикл, не отдавая управление
+        sum(range(2000))
+
+
+async def test_watchdog_records_stack_of_blocking_call():
+    """Тест: блокировка цикла дольше порога записывается со стеком блокирующего кода."""
+    monitor = LoopMonitor(lag_interval=0, slow_threshold=0.05, watchdog_interval=0.01)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        block_loop(0.3)
+        await asyncio.sleep(0.2)
+    finally:
+        monitor.stop()
+
+    slow = monitor.snapshot()["slow_callbacks"]
+    assert len(slow) == 1
+    assert slow[0]["duration"] >= 0.25
+    assert "block_loop" in slow[0]["stack"]
+
+
+async def test_sampling_profile_shows_busy_code():
+    """Тест: выборочный профиль цикла содержит функцию, которая его занимает."""
+    monitor = LoopMonitor(lag_interval=0)
+    busy = asyncio.create_task(spin(0.2))
+
+    report = await monitor.profile(0.4, "sample")
+    await busy
+
+    assert "spin" in report
+    with pytest.raises(ValueError):
+        await monitor.profile(0.1, "unknown")
+
+
+async def test_admin_routes_require_token(client, monkeypatch):
+    """Тест: без ADMIN_TOKEN адресов нет, с неверным токеном — 403."""
+    assert (await client.get("/admin/loop")).status_code == 404
+
+    monkeypatch.setattr("src.routes.admin.ADMIN_TOKEN", "secret")
+    assert (await client.get("/admin/loop")).status_code == 403
+    response = await client.get("/admin/loop", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "slow_callbacks" in response.json()
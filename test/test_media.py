@@ -0,0 +1,226 @@
+import io
+import os
+import threading
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from src.media import CacheWriter, MediaCache, MediaError, MediaRelay, MediaUpload, media_from_message
+
+API_URL = "https://telegram.test/bot123:abc"
+FILE_URL = "https://telegram.test/file/bot123:abc/documents/file_1.pdf"
+DOCUMENT = {
+    "kind": "document",
+    "file_id": "id-1",
+    "file_unique_id": "u-1",
+    "name": "report.pdf",
+    "mime": "application/pdf",
+    "size": 200_000,
+}
+
+
+def make_relay(cache, handler, chunk_size=64 * 1024):
+    bot = AsyncMock()
+    bot.get_file.return_value = SimpleNamespace(file_path=FILE_URL)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return MediaRelay(bot, cache, client, API_URL, chunk_size=chunk_size)
+
+
+def store(cache, file_unique_id, data):
+    """Как MediaRelay.upload: файл копируется store, а в индекс кэша попадает через put."""
+    size = cache.store(file_unique_id, io.BytesIO(data))
+    if size is not None:
+        cache.put(cache.key(file_unique_id), size)
+
+
+def test_media_from_message_picks_largest_photo_and_defaults():
+    """Тест: у фото берется самый большой размер, у голосового — тип по умолчанию."""
+    photo = media_from_message(
+        {
+            "photo": [
+                {"file_id": "s", "file_unique_id": "us", "width": 90, "height": 90, "file_size": 1000},
+                {"file_id": "b", "file_unique_id": "ub", "width": 800, "height": 800, "file_size": 90000},
+            ],
+            "caption": "фото",
+        }
+    )
+    assert photo == {
+        "kind": "photo",
+        "file_id": "b",
+        "file_unique_id": "ub",
+        "name": None,
+        "mime": "image/jpeg",
+        "size": 90000,
+    }
+    voice = media_from_message({"voice": {"file_id": "v", "file_unique_id": "uv", "duration": 3}})
+    assert voice["kind"] == "voice" and voice["mime"] == "audio/ogg"
+    # У анимации есть и поле document — важен вид сообщения.
+    animation = {"file_id": "a", "file_unique_id": "ua"}
+    assert media_from_message({"animation": animation, "document": animation})["kind"] == "animation"
+    assert media_from_message({"text": "привет"}) is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Тест: при переполнении удаляется давно не использованный файл, а не недавно прочитанный."""
+    cache = MediaCache(str(tmp_path), max_bytes=250)
+    for name in ("a", "b"):
+        store(cache, name, b"x" * 100)
+    assert cache.get("a")  # "a" становится самым свежим
+    store(cache, "c", b"x" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+    assert cache.bytes_used == 200
+    assert sorted(os.listdir(tmp_path)) == sorted([cache.key("a"), cache.key("c")])
+    assert cache.stats()["evictions"] == 1
+
+
+def test_store_writes_the_file_but_leaves_the_index_alone(tmp_path):
+    """Тест: store только пишет файл (его запускают в потоке), учет и вытеснение — в put."""
+    cache = MediaCache(str(tmp_path), max_bytes=150)
+    store(cache, "a", b"x" * 100)
+
+    assert cache.store("b", io.BytesIO(b"y" * 100)) == 100
+    assert (len(cache), cache.bytes_used) == (1, 100)
+    assert (tmp_path / cache.key("a")).exists()
+
+    cache.put(cache.key("b"), 100)
+    assert cache.get("a") is None and cache.get("b")
+    assert cache.bytes_used == 100
+
+
+def test_cache_skips_files_larger_than_itself_and_reloads_from_disk(tmp_path):
+    """Тест: файл больше кэша не сохраняется; после перезапуска кэш подхватывает файлы с диска."""
+    cache = MediaCache(str(tmp_path), max_bytes=150)
+    assert cache.store("big", io.BytesIO(b"x" * 200)) is None
+    store(cache, "small", b"y" * 50)
+    assert cache.get("big") is None
+    assert len(cache) == 1
+    (tmp_path / "leftover.part").write_bytes(b"z")
+
+    reloaded = MediaCache(str(tmp_path), max_bytes=150)
+    assert reloaded.bytes_used == 50
+    with open(reloaded.get("small"), "rb") as f:
+        assert f.read() == b"y" * 50
+    assert not (tmp_path / "leftover.part").exists()
+
+
+@pytest.mark.asyncio
+async def test_download_streams_in_chunks_and_fills_cache(tmp_path, monkeypatch):
+    """Тест: файл отдается кусками и одновременно попадает в кэш; диск пишется не в цикле событий."""
+    body = os.urandom(DOCUMENT["size"])
+    write_threads = set()
+    write = CacheWriter.write
+
+    def tracked_write(self, chunk):
+        write_threads.add(threading.get_ident())
+        write(self, chunk)
+
+    monkeypatch.setattr(CacheWriter, "write", tracked_write)
+    relay = make_relay(
+        MediaCache(str(tmp_path), 10**6),
+        lambda request: httpx.Response(200, content=body),
+        chunk_size=64 * 1024,
+    )
+
+    chunks = [chunk async for chunk in await relay.download(DOCUMENT)]
+
+    assert len(chunks) > 1 and max(map(len, chunks)) <= 64 * 1024
+    assert b"".join(chunks) == body
+    relay.bot.get_file.assert_awaited_once_with("id-1")
+    with open(relay.cache.get("u-1"), "rb") as f:
+        assert f.read() == body
+    assert relay.downloaded_bytes == len(body)
+    assert write_threads and threading.get_ident() not in write_threads
+    await relay.close()
+
+
+@pytest.mark.asyncio
+async def test_interrupted_download_is_not_cached(tmp_path):
+    """Тест: если браузер ушел на середине, недокачанный файл не остается в кэше."""
+    relay = make_relay(
+        MediaCache(str(tmp_path), 10**6),
+        lambda request: httpx.Response(200, content=b"x" * 200_000),
+        chunk_size=1024,
+    )
+    chunks = await relay.download(DOCUMENT)
+    await chunks.__anext__()
+    await chunks.aclose()
+
+    assert relay.cache.get("u-1") is None
+    assert os.listdir(tmp_path) == []
+    await relay.close()
+
+
+@pytest.mark.asyncio
+async def test_download_errors_are_raised_before_streaming(tmp_path):
+    """Тест: ошибка Telegram видна до начала ответа браузеру."""
+    relay = make_relay(MediaCache(str(tmp_path), 10**6), lambda request: httpx.Response(404))
+    with pytest.raises(MediaError):
+        await relay.download(DOCUMENT)
+    relay.bot.get_file.side_effect = BadRequest("File is too big")
+    with pytest.raises(MediaError):
+        await relay.download(DOCUMENT)
+    await relay.close()
+
+
+@pytest.mark.asyncio
+async def test_upload_streams_multipart_and_caches_document(tmp_path):
+    """Тест: документ уходит в sendDocument формой и сразу кладется в кэш."""
+    requests = []
+
+    def handler(request: httpx.Request):
+        requests.append(request)
+        return httpx.Response(
+            200,
+            json={
+                "ok": True,
+                "result": {
+                    "message_id": 7,
+                    "document": {"file_id": "sent", "file_unique_id": "u-sent", "file_name": "a.txt"},
+                },
+            },
+        )
+
+    relay = make_relay(MediaCache(str(tmp_path), 10**6), handler)
+    upload = MediaUpload("document", "a.txt", "text/plain", io.BytesIO(b"hello"), "подпись", 5)
+
+    sent = await relay.upload(42, upload)
+
+    assert sent["message_id"] == 7
+    request = requests[0]
+    assert str(request.url) == f"{API_URL}/sendDocument"
+    assert request.headers["content-type"].startswith("multipart/form-data")
+    body = request.read()
+    assert b'name="document"; filename="a.txt"' in body and b"hello" in body
+    assert "подпись".encode() in body
+    with open(relay.cache.get("u-sent"), "rb") as f:
+        assert f.read() == b"hello"
+    await relay.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "response, error",
+    [
+        (
+            httpx.Response(
+                429,
+                json={"ok": False, "error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 3}},
+            ),
+            RetryAfter,
+        ),
+        (httpx.Response(400, json={"ok": False, "description": "Bad Request: chat not found"}), BadRequest),
+        (httpx.Response(502, text="Bad Gateway"), NetworkError),
+    ],
+)
+async def test_upload_errors_map_to_telegram_errors(tmp_path, response, error):
+    """Тест: ответы Bot API превращаются в ошибки, которые понимает очередь отправки."""
+    relay = make_relay(MediaCache(str(tmp_path), 10**6), lambda request: response)
+    upload = MediaUpload("photo", "a.jpg", "image/jpeg", io.BytesIO(b"jpeg"), "", 4)
+    with pytest.raises(error):
+        await relay.upload(42, upload)
+    await relay.close()
@@ -0,0 +1,80 @@
+import glob
+import os
+from collections import defaultdict
+
+import pytest
+
+from src.history import HistoryStore
+from src.message_log import MessageLog
+from src.state import MemoryBackend
+
+
+def make_backend(directory: str) -> MemoryBackend:
+    """Создает бэкенд с журналом и восстанавливает его состояние с диска."""
+    chats = defaultdict(lambda: {"username": None, "access_code": None})
+    backend = MemoryBackend(chats, {}, HistoryStore(100, 1024 * 1024))
+    journal = MessageLog(directory, flush_interval=0.01)
+    journal.attach(backend)
+    journal.recover(backend.apply_record)
+    backend.journal = journal
+    return backend
+
+
+def test_recover_from_segments(tmp_path):
+    """Тест: после перезапуска сессии и сообщения восстанавливаются из журнала."""
+    backend = make_backend(str(tmp_path))
+    backend.set_session(1, "alice", "code1")
+    backend.append_message(1, "user", "Привет", 1_700_000_000)
+    backend.append_message(1, "admin", "Здравствуйте", 1_700_000_001)
+    backend.clear_session(1)
+    backend.journal.flush()
+
+    restored = make_backend(str(tmp_path))
+
+    assert restored.get_chat(1) == {"username": "alice", "access_code": None}
+    assert restored.get_chat_id_by_code("code1") is None
+    assert restored.get_messages(1) == backend.get_messages(1)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_replays_only_tail(tmp_path):
+    """Тест: снимок удаляет покрытые сегменты, восстановление = снимок + хвост."""
+    backend = make_backend(str(tmp_path))
+    backend.set_session(2, "bob", "code2")
+    for i in range(10):
+        backend.append_message(2, "user", f"msg {i}", 1_700_000_000 + i)
+    backend.journal.flush()
+
+    await backend.journal.snapshot()
+    backend.append_message(2, "admin", "after snapshot", 1_700_000_100)
+    await backend.journal.close()
+
+    assert len(glob.glob(os.path.join(tmp_path, "snapshot-*.snap"))) == 1
+    assert len(glob.glob(os.path.join(tmp_path, "segment-*.log"))) == 1
+
+    restored = make_backend(str(tmp_path))
+    assert restored.get_chat_id_by_code("code2") == 2
+    messages = restored.get_messages(2)
+    assert [m["text"] for m in messages][-2:] == ["msg 9", "after snapshot"]
+    assert [m["seq"] for m in messages] == list(range(1, 12))
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    """Тест: недописанная последняя запись отбрасывается, остальные сохраняются."""
+    backend = make_backend(str(tmp_path))
+    backend.set_session(3, "carol", "code3")
+    backend.append_message(3, "user", "complete", 1_700_000_000)
+    backend.journal.flush()
+    (segment,) = glob.glob(os.path.join(tmp_path, "segment-*.log"))
+    with open(segment, "ab") as f:
+        f.write(b"\x05\x00\x00")
+
+    restored = make_backend(str(tmp_path))
+
+    assert [m["text"] for m in restored.get_messages(3)] == ["complete"]
+    restored.append_message(3, "user", "next", 1_700_000_001)
+    restored.journal.flush()
+    assert [m["text"] for m in make_backend(str(tmp_path)).get_messages(3)] == [
+        "complete",
+        "next",
+    ]
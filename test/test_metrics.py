@@ -0,0 +1,54 @@
+import pytest
+
+from src.data_store import add_message_to_store
+from src.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Тест: корзины гистограммы накопительные, _count и _sum совпадают с наблюдениями."""
+    registry = MetricsRegistry()
+    histogram = registry.register(
+        Histogram("op_seconds", "Operation time.", ["op"], buckets=(0.1, 1.0))
+    )
+    child = histogram.labels("read")
+    for value in (0.05, 0.1, 0.5, 3.0):
+        child.observe(value)
+
+    text = registry.render()
+    assert "# TYPE op_seconds histogram" in text
+    assert 'op_seconds_bucket{op="read",le="0.1"} 2' in text
+    assert 'op_seconds_bucket{op="read",le="1"} 3' in text
+    assert 'op_seconds_bucket{op="read",le="+Inf"} 4' in text
+    assert 'op_seconds_count{op="read"} 4' in text
+    assert 'op_seconds_sum{op="read"} 3.65' in text
+
+
+def test_function_metrics_are_read_at_scrape_time():
+    """Тест: значения метрик с function читаются в момент запроса."""
+    registry = MetricsRegistry()
+    sizes = {"chats": 1}
+    registry.register(Gauge("items", "Store sizes.", ["kind"], function=lambda: sizes))
+    registry.register(Counter("sent", "Messages sent.", function=lambda: 7))
+
+    sizes["chats"] = 5
+    text = registry.render()
+
+    assert 'items{kind="chats"} 5' in text
+    assert "sent_total 7" in text
+    with pytest.raises(ValueError):
+        registry.register(Gauge("items", "Duplicate."))
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client, setup_active_session):
+    """Тест: /metrics отдает размеры хранилища и гистограммы горячего пути."""
+    add_message_to_store(setup_active_session["chat_id"], "user", "hi", 1_700_000_000)
+
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'webbridge_store_items{kind="sessions"} 1' in response.text
+    assert 'webbridge_store_items{kind="messages"} 1' in response.text
+    assert "# TYPE webbridge_update_handler_seconds histogram" in response.text
+    assert "webbridge_websocket_connections 0" in response.text
@@ -0,0 +1,81 @@
+from collections import defaultdict
+
+import pytest
+from fastapi.responses import PlainTextResponse
+from httpx import AsyncClient
+
+from src.history import HistoryStore
+from src.ratelimit import GCRATable, LoginLimiter, gcra, gcra_params
+from src.state import MemoryBackend
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_gcra_spacing_after_burst():
+    """Тест: после всплеска запросы проходят с интервалом 60/rate секунд."""
+    interval, tolerance = gcra_params(6, 2)
+    assert (interval, tolerance) == (10.0, 10.0)
+    tat = None
+    for expected in (0.0, 0.0):
+        tat, retry_after = gcra(tat, 0.0, interval, tolerance)
+        assert retry_after == expected
+    assert gcra(tat, 0.0, interval, tolerance) == (None, 10.0)
+    assert gcra(tat, 10.0, interval, tolerance)[1] == 0.0
+
+
+async def test_table_evicts_least_recently_used():
+    """Тест: таблица хранит не больше max_keys ключей, вытесняя давно не использованные."""
+    table = GCRATable(max_keys=2)
+    for key, now in (("a", 0.0), ("b", 0.0), ("a", 60.0), ("c", 60.0)):
+        assert table.hit(key, now, 60.0, 0.0) == 0.0
+    assert len(table) == 2
+    assert table.hit("b", 60.0, 60.0, 0.0) == 0.0  # "b" вытеснен и начинает заново
+    assert table.hit("c", 60.0, 60.0, 0.0) == 60.0
+
+
+class CountingBackend(MemoryBackend):
+    def __init__(self):
+        chats = defaultdict(lambda: {"username": None, "access_code": None})
+        super().__init__(chats, {}, HistoryStore(10, 1024))
+        self.calls = 0
+
+    def rate_limit(self, *args, **kwargs):
+        self.calls += 1
+        return super().rate_limit(*args, **kwargs)
+
+
+async def test_login_limiter_locks_username_after_failures():
+    """Тест: неудачи блокируют имя с любого адреса; блокировка помнится без обращения к бэкенду."""
+    backend = CountingBackend()
+    limiter = LoginLimiter(backend, ip_rate=60, ip_burst=100, user_rate=1, user_burst=2)
+
+    for ip in ("10.0.0.1", "10.0.0.2"):
+        assert limiter.check(ip, "Alice", now=0.0) == 0
+        limiter.failed("alice", now=0.0)
+    assert limiter.check("10.0.0.3", "alice", now=0.0) == pytest.approx(60.0)
+    calls = backend.calls
+    assert limiter.check("10.0.0.4", "ALICE", now=30.0) == pytest.approx(30.0)
+    assert backend.calls == calls
+    assert limiter.check("10.0.0.4", "alice", now=60.0) == 0
+    assert limiter.check("10.0.0.4", "bob", now=60.0) == 0
+
+
+async def test_login_is_throttled_without_rendering(client: AsyncClient, monkeypatch):
+    """Тест: после всплеска неудачных попыток /login отвечает 429 с Retry-After."""
+    monkeypatch.setattr(
+        "src.data_store.login_limiter.user_params", gcra_params(1, 3)
+    )
+    rendered = []
+    monkeypatch.setattr(
+        "src.routes.auth.page_cache.response",
+        lambda *args: rendered.append(args) or PlainTextResponse(""),
+    )
+    data = {"username": "mallory", "access_code": "guess"}
+    for _ in range(3):
+        await client.post("/login", data=data)
+    assert len(rendered) == 3
+
+    response = await client.post("/login", data=data)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+    assert len(rendered) == 3
@@ -98,3 +98,27 @@ async def test_logout(client: AsyncClient, setup_active_session):
     chat_response_after_logout = await client.get("/chat", follow_redirects=False)
     assert chat_response_after_logout.status_code == httpx.codes.SEE_OTHER
     assert chat_response_after_logout.headers["location"] == "/"
+
+
+@pytest.fixture
+def draining():
+    from src.lifecycle import lifecycle
+
+    lifecycle.start_draining()
+    yield
+    lifecycle.reset()
+
+
+async def test_draining_worker_refuses_login(client: AsyncClient, setup_active_session, draining):
+    """Тест: при дренаже вход отклоняется 503, а /health выводит воркер из ротации."""
+    response = await client.post(
+        "/login",
+        data={"username": "testuser", "access_code": "testcode123"},
+        follow_redirects=False,
+    )
+    assert response.status_code == httpx.codes.SERVICE_UNAVAILABLE
+    assert response.headers["retry-after"] == "1"
+
+    health = await client.get("/health")
+    assert health.status_code == httpx.codes.SERVICE_UNAVAILABLE
+    assert health.json() == {"status": "draining"}
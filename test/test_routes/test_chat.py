@@ -0,0 +1,97 @@
+import pytest
+import pytest_asyncio
+import httpx
+from httpx import AsyncClient
+
+from src.config import CHAT_PAGE_SIZE
+from src.data_store import add_message_to_store, set_chat_session
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def logged_in(client: AsyncClient, setup_active_session):
+    """Выполняет вход и заполняет историю чата нумерованными сообщениями."""
+    session_data = setup_active_session
+    for i in range(CHAT_PAGE_SIZE + 10):
+        add_message_to_store(
+            session_data["chat_id"], "user", f"msg-{i:03d}", 1_700_000_000
+        )
+    response = await client.post(
+        "/login",
+        data={
+            "username": session_data["username"],
+            "access_code": session_data["access_code"],
+        },
+        follow_redirects=False,
+    )
+    assert response.status_code == httpx.codes.SEE_OTHER
+    return session_data
+
+
+async def test_chat_page_renders_only_newest_messages(client: AsyncClient, logged_in):
+    """Тест: /chat отрисовывает только последние CHAT_PAGE_SIZE сообщений."""
+    response = await client.get("/chat")
+
+    content = response.content.decode("utf-8")
+    assert f"msg-{CHAT_PAGE_SIZE + 9:03d}" in content
+    assert "msg-010" in content
+    assert "msg-009" not in content
+    assert "let hasMoreHistory = true" in content
+
+
+async def test_history_keyset_pagination(client: AsyncClient, logged_in):
+    """Тест: /api/history отдает страницы по seq без пропусков и повторов."""
+    first = (await client.get("/api/history", params={"limit": 25})).json()
+    assert [m["text"] for m in first["messages"]][-1] == f"msg-{CHAT_PAGE_SIZE + 9:03d}"
+    assert first["has_more"] is True
+
+    seen = first["messages"]
+    before = first["next_before"]
+    while before is not None:
+        page = (
+            await client.get("/api/history", params={"before": before, "limit": 25})
+        ).json()
+        seen = page["messages"] + seen
+        before = page["next_before"]
+
+    assert [m["text"] for m in seen] == [f"msg-{i:03d}" for i in range(CHAT_PAGE_SIZE + 10)]
+    assert [m["seq"] for m in seen] == sorted({m["seq"] for m in seen})
+
+
+async def test_history_requires_session(client: AsyncClient):
+    """Тест: без сессии история недоступна."""
+    response = await client.get("/api/history")
+
+    assert response.status_code == httpx.codes.UNAUTHORIZED
+
+
+async def test_search_is_scoped_to_session_chat(client: AsyncClient, logged_in):
+    """Тест: поиск находит сообщения только своего чата, новые первыми."""
+    set_chat_session(999, "other", "othercode")
+    add_message_to_store(999, "user", "msg-005 из чужого чата", 1_700_000_000)
+
+    found = (await client.get("/api/search", params={"q": "MSG 005"})).json()
+    assert [m["text"] for m in found["messages"]] == ["msg-005"]
+
+    page = (await client.get("/api/search", params={"q": "msg", "limit": 3})).json()
+    assert [m["text"] for m in page["messages"]] == [
+        f"msg-{i:03d}" for i in range(CHAT_PAGE_SIZE + 9, CHAT_PAGE_SIZE + 6, -1)
+    ]
+    following = (
+        await client.get("/api/search", params={"q": "msg", "limit": 3, "before": page["next_before"]})
+    ).json()
+    assert following["messages"][0]["text"] == f"msg-{CHAT_PAGE_SIZE + 6:03d}"
+
+
+async def test_post_message_queues_without_redirect(client: AsyncClient, logged_in, mocker):
+    """Тест: /api/messages ставит сообщение в очередь и отвечает JSON, а не редиректом."""
+    submit = mocker.patch("src.bot.core.outbound_sender.submit")
+
+    response = await client.post("/api/messages", json={"text": "Привет", "client_id": "c1"})
+    empty = await client.post("/api/messages", json={"text": " "})
+
+    assert response.status_code == httpx.codes.ACCEPTED
+    assert response.json() == {"client_id": "c1", "status": "queued"}
+    submit.assert_called_once_with(logged_in["chat_id"], "Привет", "c1")
+    assert empty.status_code == httpx.codes.BAD_REQUEST
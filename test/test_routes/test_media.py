@@ -0,0 +1,130 @@
+import io
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+from starlette.testclient import TestClient
+
+from src.app import app
+from src.bot import core
+from src.data_store import add_message_to_store, set_chat_session
+from src.media import MediaCache, MediaRelay
+from src.routes import media as media_routes
+
+CHAT_ID = 12345
+BODY = bytes(range(256)) * 400
+VOICE = {
+    "kind": "voice",
+    "file_id": "id-1",
+    "file_unique_id": "u-1",
+    "name": None,
+    "mime": "audio/ogg",
+    "size": len(BODY),
+}
+
+
+@pytest.fixture
+def relay(monkeypatch, tmp_path):
+    """Кэш во временном каталоге и Telegram, который отдает BODY на любой запрос файла."""
+    bot = AsyncMock()
+    bot.get_file.return_value = SimpleNamespace(file_path="https://telegram.test/file/voice.oga")
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=BODY)))
+    cache = MediaCache(str(tmp_path), 10**6)
+    relay = MediaRelay(bot, cache, client, "https://telegram.test/bot123:abc", chunk_size=4096)
+    monkeypatch.setattr(media_routes, "media_cache", cache)
+    monkeypatch.setattr(media_routes, "media_relay", relay)
+    return relay
+
+
+@pytest.fixture
+def chat_client():
+    set_chat_session(CHAT_ID, "testuser", "testcode123")
+    client = TestClient(app)
+    response = client.post(
+        "/login", data={"username": "testuser", "access_code": "testcode123"}, follow_redirects=False
+    )
+    assert response.status_code == 303
+    return client
+
+
+def test_file_is_streamed_then_served_from_cache_with_ranges(relay, chat_client):
+    """Тест: первый запрос проксируется из Telegram, следующие — из кэша, с поддержкой Range."""
+    seq = add_message_to_store(CHAT_ID, "user", "голос", 1_700_000_000, VOICE)["seq"]
+
+    first = chat_client.get(f"/media/{CHAT_ID}/{seq}")
+    assert first.status_code == 200
+    assert first.content == BODY
+    assert first.headers["content-type"] == "audio/ogg"
+    assert first.headers["content-disposition"].startswith("inline")
+    assert relay.cache.get("u-1")
+
+    part = chat_client.get(f"/media/{CHAT_ID}/{seq}", headers={"Range": "bytes=100-199"})
+    assert part.status_code == 206
+    assert part.content == BODY[100:200]
+    relay.bot.get_file.assert_awaited_once()
+
+
+def test_range_request_on_cache_miss_fetches_file_first(relay, chat_client):
+    """Тест: запрос части файла, которого нет в кэше, докачивает файл и отдает 206."""
+    seq = add_message_to_store(CHAT_ID, "user", "", 1_700_000_000, VOICE)["seq"]
+
+    part = chat_client.get(f"/media/{CHAT_ID}/{seq}", headers={"Range": "bytes=-10"})
+    assert part.status_code == 206
+    assert part.content == BODY[-10:]
+
+
+def test_media_requires_the_chat_session(relay, chat_client):
+    """Тест: файл чужого чата и сообщение без файла не отдаются."""
+    set_chat_session(999, "other", "othercode")
+    other = add_message_to_store(999, "user", "", 1_700_000_000, VOICE)["seq"]
+    plain = add_message_to_store(CHAT_ID, "user", "текст", 1_700_000_000)["seq"]
+
+    assert chat_client.get(f"/media/999/{other}").status_code == 401
+    assert chat_client.get(f"/media/{CHAT_ID}/{plain}").status_code == 404
+    assert TestClient(app).get(f"/media/999/{other}").status_code == 401
+    relay.bot.get_file.assert_not_awaited()
+
+
+def test_upstream_failure_is_a_bad_gateway(relay, chat_client):
+    relay.bot.get_file.side_effect = httpx.ConnectError("down")
+    seq = add_message_to_store(CHAT_ID, "user", "", 1_700_000_000, VOICE)["seq"]
+    assert chat_client.get(f"/media/{CHAT_ID}/{seq}").status_code == 502
+
+
+def test_upload_is_queued_with_open_file(monkeypatch, chat_client):
+    """Тест: загруженный файл ставится в очередь открытым, картинка уходит как фото."""
+    sender = MagicMock()
+    monkeypatch.setattr(core, "outbound_sender", sender)
+
+    response = chat_client.post(
+        "/api/media",
+        data={"caption": "скриншот", "client_id": "c1"},
+        files={"file": ("shot.png", io.BytesIO(b"\x89PNG" + b"0" * 1000), "image/png")},
+    )
+
+    assert response.status_code == 202
+    assert response.json() == {"client_id": "c1", "status": "queued"}
+    (chat_id, caption, client_id), kwargs = sender.submit.call_args
+    upload = kwargs["upload"]
+    assert (chat_id, caption, client_id) == (CHAT_ID, "скриншот", "c1")
+    assert (upload.kind, upload.filename, upload.size) == ("photo", "shot.png", 1004)
+    upload.file.seek(0)
+    assert upload.file.read(4) == b"\x89PNG"
+    upload.close()
+
+
+def test_upload_limits(monkeypatch, chat_client):
+    """Тест: слишком большой и пустой файл отклоняются, в очередь ничего не попадает."""
+    sender = MagicMock()
+    monkeypatch.setattr(core, "outbound_sender", sender)
+    monkeypatch.setattr(media_routes, "MEDIA_UPLOAD_MAX_BYTES", 1000)
+    monkeypatch.setattr(media_routes, "FORM_OVERHEAD_BYTES", 0)
+
+    too_large = chat_client.post("/api/media", files={"file": ("a.bin", b"x" * 2000)})
+    assert too_large.status_code == 413
+    empty = chat_client.post("/api/media", data={"client_id": "c2"}, files={"file": ("a.bin", b"")})
+    assert empty.status_code == 400
+    assert empty.json()["error"] == "Пустой файл"
+    assert TestClient(app).post("/api/media", files={"file": ("a.bin", b"x")}).status_code == 401
+    sender.submit.assert_not_called()
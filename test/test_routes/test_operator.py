@@ -0,0 +1,115 @@
+import pytest
+from starlette.testclient import TestClient
+
+from src.app import app
+from src.data_store import add_message_to_store, set_chat_session
+from src.routes import operator
+
+TOKEN = "operator-secret"
+
+
+@pytest.fixture
+def operator_client(monkeypatch):
+    monkeypatch.setattr(operator, "OPERATOR_TOKEN", TOKEN)
+    return TestClient(app)
+
+
+def test_panel_is_disabled_without_token():
+    """Тест: без OPERATOR_TOKEN панели оператора нет."""
+    assert TestClient(app).get("/operator").status_code == 404
+
+
+def test_wrong_token_is_rejected(operator_client):
+    """Тест: неверный токен не дает сессии оператора."""
+    response = operator_client.post(
+        "/operator/login", data={"token": "guess"}, follow_redirects=False
+    )
+    assert response.status_code == 200
+    assert "Неверный токен" in response.text
+    with pytest.raises(Exception):
+        with operator_client.websocket_connect("/operator/ws") as ws:
+            ws.receive_json()
+
+
+def test_operator_sees_inbox_and_live_messages(operator_client):
+    """Тест: после входа сокет отдает список чатов, затем новые сообщения открытого чата."""
+    set_chat_session(12345, "testuser", "testcode123")
+    add_message_to_store(12345, "user", "вопрос", 1_700_000_000)
+    response = operator_client.post(
+        "/operator/login", data={"token": TOKEN}, follow_redirects=False
+    )
+    assert response.status_code == 303
+
+    with operator_client.websocket_connect("/operator/ws") as ws:
+        inbox = ws.receive_json()
+        assert inbox["type"] == "inbox" and inbox["unread"] == 1
+        assert inbox["chats"][0]["username"] == "testuser"
+
+        ws.send_json({"type": "watch", "chat_ids": [12345]})
+        ws.send_json({"type": "page", "offset": 0, "limit": 5})  # ответ на него упорядочивает кадры
+        assert ws.receive_json()["type"] == "inbox"
+        stored = add_message_to_store(12345, "user", "еще вопрос", 1_700_000_001)
+        assert ws.receive_json()["type"] == "message"  # сначала открытому чату, затем списку
+        assert ws.receive_json()["unread"] == 2
+
+        ws.send_json({"type": "read", "chat_id": 12345, "seq": stored["seq"]})
+        read = ws.receive_json()
+        assert read["unread"] == 0
+        assert (read["chat"]["read_seq"], read["chat"]["unread"]) == (stored["seq"], 0)
+
+    page = operator_client.get("/api/operator/chats/12345/messages?limit=1").json()
+    assert [m["text"] for m in page["messages"]] == ["еще вопрос"] and page["has_more"]
+
+
+
+def test_send_to_unknown_or_closed_chat_is_rejected(operator_client, monkeypatch):
+    """Тест: ответ в несуществующий чат или чат без сессии отклоняется сразу, в очередь не попадает."""
+    submitted = []
+    monkeypatch.setattr(operator, "queue_web_message", lambda *args: submitted.append(args))
+    set_chat_session(12345, "testuser", "testcode123")
+    operator_client.post("/operator/login", data={"token": TOKEN}, follow_redirects=False)
+
+    with operator_client.websocket_connect("/operator/ws") as ws:
+        assert ws.receive_json()["type"] == "inbox"
+        ws.send_json({"type": "send", "chat_id": 999, "client_id": "c1", "text": "привет"})
+        ack = ws.receive_json()
+        assert (ack["client_id"], ack["status"]) == ("c1", "rejected")
+        assert "Чат не найден" in ack["error"]
+
+        ws.send_json({"type": "send", "chat_id": 12345, "client_id": "c2", "text": "привет"})
+        assert ws.receive_json()["status"] == "queued"
+
+    assert submitted == [(12345, "привет", "c2")]
+
+
+def test_search_pages_with_opaque_cursor(operator_client):
+    """Тест: поиск оператора листается по next_before, испорченный курсор отклоняется."""
+    for chat_id in (1, 2):
+        set_chat_session(chat_id, f"user{chat_id}", f"code{chat_id}")
+        for i in range(3):
+            add_message_to_store(chat_id, "user", f"оплата {chat_id}-{i}", 1_700_000_000 + i)
+    operator_client.post("/operator/login", data={"token": TOKEN}, follow_redirects=False)
+
+    first = operator_client.get("/api/operator/search", params={"q": "оплата", "limit": 4}).json()
+    rest = operator_client.get(
+        "/api/operator/search", params={"q": "оплата", "limit": 4, "before": first["next_before"]}
+    ).json()
+
+    texts = [hit["message"]["text"] for hit in first["results"] + rest["results"]]
+    assert sorted(texts) == sorted(f"оплата {c}-{i}" for c in (1, 2) for i in range(3))
+    assert rest["next_before"] is None
+    bad = operator_client.get("/api/operator/search", params={"q": "оплата", "before": "12"})
+    assert bad.status_code == 400
+
+
+def test_wrong_tokens_lock_out_only_their_address(monkeypatch):
+    """Тест: подбор токена с одного адреса не блокирует вход оператора с другого."""
+    monkeypatch.setattr(operator, "OPERATOR_TOKEN", TOKEN)
+    attacker = TestClient(app, client=("203.0.113.7", 50000))
+    for _ in range(10):
+        attacker.post("/operator/login", data={"token": "guess"}, follow_redirects=False)
+    assert attacker.post("/operator/login", data={"token": TOKEN}, follow_redirects=False).status_code == 429
+
+    operator_browser = TestClient(app, client=("198.51.100.2", 50000))
+    response = operator_browser.post("/operator/login", data={"token": TOKEN}, follow_redirects=False)
+    assert response.status_code == 303
@@ -0,0 +1,62 @@
+import pytest
+import httpx
+from httpx import AsyncClient
+
+from benchmarks.fake_telegram import FakeTelegramSender, make_text_update
+from src.bot.core import application
+from src.config import WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def webhook_mode(mocker):
+    """Включает режим webhook и очищает очередь обновлений приложения."""
+    mocker.patch("src.routes.webhook.BOT_UPDATE_MODE", "webhook")
+    while not application.update_queue.empty():
+        application.update_queue.get_nowait()
+    yield
+    while not application.update_queue.empty():
+        application.update_queue.get_nowait()
+
+
+async def test_webhook_queues_update(client: AsyncClient, webhook_mode):
+    """Тест: обновление с верным секретом попадает в очередь приложения."""
+    sender = FakeTelegramSender(client, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN)
+
+    response = await sender.send(make_text_update(12345, "Hello via webhook"))
+
+    assert response.status_code == httpx.codes.OK
+    update = application.update_queue.get_nowait()
+    assert update.effective_chat.id == 12345
+    assert update.message.text == "Hello via webhook"
+
+
+async def test_webhook_rejects_wrong_secret(client: AsyncClient, webhook_mode):
+    """Тест: запрос с неверным секретным токеном отклоняется."""
+    sender = FakeTelegramSender(client, WEBHOOK_PATH, "wrong-secret")
+
+    response = await sender.send(make_text_update(12345, "Forged"))
+
+    assert response.status_code == httpx.codes.FORBIDDEN
+    assert application.update_queue.empty()
+
+
+async def test_webhook_refuses_when_queue_is_full(client: AsyncClient, webhook_mode):
+    """Тест: при заполненной очереди webhook отвечает 503, и Telegram повторит доставку."""
+    sender = FakeTelegramSender(client, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN)
+    for chat_id in range(application.update_queue.maxsize):
+        application.update_queue.put_nowait(make_text_update(chat_id, "backlog"))
+
+    response = await sender.send(make_text_update(12345, "One too many"))
+
+    assert response.status_code == httpx.codes.SERVICE_UNAVAILABLE
+
+
+async def test_webhook_disabled_in_polling_mode(client: AsyncClient):
+    """Тест: в режиме polling маршрут webhook недоступен."""
+    sender = FakeTelegramSender(client, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN)
+
+    response = await sender.send(make_text_update(12345, "Ignored"))
+
+    assert response.status_code == httpx.codes.NOT_FOUND
@@ -0,0 +1,98 @@
+import pytest
+from starlette.testclient import TestClient
+
+from src.app import app
+from src.data_store import add_message_to_store, set_chat_session
+from src.routes import ws as ws_routes
+
+CHAT_ID = 12345
+
+
+@pytest.fixture
+def ws_client():
+    """Синхронный клиент с выполненным входом (TestClient умеет WebSocket)."""
+    set_chat_session(CHAT_ID, "testuser", "testcode123")
+    test_client = TestClient(app)
+    response = test_client.post(
+        "/login",
+        data={"username": "testuser", "access_code": "testcode123"},
+        follow_redirects=False,
+    )
+    assert response.status_code == 303
+    return test_client
+
+
+def store_messages(count: int):
+    return [
+        add_message_to_store(CHAT_ID, "user", f"msg-{i}", 1_700_000_000)
+        for i in range(count)
+    ]
+
+
+def test_reconnect_replays_only_missed_tail(ws_client):
+    """Тест: при переподключении досылаются только сообщения новее after."""
+    stored = store_messages(5)
+    last_seen = stored[2]["seq"]
+
+    with ws_client.websocket_connect(f"/ws/{CHAT_ID}?after={last_seen}") as ws:
+        replayed = [ws.receive_json(), ws.receive_json()]
+
+    assert [m["text"] for m in replayed] == ["msg-3", "msg-4"]
+    assert [m["seq"] for m in replayed] == [stored[3]["seq"], stored[4]["seq"]]
+
+
+def test_socket_is_registered_before_backlog_is_read(ws_client, monkeypatch):
+    """Тест: владелец сокета записан до чтения хвоста, иначе событие другого воркера потеряется."""
+    stored = store_messages(2)
+    registered_at_read = []
+    read = ws_routes.get_messages_after
+
+    def tracked_read(chat_id, after, limit):
+        registered_at_read.append(ws_routes.connections.has(chat_id))
+        return read(chat_id, after, limit)
+
+    monkeypatch.setattr(ws_routes, "get_messages_after", tracked_read)
+    with ws_client.websocket_connect(f"/ws/{CHAT_ID}?after={stored[0]['seq']}") as ws:
+        assert ws.receive_json()["seq"] == stored[1]["seq"]
+
+    assert registered_at_read == [True]
+
+
+def test_reconnect_after_large_gap_asks_for_reload(ws_client, monkeypatch):
+    """Тест: если пропущено больше WS_RESUME_MAX, клиенту отправляется reload."""
+    monkeypatch.setattr("src.routes.ws.WS_RESUME_MAX", 3)
+    store_messages(5)
+
+    with ws_client.websocket_connect(f"/ws/{CHAT_ID}?after=0") as ws:
+        assert ws.receive_json() == {"type": "reload"}
+
+
+def test_send_over_socket_is_acked(ws_client, mocker):
+    """Тест: сообщение, отправленное через сокет, ставится в очередь и подтверждается."""
+    submit = mocker.patch("src.bot.core.outbound_sender.submit")
+
+    with ws_client.websocket_connect(f"/ws/{CHAT_ID}") as ws:
+        ws.send_json({"type": "send", "client_id": "c1", "text": "Здравствуйте"})
+        assert ws.receive_json() == {"type": "ack", "client_id": "c1", "status": "queued"}
+        ws.send_json({"type": "send", "client_id": "c2", "text": "   "})
+        rejected = ws.receive_json()
+
+    submit.assert_called_once_with(CHAT_ID, "Здравствуйте", "c1")
+    assert rejected["client_id"] == "c2"
+    assert rejected["status"] == "rejected"
+
+
+def test_draining_worker_refuses_websocket(ws_client):
+    """Тест: при дренаже новый WebSocket закрывается с 1013 до установления."""
+    from starlette.websockets import WebSocketDisconnect
+
+    from src.lifecycle import lifecycle
+
+    lifecycle.start_draining()
+    try:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            with ws_client.websocket_connect(f"/ws/{CHAT_ID}"):
+                pass
+        assert exc.value.code == 1013
+    finally:
+        lifecycle.reset()
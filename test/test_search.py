@@ -0,0 +1,183 @@
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from src.history import HistoryStore
+from src.search import MessageSearch, SearchIndex, decode_cursor, encode_cursor, matches, tokenize
+from src.state import MemoryBackend, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        chats = defaultdict(lambda: {"username": None, "access_code": None})
+        instance = MemoryBackend(chats, {}, HistoryStore(3, 1024 * 1024))
+    else:
+        instance = SQLiteBackend(str(tmp_path / "state.db"), "worker-a", max_messages=3)
+    yield instance
+    instance.close()
+
+
+def test_tokenize_handles_cyrillic_latin_and_markup():
+    """Тест: кириллица и латиница приводятся к одному регистру, ё — к е, разметка отбрасывается."""
+    assert tokenize("Привет, WORLD! Ёлка <b>жирный</b> &amp; x 7 дом2") == [
+        "привет", "world", "елка", "жирный", "7", "дом2",
+    ]
+    assert matches(["елка", "world"], "Hello world, ёлка!")
+    assert not matches(["елка", "мир"], "ёлка")
+
+
+def test_index_intersects_terms_newest_first_and_by_chat():
+    """Тест: выдача содержит все слова запроса, идет от новых к старым и фильтруется по чату."""
+    index = SearchIndex()
+    index.add(1, 1, "заказ номер 15 оплачен")
+    index.add(2, 1, "заказ отменен")
+    index.add(1, 2, "где мой заказ? номер 15")
+    index.add(2, 2, "номер телефона")
+
+    assert [(chat, seq) for _, chat, seq in index.candidates(["заказ", "номер"])] == [(1, 2), (1, 1)]
+    assert [(chat, seq) for _, chat, seq in index.candidates(["заказ"], chat_id=2)] == [(2, 1)]
+    newest = next(index.candidates(["заказ"]))[0]
+    assert [seq for _, _, seq in index.candidates(["заказ"], before=newest)] == [1, 1]
+    assert list(index.candidates(["нет", "заказ"])) == []
+    assert list(index.candidates([])) == []
+    assert index.stats()["documents"] == 4 and index.stats()["postings"] == 13
+
+
+@pytest.mark.asyncio
+async def test_search_skips_messages_gone_from_store(backend):
+    """Тест: вытесненные из истории сообщения не попадают в выдачу, перестройка их убирает."""
+    search = MessageSearch(backend, SearchIndex(), rebuild_ratio=1)
+    backend.set_session(1, "alice", "code1")
+    for i in range(5):
+        search.add(1, backend.append_message(1, "user", f"счет {i}", 1_700_000_000 + i))
+    if backend.shared:
+        # SQLite обрезает историю пачками, для теста обрезаем сразу.
+        backend._trim_history(1)
+
+    found = await search.search("счет", limit=10)
+    assert [hit["message"]["text"] for hit in found["results"]] == ["счет 4", "счет 3", "счет 2"]
+    assert found["next_before"] is None
+    # SQLite индексируется синхронизацией и видит только оставшиеся сообщения.
+    assert search.stale_hits == (0 if backend.shared else 2)
+
+    await search.rebuild()
+    assert len(search.index) == 3
+
+
+@pytest.mark.asyncio
+async def test_rebuild_yields_between_batches_and_keeps_new_messages(backend):
+    """Тест: перестройка идет срезами и отдает цикл событий, новое за это время не теряется."""
+    search = MessageSearch(backend, SearchIndex(), batch=2)
+    for chat_id in range(1, 5):
+        backend.set_session(chat_id, f"user{chat_id}", f"code{chat_id}")
+        search.add(chat_id, backend.append_message(chat_id, "user", f"заказ {chat_id}", 1_700_000_000))
+    await search.sync()
+    slices = 0
+
+    async def concurrent_add():
+        nonlocal slices
+        await asyncio.sleep(0)
+        search.add(1, backend.append_message(1, "user", "заказ новый", 1_700_000_001))
+        while search.rebuilding:
+            slices += 1
+            await asyncio.sleep(0)
+
+    await asyncio.gather(search.rebuild(), concurrent_add())
+
+    assert search.rebuilds == 1 and slices >= 1
+    found = await search.search("заказ", limit=10)
+    assert [hit["message"]["text"] for hit in found["results"]][0] == "заказ новый"
+    assert len(found["results"]) == 5
+
+
+@pytest.mark.asyncio
+async def test_maintain_reads_message_count_not_stats(backend, monkeypatch):
+    """Тест: фоновая проверка берет число сообщений из счетчика, а не считает таблицы."""
+    search = MessageSearch(backend, SearchIndex())
+    backend.set_session(1, "alice", "code1")
+    search.add(1, backend.append_message(1, "user", "текст", 1_700_000_000))
+    monkeypatch.setattr(backend, "stats", lambda: pytest.fail("stats() не должен вызываться"))
+
+    await search.maintain()
+
+    assert backend.message_count() == 1 and search.rebuilds == 0
+
+
+@pytest.mark.asyncio
+async def test_cursor_survives_rebuild(backend):
+    """Тест: курсор следующей страницы — (chat_id, seq), после перестройки листание продолжается с того же места."""
+    search = MessageSearch(backend, SearchIndex())
+    for chat_id in (1, 2):
+        backend.set_session(chat_id, f"user{chat_id}", f"code{chat_id}")
+    backend.set_session(3, "carol", "code3")
+    # Сообщения чата 3 без слова "счет" — после перестройки номера документов сдвигаются.
+    for i in range(3):
+        search.add(3, backend.append_message(3, "user", f"привет {i}", 1_700_000_000))
+    for i in range(3):
+        for chat_id in (1, 2):
+            search.add(chat_id, backend.append_message(chat_id, "user", f"счет {chat_id}-{i}", 1_700_000_001 + i))
+
+    first = await search.search("счет", limit=3)
+    if backend.shared:
+        backend._execute("DELETE FROM messages WHERE chat_id = 3")
+    else:
+        backend.drop_chat(3)
+    await search.rebuild()
+    rest = await search.search("счет", limit=3, before=first["next_before"])
+
+    texts = [hit["message"]["text"] for hit in first["results"] + rest["results"]]
+    assert texts == ["счет 2-2", "счет 1-2", "счет 2-1", "счет 1-1", "счет 2-0", "счет 1-0"]
+    assert decode_cursor(encode_cursor(first["next_before"])) == first["next_before"]
+    with pytest.raises(ValueError):
+        decode_cursor("7")
+
+
+@pytest.mark.asyncio
+async def test_stale_hits_are_loaded_in_batches_and_capped(backend, monkeypatch):
+    """Тест: кандидаты перечитываются пачками, а не по запросу на каждый; проверка ограничена."""
+    search = MessageSearch(backend, SearchIndex(), max_candidates=4)
+    backend.set_session(1, "alice", "code1")
+    for i in range(3):
+        search.add(1, backend.append_message(1, "user", f"счет {i}", 1_700_000_000 + i))
+    await search.sync()
+    # В индексе остаются документы, которых в хранилище уже нет.
+    for seq in range(100, 110):
+        search.index.add(1, seq, "счет")
+    loads = []
+    load = backend.load_messages
+
+    def counted_load(keys):
+        loads.append(len(keys))
+        return load(keys)
+
+    monkeypatch.setattr(backend, "load_messages", counted_load)
+
+    first = await search.search("счет", limit=2)
+    assert first["results"] == [] and loads == [2, 2]
+    assert first["next_before"] == (1, 106)
+    pages = [first]
+    while pages[-1]["next_before"] is not None:
+        pages.append(await search.search("счет", limit=2, before=pages[-1]["next_before"]))
+    texts = [hit["message"]["text"] for page in pages for hit in page["results"]]
+    assert texts[-3:] == ["счет 2", "счет 1", "счет 0"]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_index_follows_other_workers(tmp_path):
+    """Тест: с общим SQLite индекс видит сообщения, сохраненные другим воркером."""
+    path = str(tmp_path / "state.db")
+    worker_a = SQLiteBackend(path, "worker-a")
+    worker_b = SQLiteBackend(path, "worker-b")
+    try:
+        search = MessageSearch(worker_a, SearchIndex())
+        worker_b.set_session(2, "bob", "code2")
+        worker_b.append_message(2, "user", "Hello from B", 1_700_000_000)
+
+        found = await search.search("hello", chat_id=2)
+        assert [hit["message"]["text"] for hit in found["results"]] == ["Hello from B"]
+        assert len(search.index) == 1
+    finally:
+        worker_a.close()
+        worker_b.close()
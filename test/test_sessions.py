@@ -0,0 +1,119 @@
+from collections import defaultdict
+
+import pytest
+from httpx import AsyncClient
+
+from src import sessions
+from src.bot.core import close_existing_session
+from src.data_store import web_sessions
+from src.history import HistoryStore
+from src.sessions import WebSessionStore
+from src.state import MemoryBackend
+
+pytestmark = pytest.mark.asyncio
+
+
+async def login(client: AsyncClient, session: dict) -> str:
+    response = await client.post(
+        "/login",
+        data={"username": session["username"], "access_code": session["access_code"]},
+        follow_redirects=False,
+    )
+    assert response.status_code == 303
+    return response.cookies["session"]
+
+
+async def test_cookie_is_opaque_and_rotated_on_login(client: AsyncClient, setup_active_session):
+    """Тест: cookie содержит только случайный id, и вход выдает новый id вместо подставленного."""
+    client.cookies.set("session", "planted-by-attacker")
+    session_id = await login(client, setup_active_session)
+
+    assert session_id != "planted-by-attacker"
+    client.cookies.clear()
+    client.cookies.set("session", session_id)
+    assert "testuser" not in session_id and len(session_id) >= 40
+    response = await client.get("/chat", follow_redirects=False)
+    assert response.status_code == 200
+    assert "set-cookie" not in response.headers  # cookie не переписывается на каждый запрос
+
+
+async def test_close_existing_session_revokes_all_browsers(
+    client: AsyncClient, setup_active_session, mock_websocket
+):
+    """Тест: закрытие сессии ботом отзывает cookie во всех браузерах без запроса к ним."""
+    first = await login(client, setup_active_session)
+    client.cookies.clear()
+    second = await login(client, setup_active_session)
+    assert first != second
+
+    assert await close_existing_session(setup_active_session["chat_id"])
+
+    for session_id in (first, second):
+        client.cookies.clear()
+        client.cookies.set("session", session_id)
+        response = await client.get("/chat", follow_redirects=False)
+        assert response.status_code == 303
+        assert response.headers["location"] == "/"
+
+
+async def test_logout_invalidates_copied_cookie(client: AsyncClient, setup_active_session):
+    """Тест: после выхода копия cookie больше не действует."""
+    session_id = await login(client, setup_active_session)
+    await client.get("/logout", follow_redirects=False)
+
+    client.cookies.clear()
+    client.cookies.set("session", session_id)
+    response = await client.get("/chat", follow_redirects=False)
+    assert response.status_code == 303
+
+
+async def test_store_caches_loads_in_bounded_lru():
+    """Тест: повторные чтения берутся из кэша, размер кэша ограничен, отзыв чата сбрасывает кэш."""
+    chats = defaultdict(lambda: {"username": None, "access_code": None})
+    backend = MemoryBackend(chats, {}, HistoryStore(10, 1024))
+    store = WebSessionStore(backend, max_age=60, cache_size=2, cache_ttl=60)
+    for session_id, chat_id in (("a", 1), ("b", 1), ("c", 2)):
+        store.save(session_id, {"chat_id": chat_id})
+
+    assert store.load("c") == {"chat_id": 2}
+    assert (store.hits, store.misses) == (1, 0)
+    assert store.load("a") == {"chat_id": 1}  # вытеснен из кэша, читается из бэкенда
+    assert store.misses == 1
+
+    backend.clear_session(1)
+    store.forget_chat(1)
+    assert store.load("a") is None
+    assert store.load("c") == {"chat_id": 2}
+
+
+async def test_session_expiry_slides_with_use(monkeypatch):
+    """Тест: сессия живет max_age после последнего использования, продление пишется не чаще renew_interval."""
+    now = [1_000_000.0]
+    monkeypatch.setattr(sessions.time, "time", lambda: now[0])
+    chats = defaultdict(lambda: {"username": None, "access_code": None})
+    backend = MemoryBackend(chats, {}, HistoryStore(10, 1024))
+    store = WebSessionStore(backend, max_age=100, cache_size=0, renew_interval=30)
+    store.save("a", {"chat_id": 1})
+
+    now[0] += 20
+    assert store.load_renewing("a") == ({"chat_id": 1}, False)
+    now[0] += 20
+    assert store.load_renewing("a") == ({"chat_id": 1}, True)
+    now[0] += 90  # 130 секунд после входа, но 90 после продления
+    assert store.load("a") == {"chat_id": 1}
+    now[0] += 20
+    assert store.load("a") is None
+
+
+async def test_renewal_refreshes_cookie(client: AsyncClient, setup_active_session, monkeypatch):
+    """Тест: продление сессии переотправляет ту же cookie с новым Max-Age."""
+    session_id = await login(client, setup_active_session)
+    monkeypatch.setattr(web_sessions, "renew_interval", 0)
+    client.cookies.clear()
+    client.cookies.set("session", session_id)
+
+    response = await client.get("/chat", follow_redirects=False)
+
+    assert response.status_code == 200
+    assert response.cookies["session"] == session_id
+    assert "Max-Age=" in response.headers["set-cookie"]
@@ -0,0 +1,281 @@
+import time
+from collections import defaultdict
+
+import pytest
+
+from src.history import HistoryStore, format_timestamp
+from src.state import MemoryBackend, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    """Создает бэкенд каждого типа на чистом хранилище."""
+    if request.param == "memory":
+        chats = defaultdict(lambda: {"username": None, "access_code": None})
+        instance = MemoryBackend(chats, {}, HistoryStore(100, 1024 * 1024))
+    else:
+        instance = SQLiteBackend(str(tmp_path / "state.db"), "worker-a")
+    yield instance
+    instance.close()
+
+
+def test_session_lifecycle(backend):
+    """Тест: установка, поиск по коду и очистка сессии."""
+    assert backend.get_chat(1) is None
+    assert not backend.chat_exists(1)
+
+    backend.set_session(1, "alice", "code1")
+    assert backend.chat_exists(1)
+    assert backend.get_chat_id_by_code("code1") == 1
+    assert backend.get_chat(1)["username"] == "alice"
+
+    backend.set_username(1, "alice2")
+    backend.clear_session(1)
+    assert backend.get_chat_id_by_code("code1") is None
+    assert backend.get_chat(1)["access_code"] is None
+    assert backend.get_chat(1)["username"] == "alice2"
+
+
+def test_messages(backend):
+    """Тест: сообщения сохраняются только для инициализированных чатов."""
+    assert backend.append_message(2, "user", "lost", 1_700_000_000) is None
+
+    backend.set_session(2, "bob", "code2")
+    stored = backend.append_message(2, "user", "hello", 1_700_000_000)
+    assert stored["sender"] == "user"
+    assert stored["text"] == "hello"
+    assert stored["timestamp"] == format_timestamp(1_700_000_000)
+    second = backend.append_message(2, "admin", "hi", 1_700_000_001)
+    assert second["seq"] > stored["seq"]
+
+    messages = backend.get_messages(2)
+    assert [m["text"] for m in messages] == ["hello", "hi"]
+    assert [m["seq"] for m in messages] == [stored["seq"], second["seq"]]
+
+    assert backend.get_messages_before(2, None, 1) == [messages[1]]
+    assert backend.get_messages_before(2, second["seq"], 10) == [messages[0]]
+    assert backend.get_messages_before(2, stored["seq"], 10) == []
+    assert backend.get_messages_after(2, 0, 1) == [messages[0]]
+    assert backend.get_messages_after(2, stored["seq"], 10) == [messages[1]]
+    assert backend.get_messages_after(2, second["seq"], 10) == []
+    stats = backend.stats()
+    assert (stats["chats"], stats["sessions"], stats["messages"]) == (1, 1, 2)
+
+
+def test_media_messages_round_trip(backend):
+    """Тест: описание файла хранится отдельно от подписи, текст пользователя никогда не читается как файл."""
+    backend.set_session(2, "bob", "code2")
+    media = {"kind": "voice", "file_id": "f", "file_unique_id": "u", "name": None, "mime": "audio/ogg", "size": 10}
+    stored = backend.append_message(2, "user", "послушай", 1_700_000_000, media)
+    forged = '\x1e{"kind":"photo","file_id":"x"}\nподпись'
+    plain = backend.append_message(2, "user", forged, 1_700_000_001)
+    broken = backend.append_message(2, "user", "\x1e{не json", 1_700_000_002)
+
+    assert stored["text"] == "послушай" and stored["media"] == media
+    assert plain["text"] == forged and "media" not in plain
+    assert broken["text"] == "\x1e{не json" and "media" not in broken
+    assert backend.get_messages(2) == [stored, plain, broken]
+    assert backend.get_messages_after(2, stored["seq"], 1) == [plain]
+    assert backend.inbox_entries()[0]["last"] == broken
+
+
+def test_sqlite_shared_between_workers(tmp_path):
+    """Тест: два воркера видят общие сессии, события адресуются владельцам сокетов."""
+    path = str(tmp_path / "state.db")
+    worker_a = SQLiteBackend(path, "worker-a")
+    worker_b = SQLiteBackend(path, "worker-b")
+    try:
+        worker_a.set_session(3, "carol", "code3")
+        assert worker_b.get_chat_id_by_code("code3") == 3
+
+        worker_a.append_message(3, "user", "from a", 1_700_000_000)
+        assert [m["text"] for m in worker_b.get_messages(3)] == ["from a"]
+
+        # Событие получает только воркер, у которого открыт сокет этого чата.
+        worker_a.publish(3, {"type": "message", "message": {"text": "lost"}})
+        assert worker_b.poll_events() == []
+
+        worker_a.register_socket_owner(3)
+        worker_b.register_socket_owner(3)
+        worker_a.publish(3, {"type": "message", "message": {"text": "from a"}})
+        assert worker_a.poll_events() == []
+        assert worker_b.poll_events() == [
+            (3, {"type": "message", "message": {"text": "from a"}})
+        ]
+        assert worker_b.poll_events() == []
+    finally:
+        worker_a.close()
+        worker_b.close()
+
+
+def test_sqlite_drops_socket_owners_of_crashed_worker(tmp_path):
+    """Тест: строки socket_owners упавшего воркера удаляются, и события ему больше не пишутся."""
+    path = str(tmp_path / "state.db")
+    worker_a = SQLiteBackend(path, "worker-a", heartbeat_interval=0, worker_expiry=0.05)
+    crashed = SQLiteBackend(path, "worker-b")
+    try:
+        crashed.register_socket_owner(3)
+        worker_a.register_socket_owner(4)
+        # Воркер упал: close() не вызывался, отметка в workers устаревает.
+        time.sleep(0.1)
+        worker_a.poll_events()
+
+        worker_a.publish(3, {"type": "message", "message": {"text": "nobody"}})
+        with worker_a._lock:
+            owners = worker_a._conn.execute("SELECT chat_id, worker_id FROM socket_owners").fetchall()
+            (events,) = worker_a._conn.execute("SELECT COUNT(*) FROM events").fetchone()
+        assert owners == [(4, "worker-a")]
+        assert events == 0
+    finally:
+        worker_a.close()
+        crashed._conn.close()
+
+
+def test_sqlite_worker_reregisters_its_sockets_after_a_stall(tmp_path):
+    """Тест: воркер, которого сочли упавшим, при следующей отметке восстанавливает свои строки."""
+    path = str(tmp_path / "state.db")
+    worker_a = SQLiteBackend(path, "worker-a", heartbeat_interval=0, worker_expiry=0.05)
+    worker_b = SQLiteBackend(path, "worker-b", heartbeat_interval=0, worker_expiry=0.05)
+    try:
+        worker_b.register_socket_owner(3)
+        time.sleep(0.1)
+        worker_a.poll_events()
+        worker_b.poll_events()
+
+        worker_a.publish(3, {"type": "message", "message": {"text": "back"}})
+        assert worker_b.poll_events() == [(3, {"type": "message", "message": {"text": "back"}})]
+    finally:
+        worker_a.close()
+        worker_b.close()
+
+
+def test_sqlite_stats_cache_table_counts(tmp_path):
+    """Тест: размеры таблиц пересчитываются не чаще stats_ttl, число сообщений всегда точное."""
+    instance = SQLiteBackend(str(tmp_path / "state.db"), "worker-a", stats_ttl=60)
+    try:
+        instance.set_session(1, "alice", "code1")
+        assert instance.stats()["sessions"] == 1
+        instance.set_session(2, "bob", "code2")
+        instance.append_message(2, "user", "hi", 1_700_000_000)
+        stats = instance.stats()
+        assert (stats["sessions"], stats["messages"]) == (1, 1)
+
+        instance.stats_ttl = 0
+        assert instance.stats()["sessions"] == 2
+    finally:
+        instance.close()
+
+
+def test_sqlite_caps_history_of_every_chat(tmp_path):
+    """Тест: лимит истории соблюдается для каждого чата, даже когда чаты пишут по очереди."""
+    instance = SQLiteBackend(str(tmp_path / "state.db"), "worker-a", max_messages=10)
+    try:
+        for chat_id in range(1, 65):
+            instance.set_session(chat_id, f"user{chat_id}", f"code{chat_id}")
+        for i in range(50):
+            for chat_id in range(1, 65):
+                instance.append_message(chat_id, "user", f"m{i}", 1_700_000_000 + i)
+        with instance._lock:
+            counts = dict(
+                instance._conn.execute(
+                    "SELECT chat_id, COUNT(*) FROM messages GROUP BY chat_id"
+                ).fetchall()
+            )
+        assert max(counts.values()) <= 10 + instance.trim_every
+        # Счетчик сообщений, который ведут триггеры, совпадает с таблицей и после обрезки.
+        assert instance.message_count() == sum(counts.values())
+        assert [m["text"] for m in instance.get_messages(7)] == [f"m{i}" for i in range(40, 50)]
+    finally:
+        instance.close()
+
+
+def test_idle_sessions_and_chats_expire(backend):
+    """Тест: сессия истекает без активности, затем чат удаляется вместе с историей."""
+    backend.session_ttl, backend.idle_ttl = 10, 100
+    backend.set_session(1, "alice", "code1")
+    backend.set_session(2, "bob", "code2")
+    now = time.time()
+    backend.append_message(1, "user", "hi", int(now))
+    backend.append_message(2, "user", "later", int(now) + 8)  # активность продлевает сессию
+
+    assert backend.expire(now + 5, 100) == ([], 0)
+    expired, _ = backend.expire(now + 11, 100)
+    assert expired == [1]
+    assert backend.get_chat(1)["access_code"] is None
+    assert backend.get_chat_id_by_code("code1") is None
+    assert backend.get_chat(2)["access_code"] == "code2"
+
+    assert backend.expire(now + 20, 100)[0] == [2]
+    backend.expire(now + 105, 100)
+    assert not backend.chat_exists(1)
+    assert backend.get_messages(1) == []
+    assert backend.chat_exists(2)
+
+
+def test_expire_respects_batch_limit(backend):
+    """Тест: за один вызов обрабатывается не больше limit записей."""
+    backend.session_ttl = 10
+    for chat_id in range(5):
+        backend.set_session(chat_id, f"user{chat_id}", f"code{chat_id}")
+    later = time.time() + 11
+
+    first, processed = backend.expire(later, 3)
+    rest, _ = backend.expire(later, 3)
+
+    assert processed == 3
+    assert sorted(first + rest) == list(range(5))
+
+
+def test_rate_limit_allows_burst_then_refills(backend):
+    """Тест: GCRA пропускает всплеск, затем отказывает до пополнения ведра."""
+    interval, tolerance = 10.0, 20.0  # 6 в минуту, всплеск 3
+    now = 1_000.0
+    assert [backend.rate_limit("ip:1", now, interval, tolerance) for _ in range(3)] == [0, 0, 0]
+    assert backend.rate_limit("ip:1", now, interval, tolerance) == pytest.approx(10.0)
+    assert backend.rate_limit("ip:2", now, interval, tolerance) == 0
+    # Проверка без расхода не меняет состояние.
+    assert backend.rate_limit("ip:1", now + 10, interval, tolerance, consume=False) == 0
+    assert backend.rate_limit("ip:1", now + 10, interval, tolerance) == 0
+    assert backend.rate_limit("ip:1", now + 10, interval, tolerance) > 0
+
+
+def test_web_sessions_revoked_with_chat_session(backend):
+    """Тест: сессии браузеров истекают по сроку и удаляются вместе с сессией чата."""
+    now = time.time()
+    backend.set_session(5, "eve", "code5")
+    backend.save_web_session("k1", 5, {"chat_id": 5, "username": "eve"}, now + 60)
+    backend.save_web_session("k2", 5, {"chat_id": 5, "username": "eve"}, now + 60)
+    backend.save_web_session("old", 5, {"chat_id": 5}, now - 1)
+    assert backend.load_web_session("k1", now) == {"chat_id": 5, "username": "eve"}
+    assert backend.load_web_session("old", now) is None
+
+    backend.delete_web_session("k1")
+    assert backend.load_web_session("k1", now) is None
+    assert backend.load_web_session("k2", now) is not None
+
+    backend.clear_session(5)
+    assert backend.load_web_session("k2", now) is None
+
+
+def test_inbox_entries_and_read_marker(backend):
+    """Тест: сводка входящих считает непрочитанные сообщения пользователя после отметки."""
+    backend.set_session(5, "erin", "code5")
+    backend.set_session(6, "frank", "code6")
+    backend.append_message(5, "user", "one", 1_700_000_000)
+    backend.append_message(5, "admin", "reply", 1_700_000_001)
+    last = backend.append_message(5, "user", "two", 1_700_000_002)
+
+    entries = {entry["chat_id"]: entry for entry in backend.inbox_entries()}
+    assert set(entries) == {5, 6}
+    assert entries[5]["username"] == "erin"
+    assert entries[5]["unread"] == 2
+    assert entries[5]["last"]["text"] == "two"
+    assert entries[6]["unread"] == 0 and entries[6]["last"] is None
+
+    assert backend.mark_read(5, last["seq"] - 1) == 1
+    assert backend.mark_read(5, 1) == 1  # отметка не сдвигается назад
+    assert backend.inbox_entries([5])[0]["read_seq"] == last["seq"] - 1
+    assert backend.mark_read(5, last["seq"]) == 0
+
+    backend.clear_session(6)
+    assert [entry["chat_id"] for entry in backend.inbox_entries()] == [5]
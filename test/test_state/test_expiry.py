@@ -0,0 +1,25 @@
+from src.state.expiry import ExpiryIndex
+
+
+def test_pops_due_keys_in_deadline_order():
+    """Тест: ключи выдаются по возрастанию срока и только наступившие."""
+    index = ExpiryIndex()
+    index.schedule("b", 20)
+    index.schedule("a", 10)
+    index.schedule("c", 30)
+    index.schedule("c", 5)  # более ранний срок заменяет поздний
+
+    assert list(index.pop_due(25, 10)) == ["c", "a", "b"]
+    assert len(index) == 0
+
+
+def test_heap_stays_bounded_under_churn():
+    """Тест: при постоянном перепланировании и удалении куча не растет."""
+    index = ExpiryIndex()
+    for round_ in range(1000):
+        for key in range(50):
+            index.schedule(key, 10_000 - round_)
+        index.discard(round_ % 50)
+
+    assert len(index) <= 50
+    assert len(index._heap) <= 2 * len(index) + 64